@@ -3,14 +3,18 @@ from loguru import logger
 from kinde_sdk import Configuration
 from kinde_sdk.kinde_api_client import KindeApiClient, GrantType
 from dotenv import load_dotenv
-import requests
 from urllib.parse import urlencode
 import streamlit as st
 
+import http_client
+from config import KINDE_ISSUER_URL
+from identity_cache import invalidate_identity_cache
+from metrics import timed
+from token_verifier import get_token_verifier
+
 load_dotenv(".env")
 
 # Kinde configuration
-KINDE_ISSUER_URL = "https://pragmaticai.kinde.com"
 KINDE_CALLBACK_URL = "http://localhost:8501"
 KINDE_CLIENT_ID = os.getenv("KINDE_CLIENT_ID")
 KINDE_CLIENT_SECRET = os.getenv("KINDE_CLIENT_SECRET")
@@ -38,10 +42,27 @@ def get_login_url():
     return login_url
 
 
+@timed("identity_call", call="user_details")
 def get_user_details(token):
+    verifier = get_token_verifier()
+    try:
+        claims = verifier.verify(token)
+    except Exception as e:
+        # Kinde stays the authority when the token cannot be verified locally
+        logger.warning(f"Local token verification failed, asking Kinde: {e}")
+        claims = None
+
+    if claims is not None:
+        profile = verifier.get_profile(claims)
+        if profile is not None:
+            return profile
+
     headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(f"{KINDE_ISSUER_URL}/oauth2/user_profile", headers=headers)
-    return response.json() if response.status_code == 200 else None
+    response = http_client.get(f"{KINDE_ISSUER_URL}/oauth2/user_profile", headers=headers)
+    profile = response.json() if response.status_code == 200 else None
+    if profile is not None and claims is not None:
+        verifier.store_profile(claims, profile)
+    return profile
 
 
 def get_logout_url():
@@ -105,6 +126,7 @@ def handle_logout():
         and st.session_state.get("kinde_client") is not None
     ):
         st.session_state.access_token = None
+        invalidate_identity_cache()
         kinde_client = st.session_state.get("kinde_client")
         logout_url = kinde_client.logout(redirect_to=LOGOUT_REDIRECT_URL)
         st.session_state.pop("kinde_client")
@@ -0,0 +1,67 @@
+import os
+import threading
+from loguru import logger
+
+# Transfers above one chunk are split into blocks/ranges moved in parallel
+BLOB_CHUNK_SIZE_BYTES = int(os.getenv("BLOB_CHUNK_SIZE_BYTES", str(4 * 1024 * 1024)))
+BLOB_MAX_CONCURRENCY = int(os.getenv("BLOB_MAX_CONCURRENCY", "4"))
+
+_service_clients = {}
+_container_clients = {}
+_lock = threading.Lock()
+
+
+def iter_encoded(text, chunk_chars=BLOB_CHUNK_SIZE_BYTES):
+    """UTF-8 encode `text` a slice at a time, so an upload never holds the whole encoding"""
+    for start in range(0, len(text), chunk_chars):
+        yield text[start:start + chunk_chars].encode("utf-8")
+
+
+def encoded_length(text):
+    if text.isascii():
+        return len(text)
+    return sum(len(chunk) for chunk in iter_encoded(text))
+
+
+def get_blob_service_client(connection_string):
+    """Return the shared service client for a connection string, built once per process"""
+    client = _service_clients.get(connection_string)
+    if client is None:
+        with _lock:
+            client = _service_clients.get(connection_string)
+            if client is None:
+                # The Azure SDK is heavy to import, only load it once storage is used
+                from azure.storage.blob import BlobServiceClient
+
+                client = BlobServiceClient.from_connection_string(
+                    connection_string,
+                    max_single_put_size=BLOB_CHUNK_SIZE_BYTES,
+                    max_block_size=BLOB_CHUNK_SIZE_BYTES,
+                    max_single_get_size=BLOB_CHUNK_SIZE_BYTES,
+                    max_chunk_get_size=BLOB_CHUNK_SIZE_BYTES,
+                )
+                _service_clients[connection_string] = client
+                logger.debug(f"Created blob service client for {client.account_name}")
+    return client
+
+
+def get_container_client(connection_string, container_name):
+    key = (connection_string, container_name)
+    client = _container_clients.get(key)
+    if client is None:
+        # Resolved before taking the lock, get_blob_service_client takes it too
+        service_client = get_blob_service_client(connection_string)
+        with _lock:
+            client = _container_clients.get(key)
+            if client is None:
+                # Derived from the service client, so it reuses its transport and pool
+                client = service_client.get_container_client(container_name)
+                _container_clients[key] = client
+    return client
+
+
+def get_blob_client(connection_string, container_name, blob_name):
+    """Blob clients are cheap views over the shared container pipeline"""
+    return get_container_client(connection_string, container_name).get_blob_client(
+        blob_name
+    )
@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+import pandas as pd
+import pyarrow as pa
+from loguru import logger
+
+CHAT_SESSION_MEMORY_BUDGET_BYTES = int(
+    os.getenv("CHAT_SESSION_MEMORY_BUDGET_BYTES", str(16 * 1024 * 1024))
+)
+CHAT_SPILL_DIR = os.getenv("CHAT_SPILL_DIR", os.path.join(tempfile.gettempdir(), "ava-chat-spill"))
+
+_stores = weakref.WeakSet()
+_stores_lock = threading.Lock()
+
+
+class StoredAttachment:
+    """A quote table kept as zstd-compressed Arrow IPC, in memory or spilled to disk.
+
+    The table is encoded once when stored, Arrow IPC from the backend is
+    decoded and re-encoded with compression. While in memory the decoded
+    table is kept alongside, so a rerun renders it without decoding again.
+    Spilling drops both.
+    """
+
+    def __init__(self, data):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = pa.ipc.open_stream(data).read_all()
+        elif isinstance(data, pd.DataFrame):
+            data = pa.Table.from_pandas(data, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        options = pa.ipc.IpcWriteOptions(compression="zstd")
+        with pa.ipc.new_stream(sink, data.schema, options=options) as writer:
+            writer.write_table(data)
+        self._data = sink.getvalue().to_pybytes()
+        self._table = data
+        self._path = None
+        self.nbytes = len(self._data)
+
+    @property
+    def resident_bytes(self):
+        if self._data is None:
+            return 0
+        return self.nbytes + self._table.nbytes
+
+    @property
+    def spilled(self):
+        return self._data is None
+
+    def spill(self, directory):
+        """Move the encoded table to disk, returns the resident bytes freed"""
+        if self._data is None:
+            return 0
+        freed = self.resident_bytes
+        self._path = os.path.join(directory, f"{uuid.uuid4().hex}.arrows")
+        with open(self._path, "wb") as f:
+            f.write(self._data)
+        self._data = None
+        self._table = None
+        return freed
+
+    def load(self):
+        """The decoded pyarrow Table, read back from the memory-mapped file if it was spilled"""
+        if self._table is not None:
+            return self._table
+        # Left open, uncompressed buffers of the table point into the mapping
+        return pa.ipc.open_stream(pa.memory_map(self._path)).read_all()
+
+
+class ChatMessageStore:
+    """Chat history of one session with a memory budget for attachments.
+
+    Table attachments are compressed on append. When the session goes
+    over `budget_bytes`, the oldest attachments are spilled to a per-session
+    directory and read back only when rendered.
+    """
+
+    def __init__(self, budget_bytes=CHAT_SESSION_MEMORY_BUDGET_BYTES, spill_dir=CHAT_SPILL_DIR):
+        self.messages = []
+        self.budget_bytes = budget_bytes
+        self.spill_dir = os.path.join(spill_dir, uuid.uuid4().hex)
+        # Remove spilled files once the session's store is garbage collected
+        weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+        with _stores_lock:
+            _stores.add(self)
+
+    def append(self, message):
+        attachments = message.get("attachments")
+        if attachments:
+            message["attachments"] = [
+                StoredAttachment(a)
+                if isinstance(a, (bytes, pa.Table, pd.DataFrame))
+                else a
+                for a in attachments
+            ]
+        self.messages.append(message)
+        self._enforce_budget()
+
+    def _attachments(self):
+        for message in self.messages:
+            for attachment in message.get("attachments") or []:
+                if isinstance(attachment, StoredAttachment):
+                    yield attachment
+
+    def _enforce_budget(self):
+        resident = self.resident_bytes()
+        if resident <= self.budget_bytes:
+            return
+
+        os.makedirs(self.spill_dir, exist_ok=True)
+        spilled = 0
+        # Oldest first, the most recent quotes are the ones most likely to be viewed
+        for attachment in self._attachments():
+            if resident - spilled <= self.budget_bytes:
+                break
+            spilled += attachment.spill(self.spill_dir)
+        logger.debug(f"Spilled {spilled} bytes of chat attachments to {self.spill_dir}")
+
+    def resident_bytes(self):
+        text_bytes = sum(len(str(m.get("content", ""))) for m in self.messages)
+        return text_bytes + sum(a.resident_bytes for a in self._attachments())
+
+
+def total_resident_bytes():
+    """Resident bytes across all live chat sessions in this process"""
+    with _stores_lock:
+        stores = list(_stores)
+    return sum(store.resident_bytes() for store in stores)
@@ -1,7 +1,11 @@
 
 import os
+from dotenv import load_dotenv
 
+# Load before reading any setting so import order between modules does not matter
+load_dotenv(".env")
 
 ENV_FILE_PATH = "../.env"
 EXTERNAL_AUTH_PROVIDER_NAME = "kinde_auth"
-BACKEND_URL = os.getenv("BACKEND_URL")
\ No newline at end of file
+BACKEND_URL = os.getenv("BACKEND_URL")
+KINDE_ISSUER_URL = os.getenv("KINDE_ISSUER_URL", "https://pragmaticai.kinde.com")
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from loguru import logger
+
+DOCUMENT_MANIFEST_DIR = os.getenv("DOCUMENT_MANIFEST_DIR", ".document_manifests")
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def write_delta(file_name, content, version=None, base_version=None):
+    """Delta for writing one file.
+
+    `version` is the blob version the write created, `base_version` the
+    one it replaced. Only a write over the embedded version can be skipped.
+    """
+    return {
+        "upserted": {file_name: content_hash(content)},
+        "deleted": set(),
+        "versions": {file_name: version},
+        "base_versions": {file_name: base_version},
+    }
+
+
+def write_delta_batch(documents, versions=None):
+    """Delta for writing {file name: content} in one go"""
+    return {
+        "upserted": {name: content_hash(content) for name, content in documents.items()},
+        "deleted": set(),
+        "versions": dict(versions or {}),
+        "base_versions": {},
+    }
+
+
+def delete_delta(file_name):
+    return {"upserted": {}, "deleted": {file_name}, "versions": {}, "base_versions": {}}
+
+
+def merge_deltas(previous, new):
+    """Fold `new` into `previous`, the later operation on a file wins"""
+    merged = {
+        "upserted": dict(previous["upserted"]),
+        "deleted": set(previous["deleted"]),
+        "versions": dict(previous.get("versions", {})),
+        "base_versions": dict(previous.get("base_versions", {})),
+    }
+    for file_name in new["deleted"]:
+        merged["upserted"].pop(file_name, None)
+        merged["versions"].pop(file_name, None)
+        merged["base_versions"].pop(file_name, None)
+        merged["deleted"].add(file_name)
+    for file_name, digest in new["upserted"].items():
+        if file_name in merged["deleted"]:
+            # Deleted earlier in the batch, what is embedded is no longer the base
+            merged["deleted"].discard(file_name)
+            merged["base_versions"][file_name] = None
+        else:
+            # The batch started from the version the first write replaced
+            merged["base_versions"].setdefault(file_name, new.get("base_versions", {}).get(file_name))
+        merged["upserted"][file_name] = digest
+        merged["versions"][file_name] = new.get("versions", {}).get(file_name)
+    return merged
+
+
+class DocumentManifest:
+    """Hashes of the documents the backend has embedded, one JSON file per tenant.
+
+    Each entry is {"hash", "version"}, the version being the blob version
+    that was embedded. The manifest is only advanced after the backend
+    accepted a delta, so a failed re-embed leaves it describing what is
+    actually embedded. Other processes write the same files, a manifest is
+    read again whenever its file changed.
+    """
+
+    def __init__(self, directory=DOCUMENT_MANIFEST_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._manifests = {}
+
+    def _path(self, tenant_id):
+        return os.path.join(self.directory, f"{tenant_id}.json")
+
+    def _stamp(self, tenant_id):
+        try:
+            stat = os.stat(self._path(tenant_id))
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self, tenant_id):
+        stamp = self._stamp(tenant_id)
+        with self._lock:
+            cached = self._manifests.get(tenant_id)
+            if cached is not None and cached[0] == stamp:
+                return dict(cached[1])
+            manifest = {}
+            if stamp is not None:
+                try:
+                    with open(self._path(tenant_id), "r", encoding="utf-8") as f:
+                        stored = json.load(f)
+                    # Manifests written before versions were recorded hold bare hashes
+                    manifest = {
+                        name: entry if isinstance(entry, dict) else {"hash": entry, "version": None}
+                        for name, entry in stored.items()
+                    }
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Ignoring unreadable manifest for tenant {tenant_id}: {e}")
+            self._manifests[tenant_id] = (stamp, manifest)
+            return dict(manifest)
+
+    def embedded_version(self, tenant_id, file_name, digest):
+        """Version the backend embedded `file_name` at, if it embedded this exact content"""
+        entry = self.load(tenant_id).get(file_name)
+        if entry is None or entry["hash"] != digest:
+            return None
+        return entry["version"]
+
+    def build_payload(self, tenant_id, delta):
+        """Request body for the backend, or None when nothing changed.
+
+        An upsert is dropped only when it rewrote the very blob version the
+        manifest recorded with the same content. A delete paired with an
+        upsert of identical content is sent as a rename. Deletes are always
+        sent, the manifest may predate documents embedded by a full re-embed.
+        """
+        manifest = self.load(tenant_id)
+        base_versions = delta.get("base_versions", {})
+        upserted = {
+            name: digest
+            for name, digest in delta["upserted"].items()
+            if not self._unchanged(manifest.get(name), digest, base_versions.get(name))
+        }
+        deleted = set(delta["deleted"])
+        renamed = []
+        for old_name in sorted(deleted):
+            digest = manifest[old_name]["hash"] if old_name in manifest else None
+            new_name = next(
+                (name for name, d in upserted.items() if d == digest and name not in manifest),
+                None,
+            )
+            if digest is not None and new_name is not None:
+                renamed.append({"from": old_name, "to": new_name})
+                upserted.pop(new_name)
+                deleted.discard(old_name)
+        if not (upserted or deleted or renamed):
+            return None
+        return {
+            "tenant_id": tenant_id,
+            "upserted": sorted(upserted),
+            "deleted": sorted(deleted),
+            "renamed": renamed,
+        }
+
+    @staticmethod
+    def _unchanged(entry, digest, base_version):
+        return (
+            entry is not None
+            and entry["hash"] == digest
+            and entry["version"] is not None
+            and entry["version"] == base_version
+        )
+
+    def apply(self, tenant_id, delta):
+        manifest = self.load(tenant_id)
+        for file_name in delta["deleted"]:
+            manifest.pop(file_name, None)
+        versions = delta.get("versions", {})
+        for file_name, digest in delta["upserted"].items():
+            manifest[file_name] = {"hash": digest, "version": versions.get(file_name)}
+
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._path(tenant_id))
+        with self._lock:
+            self._manifests[tenant_id] = (self._stamp(tenant_id), manifest)
+
+
+document_manifest = DocumentManifest()
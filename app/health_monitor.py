@@ -0,0 +1,128 @@
+import os
+import random
+import threading
+import time
+import requests
+from loguru import logger
+
+import http_client
+from config import BACKEND_URL
+from metrics import span
+
+HEALTH_CHECK_INTERVAL_SECONDS = float(os.getenv("HEALTH_CHECK_INTERVAL_SECONDS", "15"))
+HEALTH_CHECK_TIMEOUT_SECONDS = float(os.getenv("HEALTH_CHECK_TIMEOUT_SECONDS", "3"))
+HEALTH_CHECK_MAX_BACKOFF_SECONDS = float(os.getenv("HEALTH_CHECK_MAX_BACKOFF_SECONDS", "120"))
+
+
+class BackendHealthMonitor:
+    """Probes the backend health endpoint on a daemon thread.
+
+    Reruns only read the last known status, they never wait on the network.
+    Failed probes back off exponentially (with jitter) up to a ceiling.
+    """
+
+    def __init__(
+        self,
+        url,
+        headers=None,
+        interval=HEALTH_CHECK_INTERVAL_SECONDS,
+        timeout=HEALTH_CHECK_TIMEOUT_SECONDS,
+        max_backoff=HEALTH_CHECK_MAX_BACKOFF_SECONDS,
+    ):
+        self.url = url
+        self.headers = headers or {}
+        self.interval = interval
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._status = {
+            "healthy": None,
+            "last_checked": None,
+            "last_latency": None,
+            "consecutive_failures": 0,
+            "last_error": None,
+        }
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="backend-health-monitor", daemon=True
+            )
+            self._thread.start()
+        logger.info(f"Backend health monitor started for {self.url}")
+
+    def stop(self):
+        self._stop_event.set()
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def is_healthy(self):
+        """Last known health; `True` until the first probe has completed"""
+        with self._lock:
+            return self._status["healthy"] is not False
+
+    def check_now(self):
+        started = time.monotonic()
+        try:
+            with span("backend_health_check"):
+                response = http_client.get(
+                    self.url, headers=self.headers, timeout=self.timeout
+                )
+            healthy = response.status_code == 200
+            error = None if healthy else f"HTTP {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            healthy = False
+            error = str(e)
+        latency = time.monotonic() - started
+
+        with self._lock:
+            self._status["healthy"] = healthy
+            self._status["last_checked"] = time.time()
+            self._status["last_latency"] = latency
+            self._status["last_error"] = error
+            if healthy:
+                self._status["consecutive_failures"] = 0
+            else:
+                self._status["consecutive_failures"] += 1
+            failures = self._status["consecutive_failures"]
+
+        if not healthy:
+            logger.error(f"Backend health check failed ({failures} in a row): {error}")
+        return healthy
+
+    def _next_delay(self):
+        with self._lock:
+            failures = self._status["consecutive_failures"]
+        delay = min(self.interval * (2 ** failures), self.max_backoff)
+        # Jitter keeps replicas from probing the backend in lockstep
+        return delay * random.uniform(0.8, 1.2)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.check_now()
+            self._stop_event.wait(self._next_delay())
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_health_monitor():
+    """Return the process-wide monitor, starting it on first use"""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = BackendHealthMonitor(
+                f"{BACKEND_URL}/api/health",
+                headers={"x-api-key": os.getenv("BACKEND_API_KEY")},
+            )
+            _monitor.start()
+    return _monitor
@@ -0,0 +1,74 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from loguru import logger
+
+from config import BACKEND_URL, KINDE_ISSUER_URL
+
+# (connect, read) timeouts applied when a call site does not pass its own
+DEFAULT_TIMEOUT = (
+    float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "3.05")),
+    float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", "30")),
+)
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_RETRY_BACKOFF_FACTOR = float(os.getenv("HTTP_RETRY_BACKOFF_FACTOR", "0.3"))
+
+# Connection pool size per host, one pool is kept alive for each
+HOST_POOL_SIZES = {
+    BACKEND_URL: int(os.getenv("BACKEND_HTTP_POOL_SIZE", "20")),
+    KINDE_ISSUER_URL: int(os.getenv("KINDE_HTTP_POOL_SIZE", "10")),
+}
+DEFAULT_POOL_SIZE = int(os.getenv("DEFAULT_HTTP_POOL_SIZE", "10"))
+
+
+def _build_adapter(pool_size):
+    # Only idempotent methods are retried, a POST is never replayed
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=HTTP_RETRY_BACKOFF_FACTOR,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"]),
+        raise_on_status=False,
+    )
+    return HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+
+def _build_session():
+    session = requests.Session()
+    session.mount("https://", _build_adapter(DEFAULT_POOL_SIZE))
+    session.mount("http://", _build_adapter(DEFAULT_POOL_SIZE))
+    for host_url, pool_size in HOST_POOL_SIZES.items():
+        if host_url:
+            # requests picks the adapter with the longest matching prefix
+            session.mount(host_url, _build_adapter(pool_size))
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide keep-alive session shared by all outbound calls"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+                logger.debug("HTTP session created")
+    return _session
+
+
+def request(method, url, **kwargs):
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return get_session().request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
@@ -0,0 +1,113 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from loguru import logger
+
+import http_client
+from auth_utils import get_user_details
+from config import EXTERNAL_AUTH_PROVIDER_NAME, BACKEND_URL
+from metrics import timed
+
+IDENTITY_BOOTSTRAP_WORKERS = int(os.getenv("IDENTITY_BOOTSTRAP_WORKERS", "4"))
+
+# Identity lookups and the lookups they depend on, the sidebar needs all of them
+IDENTITY_NODES = ("user_details", "external_user", "user", "tenants")
+
+
+@timed("identity_call", call="external_user")
+def get_user_using_external_user_id(auth_user_id):
+    url = (
+        f"{BACKEND_URL}/api/users/external/{EXTERNAL_AUTH_PROVIDER_NAME}/{auth_user_id}"
+    )
+    headers = {"x-api-key": os.getenv("BACKEND_API_KEY")}
+    response = http_client.get(url, headers=headers)
+    logger.info(f"User response: {response.json()}")
+    return response.json()
+
+
+@timed("identity_call", call="user")
+def get_user(user_id):
+    """Backend user, or None when it does not exist"""
+    url = f"{BACKEND_URL}/api/users/{user_id}"
+    headers = {"x-api-key": os.getenv("BACKEND_API_KEY")}
+    response = http_client.get(url, headers=headers)
+    if response.status_code == 404:
+        return None
+    return response.json()
+
+
+@timed("identity_call", call="tenants")
+def get_user_tenents(user_id):
+    """Tenants of a user, empty when the user is not a member of any tenant"""
+    url = f"{BACKEND_URL}/api/tenants/{user_id}/tenants"
+    headers = {"x-api-key": os.getenv("BACKEND_API_KEY")}
+    response = http_client.get(url, headers=headers)
+    if response.status_code == 404:
+        if response.json().get("detail") == "no tenants not found":
+            return []
+
+    return response.json()
+
+
+def run_dependency_graph(tasks, known=None, max_workers=IDENTITY_BOOTSTRAP_WORKERS):
+    """Run `tasks` on a thread pool as soon as their dependencies are available.
+
+    `tasks` maps a name to `(dependencies, fn)`, where `fn` is called with
+    the results gathered so far. Names already in `known` are not run.
+    Returns all results, including `known`.
+    """
+    results = dict(known or {})
+    pending = {name: task for name, task in tasks.items() if name not in results}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for name, (dependencies, fn) in list(pending.items()):
+                if all(dependency in results for dependency in dependencies):
+                    running[pool.submit(fn, dict(results))] = name
+                    del pending[name]
+            if not running:
+                raise ValueError(f"Unresolvable dependencies for {', '.join(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+
+    return results
+
+
+def _when_found(dependency, fn):
+    """Skip a lookup whose input lookup found nothing"""
+    return lambda results: None if results[dependency] is None else fn(results[dependency])
+
+
+def bootstrap_identity(access_token, known=None):
+    """Resolve the sidebar's identity lookups, running independent ones concurrently.
+
+    The chain is profile -> external user -> (user, tenants); the last two
+    only need the internal user id and run side by side.
+    """
+    tasks = {
+        "user_details": ((), lambda results: get_user_details(access_token)),
+        "external_user": (
+            ("user_details",),
+            _when_found("user_details", lambda details: get_user_using_external_user_id(details.get("id"))),
+        ),
+        "user": (
+            ("external_user",),
+            _when_found("external_user", lambda user: get_user(user.get("id"))),
+        ),
+        "tenants": (
+            ("external_user",),
+            _when_found("external_user", lambda user: get_user_tenents(user.get("id"))),
+        ),
+    }
+
+    started = time.monotonic()
+    results = run_dependency_graph(tasks, known=known)
+    fetched = [name for name in tasks if name not in (known or {})]
+    if fetched:
+        logger.info(
+            f"Identity bootstrap fetched {', '.join(fetched)} in {time.monotonic() - started:.3f}s"
+        )
+    return results
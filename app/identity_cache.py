@@ -0,0 +1,111 @@
+import hashlib
+import os
+import time
+from loguru import logger
+import streamlit as st
+
+from shared_store import get_shared_store
+
+# How long identity/tenant lookups are trusted before the backend is asked again
+IDENTITY_CACHE_TTL_SECONDS = float(os.getenv("IDENTITY_CACHE_TTL_SECONDS", "300"))
+
+_CACHE_KEY = "identity_cache"
+_STATS_KEY = "identity_cache_stats"
+
+
+def _get_cache():
+    """Return the session's identity cache, resetting it when the access token changed"""
+    token = st.session_state.get("access_token")
+    cache = st.session_state.get(_CACHE_KEY)
+    if cache is None or cache.get("token") != token:
+        cache = {"token": token, "entries": {}}
+        st.session_state[_CACHE_KEY] = cache
+    return cache
+
+
+def _shared_key(token, name):
+    # Never put the raw token in a shared store
+    token_hash = hashlib.sha256(str(token).encode("utf-8")).hexdigest()
+    return f"identity:{token_hash}:{name}"
+
+
+def _get_stats():
+    if _STATS_KEY not in st.session_state:
+        st.session_state[_STATS_KEY] = {"hits": 0, "misses": 0}
+    return st.session_state[_STATS_KEY]
+
+
+def peek_cached_identity(name, ttl=IDENTITY_CACHE_TTL_SECONDS):
+    """Return the cached value for `name`, or None on a miss or when expired.
+
+    The session's own cache is checked first, then the shared store, which
+    other sessions and app processes may already have warmed.
+    """
+    cache = _get_cache()
+    entry = cache["entries"].get(name)
+    stats = _get_stats()
+    if entry is not None and time.time() - entry["fetched_at"] < ttl:
+        stats["hits"] += 1
+        return entry["value"]
+
+    entry = get_shared_store().get(_shared_key(cache["token"], name))
+    if entry is not None and time.time() - entry["fetched_at"] < ttl:
+        cache["entries"][name] = entry
+        stats["hits"] += 1
+        return entry["value"]
+
+    stats["misses"] += 1
+    logger.debug(f"Identity cache miss for {name}")
+    return None
+
+
+def store_cached_identity(name, value, ttl=IDENTITY_CACHE_TTL_SECONDS):
+    """Cache `value` under `name`, `None` results are not cached"""
+    if value is None:
+        return
+    cache = _get_cache()
+    entry = {"value": value, "fetched_at": time.time()}
+    cache["entries"][name] = entry
+    get_shared_store().set(_shared_key(cache["token"], name), entry, ttl=ttl)
+
+
+def get_cached_identity(name, loader, ttl=IDENTITY_CACHE_TTL_SECONDS):
+    """Return the cached value for `name`, calling `loader` on a miss or when expired.
+
+    Entries are scoped to the current access token, so a new login never sees
+    the previous user's data. `None` results are not cached.
+    """
+    value = peek_cached_identity(name, ttl)
+    if value is None:
+        value = loader()
+        store_cached_identity(name, value, ttl)
+    return value
+
+
+def invalidate_identity_cache(*names):
+    """Drop the given entries, or the whole cache when no names are passed"""
+    store = get_shared_store()
+    if not names:
+        # The token may already be cleared (logout), use the one the cache was built for
+        cache = st.session_state.pop(_CACHE_KEY, None)
+        if cache is not None:
+            for name in cache["entries"]:
+                store.delete(_shared_key(cache["token"], name))
+        logger.debug("Identity cache cleared")
+        return
+
+    cache = _get_cache()
+    for name in names:
+        cache["entries"].pop(name, None)
+        store.delete(_shared_key(cache["token"], name))
+    logger.debug(f"Identity cache invalidated: {', '.join(names)}")
+
+
+def identity_cache_stats():
+    stats = _get_stats()
+    total = stats["hits"] + stats["misses"]
+    return {
+        "hits": stats["hits"],
+        "misses": stats["misses"],
+        "hit_rate": stats["hits"] / total if total else 0.0,
+    }
@@ -0,0 +1,61 @@
+import asyncio
+import os
+import httpx
+from loguru import logger
+
+KINDE_HTTP_MAX_CONNECTIONS = int(os.getenv("KINDE_HTTP_MAX_CONNECTIONS", "100"))
+KINDE_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("KINDE_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KINDE_HTTP_TIMEOUT_SECONDS = float(os.getenv("KINDE_HTTP_TIMEOUT_SECONDS", "10"))
+# Token exchanges in flight at once, further callbacks wait instead of piling onto Kinde
+AUTH_MAX_CONCURRENT_TOKEN_EXCHANGES = int(os.getenv("AUTH_MAX_CONCURRENT_TOKEN_EXCHANGES", "50"))
+
+
+class KindeAsyncClient:
+    """Non-blocking token exchange over one pooled httpx client"""
+
+    def __init__(
+        self,
+        domain,
+        client_id,
+        client_secret,
+        callback_url,
+        code_verifier=None,
+        max_concurrency=AUTH_MAX_CONCURRENT_TOKEN_EXCHANGES,
+    ):
+        self.domain = domain
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.callback_url = callback_url
+        self.code_verifier = code_verifier
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._http = httpx.AsyncClient(
+            base_url=domain,
+            timeout=KINDE_HTTP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=KINDE_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=KINDE_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+
+    async def fetch_token(self, code):
+        """Exchange an authorization code for a token, as `KindeApiClient.fetch_token` does"""
+        data = {
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": self.callback_url,
+        }
+        if self.code_verifier:
+            data["code_verifier"] = self.code_verifier
+
+        async with self._semaphore:
+            response = await self._http.post(
+                "/oauth2/token",
+                data=data,
+                auth=(self.client_id, self.client_secret or ""),
+            )
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self):
+        await self._http.aclose()
+        logger.debug("Kinde async client closed")
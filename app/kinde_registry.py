@@ -0,0 +1,159 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from authlib.oauth2.rfc6749 import OAuth2Token
+from loguru import logger
+
+KINDE_CLIENT_REGISTRY_MAX_SIZE = int(os.getenv("KINDE_CLIENT_REGISTRY_MAX_SIZE", "1000"))
+KINDE_CLIENT_IDLE_TTL_SECONDS = float(os.getenv("KINDE_CLIENT_IDLE_TTL_SECONDS", "1800"))
+# Optional SQLite file shared by all workers on the host, tokens are kept there
+KINDE_CLIENT_STORE_PATH = os.getenv("KINDE_CLIENT_STORE_PATH")
+
+
+def attach_token(client, token):
+    """Give a KindeApiClient a token obtained outside of `fetch_token`"""
+    # The SDK keeps the token in a private attribute and offers no setter
+    client._KindeApiClient__access_token_obj = OAuth2Token(token)
+    client.configuration.access_token = token.get("access_token")
+    client._clear_decoded_tokens()
+    return client
+
+
+class SQLiteTokenStore:
+    """Token objects by user id in a local SQLite file, so any worker can rebuild a client"""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kinde_tokens ("
+                "user_id TEXT PRIMARY KEY, token TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, user_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT token FROM kinde_tokens WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, user_id, token):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO kinde_tokens (user_id, token, updated_at) VALUES (?, ?, ?)",
+                (user_id, json.dumps(token), time.time()),
+            )
+
+    def delete(self, user_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM kinde_tokens WHERE user_id = ?", (user_id,))
+
+
+class KindeClientRegistry:
+    """Bounded, thread-safe map of user id to an authenticated KindeApiClient.
+
+    Clients are evicted least recently used beyond `max_size` and after
+    `idle_ttl` seconds without use. Tokens are refreshed lazily by the SDK
+    the next time `is_authenticated` is called on an expired token. With a
+    `token_store`, an evicted or unknown client is rebuilt from the stored
+    token, which also lets several workers serve the same user.
+    """
+
+    def __init__(
+        self,
+        client_factory,
+        max_size=KINDE_CLIENT_REGISTRY_MAX_SIZE,
+        idle_ttl=KINDE_CLIENT_IDLE_TTL_SECONDS,
+        token_store=None,
+    ):
+        self.client_factory = client_factory
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.token_store = token_store
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "restored": 0}
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._clients.get(user_id)
+            if entry is not None and now - entry["last_used"] < self.idle_ttl:
+                entry["last_used"] = now
+                self._clients.move_to_end(user_id)
+                self._stats["hits"] += 1
+                return entry["client"]
+            if entry is not None:
+                del self._clients[user_id]
+                self._stats["evictions"] += 1
+            self._stats["misses"] += 1
+
+        token = self.token_store.get(user_id) if self.token_store else None
+        if token is None:
+            return None
+
+        client = attach_token(self.client_factory(), token)
+        with self._lock:
+            self._stats["restored"] += 1
+        self._insert(user_id, client)
+        return client
+
+    def put(self, user_id, client):
+        """Add or touch a client, writing its token to the store when it changed"""
+        previous = self._insert(user_id, client)
+        if self.token_store:
+            token = client.__dict__.get("_KindeApiClient__access_token_obj")
+            if token and (previous is None or previous["token"] != token.get("access_token")):
+                self.token_store.put(user_id, dict(token))
+
+    def pop(self, user_id):
+        with self._lock:
+            entry = self._clients.pop(user_id, None)
+        if self.token_store:
+            self.token_store.delete(user_id)
+        return entry["client"] if entry else None
+
+    def _insert(self, user_id, client):
+        """Insert and evict, returning the entry previously held for the user"""
+        now = time.monotonic()
+        token = client.__dict__.get("_KindeApiClient__access_token_obj") or {}
+        with self._lock:
+            previous = self._clients.get(user_id)
+            if previous is not None and previous["client"] is not client:
+                previous = None
+            self._clients[user_id] = {
+                "client": client,
+                "last_used": now,
+                "token": token.get("access_token"),
+            }
+            self._clients.move_to_end(user_id)
+            # Idle entries sit at the front, least recently used first
+            while self._clients:
+                oldest_id, oldest = next(iter(self._clients.items()))
+                if len(self._clients) <= self.max_size and now - oldest["last_used"] < self.idle_ttl:
+                    break
+                del self._clients[oldest_id]
+                self._stats["evictions"] += 1
+        return previous
+
+    def stats(self):
+        with self._lock:
+            total = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "size": len(self._clients),
+                "hit_rate": self._stats["hits"] / total if total else 0.0,
+            }
+
+
+def build_token_store():
+    if not KINDE_CLIENT_STORE_PATH:
+        return None
+    logger.info(f"Sharing Kinde tokens through {KINDE_CLIENT_STORE_PATH}")
+    return SQLiteTokenStore(KINDE_CLIENT_STORE_PATH)
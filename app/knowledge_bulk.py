@@ -0,0 +1,93 @@
+import io
+import os
+import posixpath
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from loguru import logger
+
+# Parallel transfers per bulk import/export
+KNOWLEDGE_BULK_CONCURRENCY = int(os.getenv("KNOWLEDGE_BULK_CONCURRENCY", "8"))
+
+
+def run_parallel(items, fn, max_workers=KNOWLEDGE_BULK_CONCURRENCY, on_progress=None):
+    """Call `fn(key, value)` for each item on a bounded thread pool.
+
+    Returns `(results, errors)`, both keyed like `items`. `on_progress(done,
+    total)` is called from the calling thread, so it may update Streamlit
+    elements.
+    """
+    items = dict(items)
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fn, key, value): key for key, value in items.items()}
+        for done, future in enumerate(as_completed(futures), start=1):
+            key = futures[future]
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                logger.error(f"Bulk operation on {key} failed: {e}")
+                errors[key] = e
+            if on_progress is not None:
+                on_progress(done, len(items))
+    return results, errors
+
+
+def write_batch(documents, previous, upload, remove, on_progress=None):
+    """Upload {file name: text}, undoing the whole batch if any upload fails.
+
+    `previous` holds the current text of the documents being overwritten.
+    After a failure those are uploaded back and the new documents removed.
+    Returns `(versions, errors, left_changed)`: the version of each
+    uploaded document, the failed uploads, and the sorted names the
+    rollback could not undo.
+    """
+    versions, errors = run_parallel(documents, upload, on_progress=on_progress)
+    if not errors:
+        return versions, errors, []
+    # Only documents whose upload went through need undoing
+    _, restore_errors = run_parallel({name: previous[name] for name in versions if name in previous}, upload)
+    _, remove_errors = run_parallel(
+        {name: None for name in versions if name not in previous},
+        lambda name, _: remove(name),
+    )
+    return versions, errors, sorted(set(restore_errors) | set(remove_errors))
+
+
+def read_uploaded_documents(uploaded_files):
+    """{file name: text} from uploaded `.txt` files and `.zip` archives of them.
+
+    Folders inside archives are flattened, documents live directly under the
+    tenant. Raises ValueError for content that is not UTF-8 text or for
+    duplicate names, so nothing is written from a bad batch.
+    """
+    documents = {}
+
+    def add(name, data):
+        file_name = posixpath.basename(name)
+        if not file_name.endswith(".txt") or file_name.startswith("."):
+            return
+        if file_name in documents:
+            raise ValueError(f"{file_name} appears more than once in the upload")
+        try:
+            documents[file_name] = data.decode("utf-8")
+        except UnicodeDecodeError:
+            raise ValueError(f"{file_name} is not UTF-8 text")
+
+    for uploaded_file in uploaded_files:
+        if uploaded_file.name.endswith(".zip"):
+            with zipfile.ZipFile(uploaded_file) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir():
+                        add(info.filename, archive.read(info))
+        else:
+            add(uploaded_file.name, uploaded_file.getvalue())
+    return documents
+
+
+def build_export_archive(documents):
+    """Zip of {file name: text}, returned as bytes"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for file_name in sorted(documents):
+            archive.writestr(file_name, documents[file_name])
+    return buffer.getvalue()
@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from loguru import logger
+
+from blob_storage import BLOB_MAX_CONCURRENCY
+from metrics import span
+from shared_store import get_shared_store
+
+BLOB_LISTING_CACHE_TTL_SECONDS = float(os.getenv("BLOB_LISTING_CACHE_TTL_SECONDS", "60"))
+DOCUMENT_CACHE_MAX_BYTES = int(os.getenv("DOCUMENT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Lifetime of document content in a shared store, which has no LRU of its own
+DOCUMENT_CACHE_SHARED_TTL_SECONDS = float(os.getenv("DOCUMENT_CACHE_SHARED_TTL_SECONDS", "3600"))
+# Larger documents are only cached in process, not copied into the shared store
+DOCUMENT_CACHE_SHARED_MAX_DOCUMENT_BYTES = int(
+    os.getenv("DOCUMENT_CACHE_SHARED_MAX_DOCUMENT_BYTES", str(1024 * 1024))
+)
+
+
+class BlobListingCache:
+    """Per-tenant cache of the `.txt` documents under a blob prefix.
+
+    Entries are filled by a full listing and then kept current in place by
+    `record_write`/`record_delete`, so our own edits never force a re-list.
+    Entries live in the shared store, so with a shared backend every app
+    process sees the same listing. Changes made outside the app are picked
+    up once the TTL expires.
+    """
+
+    def __init__(self, ttl=BLOB_LISTING_CACHE_TTL_SECONDS, store=None):
+        self.ttl = ttl
+        self.store = store or get_shared_store()
+        self._lock = threading.Lock()
+
+    def _key(self, container_name, prefix):
+        return f"blob_listing:{container_name}:{prefix}"
+
+    def list_files(self, container_client, prefix):
+        """Return {file name: {"etag", "last_modified", "size"}} for the prefix"""
+        key = self._key(container_client.container_name, prefix)
+        entry = self.store.get(key)
+        if entry is not None and time.time() - entry["fetched_at"] < self.ttl:
+            return dict(entry["files"])
+
+        logger.debug(f"Listing blobs under '{prefix}'")
+        files = {}
+        with span("blob_operation", op="list"):
+            for blob in container_client.list_blobs(name_starts_with=prefix):
+                name = blob.name[len(prefix) :]
+                if blob.name.endswith(".txt") and "/" not in name:
+                    files[name] = {
+                        "etag": blob.etag,
+                        "last_modified": blob.last_modified,
+                        "size": blob.size,
+                    }
+
+        self.store.set(key, {"files": files, "fetched_at": time.time()}, ttl=self.ttl)
+        return dict(files)
+
+    def _update(self, container_name, prefix, update):
+        key = self._key(container_name, prefix)
+        with self._lock:
+            entry = self.store.get(key)
+            if entry is None:
+                return
+            remaining = self.ttl - (time.time() - entry["fetched_at"])
+            if remaining <= 0:
+                return
+            files = dict(entry["files"])
+            update(files)
+            self.store.set(key, {"files": files, "fetched_at": entry["fetched_at"]}, ttl=remaining)
+
+    def record_write(self, container_name, prefix, file_name, etag=None, last_modified=None, size=None):
+        def update(files):
+            files[file_name] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "size": size,
+            }
+
+        self._update(container_name, prefix, update)
+
+    def record_delete(self, container_name, prefix, file_name):
+        self._update(container_name, prefix, lambda files: files.pop(file_name, None))
+
+    def invalidate(self, container_name, prefix):
+        self.store.delete(self._key(container_name, prefix))
+
+
+class DocumentContentCache:
+    """Bounded LRU of document text, keyed by (tenant, file) and tagged with the blob ETag.
+
+    A cached document is revalidated with a conditional download
+    (If-None-Match), so an unchanged blob costs a 304 instead of a full
+    transfer. Entries are evicted least recently used once `max_bytes` is
+    exceeded.
+    """
+
+    def __init__(self, max_bytes=DOCUMENT_CACHE_MAX_BYTES, store=None):
+        self.max_bytes = max_bytes
+        store = store or get_shared_store()
+        # A process-local store would only duplicate the LRU
+        self.store = store if store.shared else None
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes_saved": 0}
+
+    def read(self, blob_client, tenant_id, file_name):
+        key = (tenant_id, file_name)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None and self.store is not None:
+            # Warmed by another app process, still revalidated below
+            entry = self.store.get(self._shared_key(tenant_id, file_name))
+
+        if entry is not None:
+            from azure.core import MatchConditions
+            from azure.core.exceptions import HttpResponseError
+
+            try:
+                with span("blob_operation", op="download_conditional"):
+                    downloader = blob_client.download_blob(
+                        etag=entry["etag"],
+                        match_condition=MatchConditions.IfModified,
+                        max_concurrency=BLOB_MAX_CONCURRENCY,
+                    )
+                    content = downloader.content_as_text()
+            except HttpResponseError as e:
+                # The storage SDK re-raises the 304 as ResourceModifiedError or a plain
+                # HttpResponseError, never as ResourceNotModifiedError
+                if e.status_code != 304:
+                    raise
+                with self._lock:
+                    self._stats["hits"] += 1
+                    self._stats["bytes_saved"] += entry["size"]
+                    in_memory = key in self._entries
+                    if in_memory:
+                        self._entries.move_to_end(key)
+                if not in_memory:
+                    self.put(tenant_id, file_name, entry["etag"], entry["content"])
+                return entry["content"]
+        else:
+            with span("blob_operation", op="download"):
+                downloader = blob_client.download_blob(max_concurrency=BLOB_MAX_CONCURRENCY)
+                content = downloader.content_as_text()
+
+        with self._lock:
+            self._stats["misses"] += 1
+        self.put(tenant_id, file_name, downloader.properties.etag, content)
+        return content
+
+    def _shared_key(self, tenant_id, file_name):
+        return f"document:{tenant_id}:{file_name}"
+
+    def put(self, tenant_id, file_name, etag, content):
+        if etag is None:
+            self.evict(tenant_id, file_name)
+            return
+
+        key = (tenant_id, file_name)
+        size = len(content.encode("utf-8"))
+        if size > self.max_bytes:
+            self.evict(tenant_id, file_name)
+            return
+        if self.store is not None:
+            if size <= DOCUMENT_CACHE_SHARED_MAX_DOCUMENT_BYTES:
+                self.store.set(
+                    self._shared_key(tenant_id, file_name),
+                    {"etag": etag, "content": content, "size": size},
+                    ttl=DOCUMENT_CACHE_SHARED_TTL_SECONDS,
+                )
+            else:
+                self.store.delete(self._shared_key(tenant_id, file_name))
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous["size"]
+            self._entries[key] = {"etag": etag, "content": content, "size": size}
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted["size"]
+                self._stats["evictions"] += 1
+
+    def evict(self, tenant_id, file_name):
+        if self.store is not None:
+            self.store.delete(self._shared_key(tenant_id, file_name))
+        with self._lock:
+            entry = self._entries.pop((tenant_id, file_name), None)
+            if entry is not None:
+                self._size -= entry["size"]
+
+    def stats(self):
+        with self._lock:
+            total = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "resident_bytes": self._size,
+                "hit_rate": self._stats["hits"] / total if total else 0.0,
+            }
+
+
+blob_listing_cache = BlobListingCache()
+document_content_cache = DocumentContentCache()
@@ -0,0 +1,371 @@
+import codecs
+import math
+import os
+import pickle
+import re
+import sys
+import tempfile
+import threading
+from array import array
+from collections import Counter
+from loguru import logger
+
+from knowledge_bulk import run_parallel
+
+KNOWLEDGE_INDEX_DIR = os.getenv("KNOWLEDGE_INDEX_DIR", ".knowledge_index")
+# Saves are coalesced, a burst of edits writes the index file once
+KNOWLEDGE_INDEX_SAVE_DELAY_SECONDS = float(os.getenv("KNOWLEDGE_INDEX_SAVE_DELAY_SECONDS", "10"))
+KNOWLEDGE_SEARCH_SNIPPET_CHARS = int(os.getenv("KNOWLEDGE_SEARCH_SNIPPET_CHARS", "160"))
+# Distinct words indexed per document, a catalog of unique part numbers stops adding terms here
+KNOWLEDGE_INDEX_MAX_DOCUMENT_TERMS = int(os.getenv("KNOWLEDGE_INDEX_MAX_DOCUMENT_TERMS", "50000"))
+# (term, document) pairs per tenant index, documents beyond it are left unindexed
+KNOWLEDGE_INDEX_MAX_POSTINGS = int(os.getenv("KNOWLEDGE_INDEX_MAX_POSTINGS", "5000000"))
+
+# Bumped whenever the pickled layout changes, older files are rebuilt
+_INDEX_FORMAT = 2
+# BM25 parameters
+_K1 = 1.2
+_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+")
+# Longest word carried over into the next piece
+_MAX_WORD_CHARS = 256
+# Characters tokenized at once when indexing text held in memory
+_PIECE_CHARS = 1024 * 1024
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _text_pieces(content):
+    """Slices of `content` if it is text, else the decoded UTF-8 byte chunks it yields"""
+    if isinstance(content, str):
+        for start in range(0, len(content), _PIECE_CHARS):
+            yield content[start:start + _PIECE_CHARS]
+        return
+    # Chunks are read at arbitrary byte offsets and may split a character
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for chunk in content:
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+
+def _utf8_length(text, start, end):
+    part = text[start:end]
+    return len(part) if part.isascii() else len(part.encode("utf-8"))
+
+
+def scan(content, max_terms=KNOWLEDGE_INDEX_MAX_DOCUMENT_TERMS):
+    """Word counts of a document and the byte offset of each word's first occurrence.
+
+    `content` is the text, or an iterable of UTF-8 byte chunks for a
+    document too large to hold whole. Only the first `max_terms` distinct
+    words are counted. Returns `(Counter, {term: offset})`.
+    """
+    counts = Counter()
+    offsets = {}
+    carry, carry_offset = "", 0
+    pieces = _text_pieces(content)
+    piece = next(pieces, None)
+    while piece is not None:
+        following = next(pieces, None)
+        text = carry + piece
+        cut = len(text)
+        if following is not None:
+            # A word touching the end may continue in the next piece
+            floor = max(cut - _MAX_WORD_CHARS, 0)
+            tail = _TOKEN_RE.search(text, floor)
+            while tail and tail.end() < cut:
+                tail = _TOKEN_RE.search(text, tail.end())
+            # Unless the word started before the floor, then it is split as it is
+            if tail and (tail.start() > floor or floor == 0):
+                cut = tail.start()
+        part = text[:cut]
+        lowered = part.lower()
+        piece_counts = Counter(_TOKEN_RE.findall(lowered))
+        # One string per term across documents, not one per document
+        if not counts and len(piece_counts) <= max_terms:
+            counts = Counter({sys.intern(term): count for term, count in piece_counts.items()})
+            new_terms = set(counts)
+        else:
+            new_terms = set()
+            for term, count in piece_counts.items():
+                if term in counts:
+                    counts[term] += count
+                elif len(counts) < max_terms:
+                    term = sys.intern(term)
+                    counts[term] = count
+                    new_terms.add(term)
+        # Word positions are only walked for pieces that bring new words
+        if new_terms and part.isascii():
+            for match in _TOKEN_RE.finditer(lowered):
+                term = match.group()
+                if term in new_terms:
+                    offsets[term] = carry_offset + match.start()
+                    new_terms.discard(term)
+                    if not new_terms:
+                        break
+        elif new_terms:
+            position, byte_offset = 0, carry_offset
+            for match in _TOKEN_RE.finditer(part):
+                term = match.group().lower()
+                if term in new_terms:
+                    byte_offset += _utf8_length(part, position, match.start())
+                    position = match.start()
+                    offsets[term] = byte_offset
+                    new_terms.discard(term)
+                    if not new_terms:
+                        break
+        for term in new_terms:
+            # Lowercasing changed the word's length, point at the piece instead
+            offsets[term] = carry_offset
+        carry_offset += _utf8_length(part, 0, cut)
+        carry = text[cut:]
+        piece = following
+    return counts, offsets
+
+
+class KnowledgeIndex:
+    """Inverted index over one tenant's documents, ranked with BM25.
+
+    Each document is stored with a `version` (its blob etag, or mtime and
+    size locally), so `sync` only reads documents that changed since they
+    were indexed. The text is not kept, only the byte offset where each
+    term first appears, and snippets are read from storage around it.
+    """
+
+    def __init__(self, max_postings=KNOWLEDGE_INDEX_MAX_POSTINGS):
+        self.max_postings = max_postings
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._doc_terms = {}
+        self._offsets = {}
+        self._lengths = {}
+        self._versions = {}
+        self._total_length = 0
+        self._posting_count = 0
+
+    def __len__(self):
+        return len(self._versions)
+
+    def add(self, file_name, content, version=None):
+        """Index a document given as text or as an iterable of UTF-8 byte chunks"""
+        terms, offsets = scan(content)
+        with self._lock:
+            self._remove(file_name)
+            if self._posting_count + len(terms) > self.max_postings:
+                logger.warning(
+                    f"Search index is full ({self._posting_count} postings), {file_name} is not indexed"
+                )
+                terms, offsets = Counter(), {}
+            for term, count in terms.items():
+                self._postings.setdefault(term, {})[file_name] = count
+            self._doc_terms[file_name] = list(terms)
+            self._offsets[file_name] = array("Q", [offsets[term] for term in terms])
+            self._lengths[file_name] = sum(terms.values())
+            self._versions[file_name] = version
+            self._total_length += self._lengths[file_name]
+            self._posting_count += len(terms)
+
+    def remove(self, file_name):
+        with self._lock:
+            self._remove(file_name)
+
+    def _remove(self, file_name):
+        terms = self._doc_terms.pop(file_name, ())
+        for term in terms:
+            postings = self._postings[term]
+            del postings[file_name]
+            if not postings:
+                del self._postings[term]
+        self._posting_count -= len(terms)
+        self._total_length -= self._lengths.pop(file_name, 0)
+        self._offsets.pop(file_name, None)
+        self._versions.pop(file_name, None)
+
+    def stale(self, versions):
+        """Return (names to read, names to drop) to match {file name: version}"""
+        with self._lock:
+            changed = [
+                name
+                for name, version in versions.items()
+                if name not in self._versions or self._versions[name] != version
+            ]
+            removed = [name for name in self._versions if name not in versions]
+        return changed, removed
+
+    def search(self, query, limit=20, read_range=None):
+        """Ranked [{file_name, score, snippet}] for the query terms.
+
+        `read_range(file_name, offset, length)` returns bytes of a document,
+        snippets are empty without it.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            doc_count = len(self._lengths)
+            if not doc_count:
+                return []
+            average_length = self._total_length / doc_count or 1
+            scores = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for file_name, count in postings.items():
+                    norm = _K1 * (1 - _B + _B * self._lengths[file_name] / average_length)
+                    scores[file_name] = scores.get(file_name, 0.0) + idf * count * (_K1 + 1) / (count + norm)
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+            first_matches = {file_name: self._first_match(file_name, terms) for file_name, _ in ranked}
+
+        snippets = {}
+        if read_range is not None:
+            snippets, _ = run_parallel(
+                first_matches,
+                lambda file_name, offset: self._snippet(read_range, file_name, offset, terms),
+            )
+        return [
+            {"file_name": file_name, "score": score, "snippet": snippets.get(file_name, "")}
+            for file_name, score in ranked
+        ]
+
+    def _first_match(self, file_name, terms):
+        """Byte offset of the earliest query term in the document"""
+        offsets = self._offsets[file_name]
+        return min(offset for term, offset in zip(self._doc_terms[file_name], offsets) if term in terms)
+
+    @staticmethod
+    def _snippet(read_range, file_name, offset, terms, width=KNOWLEDGE_SEARCH_SNIPPET_CHARS):
+        """Text around the first match, with matched words in bold markdown"""
+        pattern = re.compile(
+            r"\b(" + "|".join(re.escape(term) for term in sorted(terms)) + r")\b",
+            re.IGNORECASE,
+        )
+        start = max(offset - width // 2, 0)
+        data = read_range(file_name, start, width)
+        # The window can start or end inside a multi-byte character
+        snippet = " ".join(data.decode("utf-8", errors="ignore").split())
+        snippet = pattern.sub(lambda m: f"**{m.group(0)}**", snippet)
+        return ("..." if start else "") + snippet + ("..." if len(data) == width else "")
+
+    def dump(self):
+        with self._lock:
+            return pickle.dumps(
+                {
+                    "format": _INDEX_FORMAT,
+                    "postings": self._postings,
+                    "doc_terms": self._doc_terms,
+                    "offsets": self._offsets,
+                    "lengths": self._lengths,
+                    "versions": self._versions,
+                },
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+
+    @classmethod
+    def loads(cls, data):
+        state = pickle.loads(data)
+        index = cls()
+        if state.get("format") != _INDEX_FORMAT:
+            return index
+        index._postings = state["postings"]
+        index._doc_terms = state["doc_terms"]
+        index._offsets = state["offsets"]
+        index._lengths = state["lengths"]
+        index._versions = state["versions"]
+        index._total_length = sum(index._lengths.values())
+        index._posting_count = sum(len(terms) for terms in index._doc_terms.values())
+        return index
+
+
+class KnowledgeIndexRegistry:
+    """One index per tenant, loaded from KNOWLEDGE_INDEX_DIR and saved back after changes"""
+
+    def __init__(self, directory=KNOWLEDGE_INDEX_DIR, save_delay=KNOWLEDGE_INDEX_SAVE_DELAY_SECONDS):
+        self.directory = directory
+        self.save_delay = save_delay
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self._timers = {}
+
+    def _path(self, tenant_id):
+        return os.path.join(self.directory, f"{tenant_id}.pickle")
+
+    def get(self, tenant_id):
+        with self._lock:
+            index = self._indexes.get(tenant_id)
+            if index is None:
+                index = KnowledgeIndex()
+                try:
+                    with open(self._path(tenant_id), "rb") as f:
+                        index = KnowledgeIndex.loads(f.read())
+                    logger.info(f"Loaded search index of {len(index)} documents for tenant {tenant_id}")
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    logger.warning(f"Ignoring unreadable search index for tenant {tenant_id}: {e}")
+                self._indexes[tenant_id] = index
+            return index
+
+    def sync(self, tenant_id, versions, read_document):
+        """Bring the tenant's index up to date with {file name: version}.
+
+        `read_document(file_name)` returns the text of a new or changed
+        document, or an iterable of its UTF-8 byte chunks. Documents are
+        read and indexed in parallel. Returns the index.
+        """
+        index = self.get(tenant_id)
+        changed, removed = index.stale(versions)
+        for file_name in removed:
+            index.remove(file_name)
+        if changed:
+            _, errors = run_parallel(
+                {name: versions[name] for name in changed},
+                lambda file_name, version: index.add(file_name, read_document(file_name), version),
+            )
+            if errors:
+                logger.warning(f"Could not index {', '.join(sorted(errors))}")
+            logger.info(f"Indexed {len(changed) - len(errors)} documents for tenant {tenant_id}")
+        if changed or removed:
+            self.schedule_save(tenant_id)
+        return index
+
+    def record_write(self, tenant_id, file_name, content, version):
+        self.get(tenant_id).add(file_name, content, version)
+        self.schedule_save(tenant_id)
+
+    def record_delete(self, tenant_id, file_name):
+        self.get(tenant_id).remove(file_name)
+        self.schedule_save(tenant_id)
+
+    def schedule_save(self, tenant_id):
+        with self._lock:
+            timer = self._timers.get(tenant_id)
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(self.save_delay, self.save, args=(tenant_id,))
+            timer.daemon = True
+            self._timers[tenant_id] = timer
+            timer.start()
+
+    def save(self, tenant_id):
+        with self._lock:
+            self._timers.pop(tenant_id, None)
+            index = self._indexes.get(tenant_id)
+        if index is None:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(index.dump())
+            os.replace(tmp_path, self._path(tenant_id))
+            logger.debug(f"Saved search index for tenant {tenant_id}")
+        except OSError as e:
+            logger.error(f"Could not save search index for tenant {tenant_id}: {e}")
+
+
+knowledge_index_registry = KnowledgeIndexRegistry()
@@ -0,0 +1,279 @@
+import mmap
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from loguru import logger
+
+KNOWLEDGE_LOCAL_ROOT = os.getenv("KNOWLEDGE_LOCAL_ROOT", "knowledgebase")
+KNOWLEDGE_LOCAL_CACHE_MAX_BYTES = int(
+    os.getenv("KNOWLEDGE_LOCAL_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+# Files above this size are read through mmap instead of buffered reads
+KNOWLEDGE_MMAP_THRESHOLD_BYTES = int(os.getenv("KNOWLEDGE_MMAP_THRESHOLD_BYTES", str(1024 * 1024)))
+
+
+def file_version(stat):
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+class LocalKnowledgeStore:
+    """Tenant documents on the local filesystem, one directory per tenant.
+
+    Listings and contents are cached in memory. When watchdog is installed,
+    filesystem events keep the caches current, so an unchanged file costs
+    neither a stat nor a read, and a change only refreshes that file.
+    Without it every read is revalidated with a stat. Writes go to a temp
+    file that is renamed over the document, so readers never see half a
+    file.
+
+    Installs from before per-tenant directories keep their documents
+    directly under the root. A tenant without a directory of its own keeps
+    using those until `<root>/<tenant id>/` is created.
+    """
+
+    def __init__(self, root=KNOWLEDGE_LOCAL_ROOT, max_bytes=KNOWLEDGE_LOCAL_CACHE_MAX_BYTES):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._listings = {}
+        self._contents = OrderedDict()
+        self._size = 0
+        # Bumped by every event on a path, a read that raced a change is not cached
+        self._generations = {}
+        self._observer = None
+        self._watching = False
+        # Directory of each tenant, kept while filesystem events can invalidate it
+        self._tenant_dirs = {}
+        self._has_flat_documents = None
+        self._flat_tenants = set()
+
+    def tenant_dir(self, tenant_id):
+        if tenant_id is None:
+            # Single-tenant layout, documents directly under the root
+            return self.root
+        tenant_id = str(tenant_id)
+        if tenant_id in ("", ".", "..") or "/" in tenant_id or os.sep in tenant_id:
+            raise ValueError(f"Invalid tenant id {tenant_id!r}")
+        with self._lock:
+            directory = self._tenant_dirs.get(tenant_id) if self._watching else None
+        if directory is not None:
+            return directory
+
+        directory = os.path.join(self.root, tenant_id)
+        if not os.path.isdir(directory) and self._flat_documents_exist():
+            directory = self.root
+            with self._lock:
+                first_use = tenant_id not in self._flat_tenants
+                self._flat_tenants.add(tenant_id)
+            if first_use:
+                logger.warning(
+                    f"Tenant {tenant_id} has no document directory, using the documents directly under "
+                    f"{self.root}. Move them into {os.path.join(self.root, tenant_id)} to keep tenants apart"
+                )
+        with self._lock:
+            self._tenant_dirs[tenant_id] = directory
+        return directory
+
+    def _flat_documents_exist(self):
+        """Whether the root holds documents from the layout before per-tenant directories"""
+        if self._has_flat_documents is None:
+            try:
+                with os.scandir(self.root) as entries:
+                    self._has_flat_documents = any(
+                        entry.name.endswith(".txt") and not entry.name.startswith(".") and entry.is_file()
+                        for entry in entries
+                    )
+            except FileNotFoundError:
+                self._has_flat_documents = False
+        return self._has_flat_documents
+
+    def _path(self, tenant_id, file_name):
+        if os.path.basename(file_name) != file_name or file_name.startswith("."):
+            raise ValueError(f"Invalid document name {file_name!r}")
+        return os.path.join(self.tenant_dir(tenant_id), file_name)
+
+    def start_watching(self):
+        """Start the watchdog observer once, returns whether events drive the caches"""
+        with self._lock:
+            if self._observer is not None or self._watching:
+                return self._watching
+            try:
+                from watchdog.events import FileSystemEventHandler
+                from watchdog.observers import Observer
+            except ImportError:
+                logger.info("watchdog is not installed, local documents are revalidated on every read")
+                self._observer = False
+                return False
+
+            store = self
+
+            class Handler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    store._on_event(event)
+
+            os.makedirs(self.root, exist_ok=True)
+            observer = Observer()
+            observer.daemon = True
+            observer.schedule(Handler(), self.root, recursive=True)
+            observer.start()
+            self._observer = observer
+            self._watching = True
+            logger.info(f"Watching {self.root} for document changes")
+            return True
+
+    def _on_event(self, event):
+        paths = [event.src_path, getattr(event, "dest_path", None)]
+        with self._lock:
+            for path in filter(None, paths):
+                path = os.fsdecode(path)
+                if event.is_directory:
+                    if event.event_type in ("created", "deleted", "moved"):
+                        # A tenant directory appeared, went or moved, list it again
+                        self._listings.pop(path, None)
+                        self._tenant_dirs.clear()
+                    continue
+                directory, file_name = os.path.split(path)
+                if not file_name.endswith(".txt"):
+                    continue
+                if directory == self.root:
+                    # Moving the flat documents out ends the fallback to the root
+                    self._has_flat_documents = None
+                    self._tenant_dirs.clear()
+                self._generations[path] = self._generations.get(path, 0) + 1
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    stat = None
+                cached = self._contents.get(path)
+                # Our own writes are already cached under the version on disk
+                if stat is None or cached is None or cached["version"] != file_version(stat):
+                    self._evict(path)
+                listing = self._listings.get(directory)
+                if listing is None:
+                    continue
+                if stat is None:
+                    listing.pop(file_name, None)
+                else:
+                    listing[file_name] = {"size": stat.st_size, "version": file_version(stat)}
+
+    def list_files(self, tenant_id):
+        """Return {file name: {"size", "version"}} of the tenant's documents"""
+        directory = self.tenant_dir(tenant_id)
+        watching = self.start_watching()
+        if watching:
+            with self._lock:
+                listing = self._listings.get(directory)
+                if listing is not None:
+                    return {name: dict(entry) for name, entry in listing.items()}
+
+        os.makedirs(directory, exist_ok=True)
+        listing = {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".txt") and not entry.name.startswith(".") and entry.is_file():
+                    stat = entry.stat()
+                    listing[entry.name] = {"size": stat.st_size, "version": file_version(stat)}
+        if watching:
+            with self._lock:
+                self._listings[directory] = listing
+        return {name: dict(entry) for name, entry in listing.items()}
+
+    def read(self, tenant_id, file_name):
+        path = self._path(tenant_id, file_name)
+        watching = self.start_watching()
+        with self._lock:
+            entry = self._contents.get(path)
+            generation = self._generations.get(path, 0)
+        if entry is not None and not watching:
+            # No events to rely on, a changed version means the entry is stale
+            if file_version(os.stat(path)) != entry["version"]:
+                entry = None
+        if entry is not None:
+            with self._lock:
+                if path in self._contents:
+                    self._contents.move_to_end(path)
+            return entry["content"]
+
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size >= KNOWLEDGE_MMAP_THRESHOLD_BYTES:
+                # Decoded straight from the mapped pages, slicing would copy the whole file first
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                    content = str(view, "utf-8")
+            else:
+                content = f.read().decode("utf-8")
+        self._put(path, file_version(stat), content, generation)
+        return content
+
+    def read_range(self, tenant_id, file_name, offset, length):
+        """Bytes [offset, offset + length) of a document, only those pages are read"""
+        path = self._path(tenant_id, file_name)
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if offset >= size:
+                return b""
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return mapped[offset : offset + length]
+
+    def write(self, tenant_id, file_name, content):
+        """Atomically replace a document, returns its new version"""
+        path = self._path(tenant_id, file_name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content.encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        stat = os.stat(path)
+        version = file_version(stat)
+        with self._lock:
+            listing = self._listings.get(directory)
+            if listing is not None:
+                listing[file_name] = {"size": stat.st_size, "version": version}
+        self._put(path, version, content)
+        return version
+
+    def delete(self, tenant_id, file_name):
+        path = self._path(tenant_id, file_name)
+        os.remove(path)
+        with self._lock:
+            if os.path.dirname(path) == self.root:
+                self._has_flat_documents = None
+                self._tenant_dirs.clear()
+            self._evict(path)
+            listing = self._listings.get(os.path.dirname(path))
+            if listing is not None:
+                listing.pop(file_name, None)
+
+    def _put(self, path, version, content, generation=None):
+        size = len(content)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and self._generations.get(path, 0) != generation:
+                return
+            self._evict(path)
+            self._contents[path] = {"version": version, "content": content, "size": size}
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._contents.popitem(last=False)
+                self._size -= evicted["size"]
+
+    def _evict(self, path):
+        entry = self._contents.pop(path, None)
+        if entry is not None:
+            self._size -= entry["size"]
+
+
+local_knowledge_store = LocalKnowledgeStore()
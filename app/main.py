@@ -1,107 +1,76 @@
-import os
+import importlib
 from loguru import logger
 from dotenv import load_dotenv
-import requests
 from auth_utils import (
     handle_authentication,
-    handle_logout,
-    get_user_details
+    handle_logout
 )
-from config import ENV_FILE_PATH, EXTERNAL_AUTH_PROVIDER_NAME, BACKEND_URL
-from page.chat import chat_page
-from page.product_knowledge import product_knowledge_page
+from config import ENV_FILE_PATH
+from health_monitor import get_health_monitor
+from identity import IDENTITY_NODES, bootstrap_identity
+from identity_cache import (
+    peek_cached_identity,
+    store_cached_identity,
+    invalidate_identity_cache,
+    identity_cache_stats
+)
+from metrics import METRICS_DEBUG_PANEL, metrics, span, start_metrics_exporters
+from render_metrics import measure_render, render_stats
+from static_assets import read_image, read_text
 
 import streamlit as st
 
 
 load_dotenv(ENV_FILE_PATH)
 
+# Available pages, imported on first use so a session only pays for the pages it opens
+PAGES = {
+    # "Home": ("page.home", "home_page"),
+    "Chat": ("page.chat", "chat_page"),
+    "Product Knowledge": ("page.product_knowledge", "product_knowledge_page"),
+}
+
+
+def load_page(name):
+    module_name, function_name = PAGES[name]
+    return getattr(importlib.import_module(module_name), function_name)
+
 def check_backend_health():
-    url = f"{BACKEND_URL}/api/health"
-    headers = {"x-api-key": os.getenv("BACKEND_API_KEY")}
-    try:
-        response = requests.get(url, headers=headers, timeout=30)
-        return response.status_code == 200
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Backend health check failed: {str(e)}")
-        return False
-
-def get_user_using_external_user_id(auth_user_id):
-    url = (
-        f"{BACKEND_URL}/api/users/external/{EXTERNAL_AUTH_PROVIDER_NAME}/{auth_user_id}"
+    monitor = get_health_monitor()
+    status = monitor.status()
+    logger.debug(
+        f"Backend health: healthy={status['healthy']} "
+        f"latency={status['last_latency']} failures={status['consecutive_failures']}"
     )
-    headers = {"x-api-key": os.getenv("BACKEND_API_KEY")}
-    response = requests.get(url, headers=headers, timeout=30)
-    st.session_state["user"] = response.json()
-    logger.info(f"User response: {response.json()}")
-    return response.json()
-
-def get_user(user_id):
-    url = f"{BACKEND_URL}/api/users/{user_id}"
-    headers = {"x-api-key": os.getenv("BACKEND_API_KEY")}
-    response = requests.get(url, headers=headers, timeout=30)
-    if response.status_code == 404:
-        st.error(f"User {user_id} not found")
-        st.stop()
-    return response.json()
-
-def get_user_tenents(user_id):
-    
-    if st.session_state.get("user") is None:
-        user = get_user(user_id)
-        st.session_state["user"] = user
-    
-    url = f"{BACKEND_URL}/api/tenants/{user_id}/tenants"
-    headers = {"x-api-key": os.getenv("BACKEND_API_KEY")}
-    response = requests.get(url, headers=headers, timeout=30)
-    if response.status_code == 404:
-        if response.json().get("detail") == "no tenants not found":
-            st.error(f"Sorry but {st.session_state['user'].get('email')} is not a member of any tenant, please contact your admin to get you access!")
-            st.stop()
-    
-    return response.json()
+    return monitor.is_healthy()
 
-def sidebar_base_components():
-    with st.sidebar:
-        user_details = get_user_details(st.session_state.access_token)
-        logger.info(f"User details: {user_details}")
-        user_name = user_details.get("first_name", "User") + " " + user_details.get("last_name", "")
-        st.session_state["auth_user_info"] = user_details
-        
-        user = get_user_using_external_user_id(user_details.get("id"))
-        if user is None:
-            st.error("User not found")
-        tenants = get_user_tenents(user.get("id"))
-        
-        if len(tenants) == 0:
-            st.error(f"Sorry but {user.get('email')} is not a member of any tenant, please contact your admin to get you access!")
-            st.stop()
-        else:
-            st.session_state["tenants"] = tenants
-        
+@st.fragment
+def identity_panel(user_name):
+    with measure_render("identity_panel"):
         with st.expander(user_name):
             if st.button("Logout"):
                 handle_logout()
+
+
+@st.fragment
+def tenant_selector(tenants):
+    with measure_render("tenant_selector"):
         selected_tenant = st.session_state.get("selected_tenant")
-        
-        if selected_tenant is None and len(tenants) > 0:
-            selected_tenant = tenants[0]
-            st.session_state["selected_tenant"] = selected_tenant
-            st.session_state["selected_tenant_id"] = selected_tenant.get("id")
-            
+        previous_tenant_id = st.session_state.get("selected_tenant_id")
+
         with st.expander("Select Tenant" if selected_tenant is None else f"{selected_tenant.get('name')}"):
-            
+
             if len(tenants) == 1:
                 selected_tenant = tenants[0]
                 logger.info(f"Selected tenant: {selected_tenant}")
                 st.session_state["selected_tenant"] = selected_tenant
                 st.session_state["selected_tenant_id"] = selected_tenant.get("id")
                 st.write("You are a member of only one tenant, so we selected it for you!")
-                
-            else:   
-                options = [tenant.get("name") for tenant in tenants]    
+
+            else:
+                options = [tenant.get("name") for tenant in tenants]
                 selected_tenant_str = st.selectbox("Please select a tenant", options)
-                
+
                 # find the tenant object from the name
                 for tenant in tenants:
                     if tenant.get("name") == selected_tenant_str:
@@ -109,46 +78,96 @@ def sidebar_base_components():
                         st.session_state["selected_tenant"] = selected_tenant
                         st.session_state["selected_tenant_id"] = selected_tenant.get("id")
 
+                if previous_tenant_id is not None and previous_tenant_id != st.session_state.get("selected_tenant_id"):
+                    logger.info(f"Tenant switched from {previous_tenant_id} to {st.session_state.get('selected_tenant_id')}")
+                    invalidate_identity_cache("tenants")
+                    # The pages are tenant scoped, so a switch redraws the whole app
+                    st.rerun(scope="app")
 
-def main():
-    
-    logger.debug("Checking backend health...")
-    if not check_backend_health():
-        st.error("API service is afficted, please try again later!")
-        st.stop()
-    
-    is_authenticated = handle_authentication()
-    st.logo("images/pragmaticai_logo.png")
-
-    with open("style.css", encoding="utf-8") as f:
-        style_main = f.read()
-    
-    st.markdown(
-        f"<style>{style_main}</style>",
-        unsafe_allow_html=True,
-    )
-    
-    if is_authenticated:
-        sidebar_base_components()
-                            
-    # Define available pages
-    pages = {
-        # "Home": home_page,
-        "Chat": chat_page,
-        "Product Knowledge": product_knowledge_page,
-    }
-    # Page selection in sidebar
+
+def sidebar_base_components():
     with st.sidebar:
-        # st.markdown("<div class='custom-radio-container'>", unsafe_allow_html=True)
-        selected_page = st.radio("pages", list(pages.keys()))
-        st.write("---")
-        # st.markdown("</div>", unsafe_allow_html=True)
-    # Load the selected page
-    if selected_page:
-        pages[selected_page]()
-    else:
-        chat_page()  # Default to chat page if no selection
-    
+        access_token = st.session_state.access_token
+        known = {}
+        for name in IDENTITY_NODES:
+            value = peek_cached_identity(name)
+            if value is not None:
+                known[name] = value
+        identity = bootstrap_identity(access_token, known=known)
+        # Only fresh lookups are stored, re-storing cached ones would reset their TTL
+        for name in IDENTITY_NODES:
+            if name not in known:
+                store_cached_identity(name, identity[name])
+        logger.debug(f"Identity cache stats: {identity_cache_stats()}")
+
+        user_details = identity["user_details"]
+        logger.info(f"User details: {user_details}")
+        user_name = user_details.get("first_name", "User") + " " + user_details.get("last_name", "")
+        st.session_state["auth_user_info"] = user_details
+        
+        user = identity["user"]
+        if user is None:
+            st.error("User not found")
+            st.stop()
+        st.session_state["user"] = user
+        tenants = identity["tenants"]
+        
+        if len(tenants) == 0:
+            st.error(f"Sorry but {user.get('email')} is not a member of any tenant, please contact your admin to get you access!")
+            st.stop()
+        else:
+            st.session_state["tenants"] = tenants
+
+        if st.session_state.get("selected_tenant") is None and len(tenants) > 0:
+            st.session_state["selected_tenant"] = tenants[0]
+            st.session_state["selected_tenant_id"] = tenants[0].get("id")
+
+        # Logging out and switching tenants only rerun their own fragment
+        identity_panel(user_name)
+        tenant_selector(tenants)
+
+
+def main():
+    # Widgets inside a fragment rerun only that fragment, everything else
+    # (navigation included, as it swaps the page body) reruns the whole app
+    start_metrics_exporters()
+    with measure_render("app"):
+        logger.debug("Checking backend health...")
+        if not check_backend_health():
+            st.error("API service is afficted, please try again later!")
+            st.stop()
+
+        is_authenticated = handle_authentication()
+        # Sized once per process, Streamlit would resize the full size logo on every rerun
+        st.logo(read_image("images/pragmaticai_logo.png"))
+
+        # Streamlit drops elements a rerun does not emit, so the CSS is sent every
+        # rerun, but it is only read from disk once per process
+        st.markdown(
+            f"<style>{read_text('style.css')}</style>",
+            unsafe_allow_html=True,
+        )
+
+        if is_authenticated:
+            sidebar_base_components()
+
+        # Page selection in sidebar
+        with st.sidebar:
+            # st.markdown("<div class='custom-radio-container'>", unsafe_allow_html=True)
+            selected_page = st.radio("pages", list(PAGES.keys()))
+            st.write("---")
+            # st.markdown("</div>", unsafe_allow_html=True)
+        # Load the selected page
+        with span("page_render", page=selected_page or "Chat"):
+            if selected_page:
+                load_page(selected_page)()
+            else:
+                load_page("Chat")()  # Default to chat page if no selection
+
+        if METRICS_DEBUG_PANEL:
+            with st.sidebar.expander("Metrics"):
+                st.dataframe(metrics.summary(), hide_index=True, use_container_width=True)
+        logger.debug(f"Render stats: {render_stats()}")
 
 
 if __name__ == "__main__":
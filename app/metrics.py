@@ -0,0 +1,202 @@
+import bisect
+import functools
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from loguru import logger
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Serves /metrics in the Prometheus text format when set
+METRICS_PORT = os.getenv("METRICS_PORT")
+# Rewritten every METRICS_EXPORT_INTERVAL_SECONDS when set, e.g. for a node exporter textfile collector
+METRICS_EXPORT_PATH = os.getenv("METRICS_EXPORT_PATH")
+METRICS_EXPORT_INTERVAL_SECONDS = float(os.getenv("METRICS_EXPORT_INTERVAL_SECONDS", "15"))
+METRICS_DEBUG_PANEL = os.getenv("METRICS_DEBUG_PANEL", "false").lower() == "true"
+
+# Upper bounds in seconds, the Prometheus client defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NOOP_SPAN = nullcontext()
+
+
+class Histogram:
+    """Cumulative latency histogram with fixed buckets"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Latency histograms by metric name and labels, shared by all sessions of the process"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def summary(self):
+        """One row per histogram, for the debug panel"""
+        with self._lock:
+            return [
+                {
+                    "metric": name,
+                    "labels": ", ".join(f"{k}={v}" for k, v in labels),
+                    "count": histogram.count,
+                    "mean_ms": histogram.sum / histogram.count * 1000,
+                    "p50_ms": histogram.quantile(0.5) * 1000,
+                    "p95_ms": histogram.quantile(0.95) * 1000,
+                }
+                for (name, labels), histogram in sorted(self._histograms.items())
+                if histogram.count
+            ]
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            names = sorted({name for name, _ in self._histograms})
+            for name in names:
+                metric = f"ava_{name}_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                for (key_name, labels), histogram in sorted(self._histograms.items()):
+                    if key_name != name:
+                        continue
+                    label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                    prefix = f"{label_text}," if label_text else ""
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+                    suffix = f"{{{label_text}}}" if label_text else ""
+                    lines.append(f"{metric}_sum{suffix} {histogram.sum}")
+                    lines.append(f"{metric}_count{suffix} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+@contextmanager
+def _span(name, labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe(name, time.perf_counter() - started, **labels)
+
+
+def span(name, **labels):
+    """Time the enclosed block into the `name` histogram, a no-op when metrics are disabled"""
+    if not METRICS_ENABLED:
+        return _NOOP_SPAN
+    return _span(name, labels)
+
+
+def timed(name, **labels):
+    """Decorator form of `span`, leaves the function untouched when metrics are disabled"""
+
+    def decorator(fn):
+        if not METRICS_ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _span(name, labels):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are frequent, keep them out of the app log
+        pass
+
+
+def _export_to_file(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            directory = os.path.dirname(os.path.abspath(path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(metrics.render_prometheus())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Could not export metrics to {path}: {e}")
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def start_metrics_exporters():
+    """Start the configured /metrics server and file export, once per process"""
+    global _exporters_started
+    if not METRICS_ENABLED:
+        return
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+        if METRICS_PORT:
+            try:
+                server = ThreadingHTTPServer(("0.0.0.0", int(METRICS_PORT)), _MetricsHandler)
+            except OSError as e:
+                # Another app process on the host already serves the port
+                logger.warning(f"Metrics endpoint not started on port {METRICS_PORT}: {e}")
+            else:
+                threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+                logger.info(f"Serving metrics on :{METRICS_PORT}/metrics")
+        if METRICS_EXPORT_PATH:
+            threading.Thread(
+                target=_export_to_file,
+                args=(METRICS_EXPORT_PATH, METRICS_EXPORT_INTERVAL_SECONDS),
+                name="metrics-export",
+                daemon=True,
+            ).start()
+            logger.info(f"Exporting metrics to {METRICS_EXPORT_PATH}")
@@ -1,10 +1,78 @@
+import base64
+import json
+import os
+import time
 from dotenv import load_dotenv
 # from auth_utils import get_auth_data
 from loguru import logger
 import pandas as pd
+import pyarrow as pa
 import streamlit as st
 
-from config import ENV_FILE_PATH
+import http_client
+from chat_store import ChatMessageStore, StoredAttachment, total_resident_bytes
+from config import ENV_FILE_PATH, BACKEND_URL
+from render_metrics import measure_render
+
+CHAT_STREAMING_ENABLED = os.getenv("CHAT_STREAMING_ENABLED", "true").lower() == "true"
+# Messages rendered live, older ones are grouped into sections rendered on demand
+CHAT_HISTORY_WINDOW = int(os.getenv("CHAT_HISTORY_WINDOW", "10"))
+
+
+def iter_sse_events(response):
+    """Yield the decoded JSON `data:` payload of each server-sent event"""
+    data_lines = []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield json.loads("\n".join(data_lines))
+                data_lines = []
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:") :].lstrip())
+    if data_lines:
+        yield json.loads("\n".join(data_lines))
+
+
+def stream_assistant_response(user_message, message):
+    """Stream AVA's reply, yielding text chunks and quote DataFrames as they arrive.
+
+    Events are `{"type": "token", "content": str}`,
+    `{"type": "attachment", "format": "arrow_ipc", "data": base64}` (or
+    `"records": [...]` from older backends) and `{"type": "done"}`.
+    The time to the first chunk is stored on `message["ttft"]`.
+    """
+    url = f"{BACKEND_URL}/api/ava/chat/stream"
+    headers = {
+        "Authorization": f"Bearer {st.session_state.get('access_token')}",
+        "Accept": "text/event-stream",
+    }
+    payload = {
+        "tenant_id": st.session_state.get("selected_tenant_id"),
+        "message": user_message,
+    }
+    started = time.monotonic()
+    with http_client.post(url, json=payload, headers=headers, stream=True) as response:
+        response.raise_for_status()
+        for event in iter_sse_events(response):
+            if message.get("ttft") is None:
+                message["ttft"] = time.monotonic() - started
+                logger.info(f"Time to first token: {message['ttft']:.3f}s")
+
+            if event.get("type") == "token":
+                message["content"] += event.get("content", "")
+                yield event.get("content", "")
+            elif event.get("type") == "attachment":
+                if event.get("format") == "arrow_ipc":
+                    attachment = pa.ipc.open_stream(base64.b64decode(event["data"])).read_all()
+                else:
+                    attachment = pa.Table.from_pylist(event.get("records", []))
+                # Stored as the decoded table, the chat store compresses it once
+                message["attachments"].append(attachment)
+                yield attachment
+            elif event.get("type") == "done":
+                break
 
 def chat_page():
     st.write("### AVA quote generator")
@@ -17,9 +85,15 @@ def chat_page():
         st.write("**Tip**: *To clear chat history, refresh the page!*")
 
     # Initialize chat history
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
+    if "chat_store" not in st.session_state:
+        st.session_state.chat_store = ChatMessageStore()
+        st.session_state.messages = st.session_state.chat_store.messages
         logger.debug("Chat history initialized")
+    chat_store = st.session_state.chat_store
+    logger.debug(
+        f"Chat memory: session={chat_store.resident_bytes()} bytes, "
+        f"process={total_resident_bytes()} bytes"
+    )
 
     # Initialize OrderProcessor
     if "ava" not in st.session_state and "base_audit" in st.session_state:
@@ -60,8 +134,7 @@ def chat_page():
             hide_index=True,
         )
 
-    # Display chat messages from history on app rerun
-    for i, message in enumerate(st.session_state.messages):
+    def render_message(message):
         if message["role"] == "user":
             with st.chat_message("user"):
                 container = st.container()
@@ -79,7 +152,9 @@ def chat_page():
                 if attachments:
                     st.write("*Attachments*:")
                     for attachment in attachments:
-                        if isinstance(attachment, pd.DataFrame):
+                        if isinstance(attachment, StoredAttachment):
+                            display_quote_df(attachment.load())
+                        elif isinstance(attachment, (pa.Table, pd.DataFrame)):
                             display_quote_df(attachment)
                         else:
                             logger.warning(
@@ -115,15 +190,31 @@ def chat_page():
                 #         if "feedback_reason" in message:
                 #             st.write(f"*Reason: {message['feedback_reason']}*")
 
+    def render_history(messages):
+        """Render the last CHAT_HISTORY_WINDOW messages, older ones only when expanded"""
+        live_start = max(len(messages) - CHAT_HISTORY_WINDOW, 0)
+        for section_start in range(0, live_start, CHAT_HISTORY_WINDOW):
+            section_end = min(section_start + CHAT_HISTORY_WINDOW, live_start)
+            expanded = st.toggle(
+                f"Show messages {section_start + 1}-{section_end}",
+                key=f"chat_history_section_{section_start}",
+            )
+            if expanded:
+                for message in messages[section_start:section_end]:
+                    render_message(message)
+
+        for message in messages[live_start:]:
+            render_message(message)
+
     def append_user_message(user_message):
         """Append user message to chat history"""
-        st.session_state.messages.append({"role": "user", "content": user_message})
+        chat_store.append({"role": "user", "content": user_message})
 
     def append_assistant_message(assistant_message):
         """Append assistant message to chat history"""
 
         if isinstance(assistant_message, str):
-            st.session_state.messages.append(
+            chat_store.append(
                 {"role": "assistant", "content": assistant_message}
             )
 
@@ -131,7 +222,7 @@ def chat_page():
             message = assistant_message.message
             attachments = assistant_message.attachments
 
-            st.session_state.messages.append(
+            chat_store.append(
                 {"role": "assistant", "content": message, "attachments": attachments}
             )
 
@@ -147,11 +238,38 @@ def chat_page():
 
         append_user_message(user_message)
         # append_assistant_message(response)
+        if CHAT_STREAMING_ENABLED:
+            # Streamed in the page body, callbacks cannot render incrementally
+            st.session_state["pending_user_message"] = user_message
 
-    st.chat_input(
-        placeholder="Type a message...",
-        key="chat_input",
-        on_submit=respond_to_user_input,
-        args=None,
-        kwargs=None,
-    )
+    def stream_pending_response():
+        user_message = st.session_state.pop("pending_user_message")
+        message = {"role": "assistant", "content": "", "attachments": [], "ttft": None}
+        with st.chat_message("assistant"):
+            try:
+                st.write_stream(stream_assistant_response(user_message, message))
+            except Exception as e:
+                logger.error(f"Streaming response failed: {e}")
+                st.error("Sorry, AVA could not respond right now, please try again!")
+        if message["content"] or message["attachments"]:
+            chat_store.append(message)
+
+    @st.fragment
+    def chat_transcript():
+        """Sending a message or expanding history reruns only the transcript"""
+        with measure_render("chat_transcript"):
+            # Display chat messages from history on rerun
+            render_history(chat_store.messages)
+
+            if st.session_state.get("pending_user_message") is not None:
+                stream_pending_response()
+
+            st.chat_input(
+                placeholder="Type a message...",
+                key="chat_input",
+                on_submit=respond_to_user_input,
+                args=None,
+                kwargs=None,
+            )
+
+    chat_transcript()
@@ -1,10 +1,34 @@
+import math
 import os
-import requests
+import zipfile
 import streamlit as st
-from azure.storage.blob import BlobServiceClient, BlobClient
+from loguru import logger
 from dotenv import load_dotenv
 
+import http_client
+from blob_storage import (
+    BLOB_MAX_CONCURRENCY,
+    encoded_length,
+    get_blob_client,
+    get_container_client,
+    iter_encoded,
+)
 from config import ENV_FILE_PATH, BACKEND_URL
+from document_manifest import (
+    content_hash,
+    delete_delta,
+    document_manifest,
+    merge_deltas,
+    write_delta,
+    write_delta_batch,
+)
+from knowledge_bulk import build_export_archive, read_uploaded_documents, run_parallel, write_batch
+from knowledge_cache import blob_listing_cache, document_content_cache
+from knowledge_search import knowledge_index_registry
+from local_knowledge import local_knowledge_store
+from metrics import span, timed
+from render_metrics import measure_render
+from reembed_queue import ReembedQueue, QUEUED, RUNNING, DONE, FAILED
 # from insert_vectors import update_vector_store_with_new_documents
 
 load_dotenv(ENV_FILE_PATH)
@@ -14,20 +38,114 @@ if connection_string is None:
     st.error("Azure Blob Storage connection string is not set. Please set the AZURE_AVA_POC_APPS_CONNECTION_STRING environment variable.")
     st.stop()
 container_name = "product-knowledge"
+# Files above this size are shown a page at a time and cannot be edited in the browser
+KNOWLEDGE_PAGED_VIEW_THRESHOLD_BYTES = int(
+    os.getenv("KNOWLEDGE_PAGED_VIEW_THRESHOLD_BYTES", str(2 * 1024 * 1024))
+)
+KNOWLEDGE_PAGE_SIZE_BYTES = int(os.getenv("KNOWLEDGE_PAGE_SIZE_BYTES", str(64 * 1024)))
+# Files above the paged view threshold are indexed for search this many bytes at a time
+KNOWLEDGE_INDEX_READ_CHUNK_BYTES = int(os.getenv("KNOWLEDGE_INDEX_READ_CHUNK_BYTES", str(1024 * 1024)))
+# A tenant re-embed can take minutes, by default the request waits for as long as the backend works
+REEMBED_READ_TIMEOUT_SECONDS = (
+    float(os.environ["REEMBED_READ_TIMEOUT_SECONDS"])
+    if os.getenv("REEMBED_READ_TIMEOUT_SECONDS")
+    else None
+)
+# How often a queued or running re-embed job's status is refreshed on the page
+REEMBED_STATUS_REFRESH_SECONDS = float(os.getenv("REEMBED_STATUS_REFRESH_SECONDS", "2"))
+# Send only the changed documents, needs a backend that accepts the JSON delta body
+REEMBED_DELTA_PAYLOAD_ENABLED = os.getenv("REEMBED_DELTA_PAYLOAD_ENABLED", "false").lower() == "true"
 # azure_folder = os.getenv("TENANT_NAME", "dhupar")
 
 # st.logo("streamlit_app/images/pragmaticai_logo.png")
 
-def update_vector_store_with_new_documents():
+def _post_reembed(access_token, **body):
     url = f"{BACKEND_URL}/api/ava/re-embed-tenant-documents"
-    headers = {"Authorization": f"Bearer {st.session_state.get('access_token')}"}
-    response = requests.post(url, data={"tenant_id": st.session_state.get("selected_tenant_id")}, headers=headers)
-    if response.status_code == 200:
+    headers = {"Authorization": f"Bearer {access_token}"}
+    return http_client.post(
+        url,
+        headers=headers,
+        timeout=(http_client.DEFAULT_TIMEOUT[0], REEMBED_READ_TIMEOUT_SECONDS),
+        **body,
+    )
+
+
+@timed("reembed_request")
+def update_vector_store_with_new_documents(tenant_id, access_token, delta):
+    payload = document_manifest.build_payload(tenant_id, delta)
+    if payload is None:
+        logger.debug(f"No document changes to re-embed for tenant {tenant_id}")
+        return True
+
+    response = None
+    if REEMBED_DELTA_PAYLOAD_ENABLED:
+        logger.info(
+            f"Re-embedding {len(payload['upserted'])} changed, {len(payload['deleted'])} deleted "
+            f"and {len(payload['renamed'])} renamed documents for tenant {tenant_id}"
+        )
+        response = _post_reembed(access_token, json=payload)
+        if 400 <= response.status_code < 500:
+            logger.warning(
+                f"Backend rejected the re-embed delta ({response.status_code}), "
+                f"re-embedding all documents of tenant {tenant_id}"
+            )
+            response = None
+    if response is None:
+        # Full re-embed of the tenant, the body every backend version accepts
+        response = _post_reembed(access_token, data={"tenant_id": tenant_id})
+    if response.status_code != 200:
+        return False
+    document_manifest.apply(tenant_id, delta)
+    return True
+
+
+reembed_queue = ReembedQueue(
+    update_vector_store_with_new_documents,
+    merge=lambda previous, new: {
+        **new,
+        "delta": merge_deltas(previous["delta"], new["delta"]),
+    },
+)
+
+
+def schedule_reembed(delta):
+    reembed_queue.schedule(
+        st.session_state.get("selected_tenant_id"),
+        access_token=st.session_state.get("access_token"),
+        delta=delta,
+    )
+
+
+def _render_reembed_status(status):
+    if status["state"] == QUEUED:
+        st.info("Document changes are queued for re-embedding")
+    elif status["state"] == RUNNING:
+        st.info("Re-embedding documents...")
+    elif status["state"] == DONE:
         st.success("Documents re-embedded successfully")
     else:
         st.error("Failed to re-embed documents")
 
 
+@st.fragment(run_every=REEMBED_STATUS_REFRESH_SECONDS)
+def _live_reembed_status(tenant_id):
+    status = reembed_queue.status(tenant_id)
+    if status is not None:
+        _render_reembed_status(status)
+
+
+def show_reembed_status(tenant_id):
+    """Status of the tenant's re-embed job, polled without a full rerun while it can still change"""
+    status = reembed_queue.status(tenant_id)
+    if status is None:
+        return
+    if status["state"] == FAILED:
+        # Stays as is until the next edit, nothing to poll for
+        _render_reembed_status(status)
+    else:
+        _live_reembed_status(tenant_id)
+
+
 def product_knowledge_page():
     
     # # Configure storage backend
@@ -35,72 +153,259 @@ def product_knowledge_page():
         os.getenv("USE_AZURE_STORAGE_FOR_PRODUCT_KNOWLEDGE", "true").lower() == "true"
     )
     azure_folder = st.session_state.get("selected_tenant_id")
+    azure_prefix = f"{azure_folder}/" if azure_folder else ""
+    index_tenant = azure_folder if use_azure else f"local-{azure_folder}"
     # azure_folder = "dhupar"
     # Function to get all .txt files
     def get_txt_files():
+        """Return {file name: size in bytes} of the tenant's documents"""
         if use_azure:
-            blob_service_client = BlobServiceClient.from_connection_string(
-                connection_string
-            )
-            
-            container_client = blob_service_client.get_container_client(container_name)
-            prefix = f"{azure_folder}/" if azure_folder else ""
-            return [
-                blob.name[len(prefix) :]
-                for blob in container_client.list_blobs(name_starts_with=prefix)
-                if blob.name.endswith(".txt") and "/" not in blob.name[len(prefix) :]
-            ]
+            container_client = get_container_client(connection_string, container_name)
+            listing = blob_listing_cache.list_files(container_client, azure_prefix)
+            return {name: properties["size"] for name, properties in listing.items()}
         else:
-            folder_path = "knowledgebase"
-            return [f for f in os.listdir(folder_path) if f.endswith(".txt")]
+            listing = local_knowledge_store.list_files(azure_folder)
+            return {name: properties["size"] for name, properties in listing.items()}
+
+    # Version of each document, the search index re-reads documents whose version changed
+    def get_file_versions():
+        if use_azure:
+            container_client = get_container_client(connection_string, container_name)
+            listing = blob_listing_cache.list_files(container_client, azure_prefix)
+            return {name: properties["etag"] for name, properties in listing.items()}
+        else:
+            listing = local_knowledge_store.list_files(azure_folder)
+            return {name: properties["version"] for name, properties in listing.items()}
 
     # Function to read file content
     def read_file(file_name):
         if use_azure:
             full_path = f"{azure_folder}/{file_name}" if azure_folder else file_name
-            blob_client = BlobClient.from_connection_string(
-                connection_string, container_name, full_path
+            blob_client = get_blob_client(connection_string, container_name, full_path)
+            content = document_content_cache.read(blob_client, azure_folder, file_name)
+            logger.debug(f"Document cache stats: {document_content_cache.stats()}")
+            return content
+        else:
+            return local_knowledge_store.read(azure_folder, file_name)
+
+    # Function to read bytes of a file, for files too large to load whole
+    def read_file_bytes(file_name, offset, length):
+        if use_azure:
+            full_path = f"{azure_folder}/{file_name}" if azure_folder else file_name
+            blob_client = get_blob_client(connection_string, container_name, full_path)
+            with span("blob_operation", op="download_range"):
+                return blob_client.download_blob(
+                    offset=offset, length=length, max_concurrency=BLOB_MAX_CONCURRENCY
+                ).readall()
+        return local_knowledge_store.read_range(azure_folder, file_name, offset, length)
+
+    def read_file_range(file_name, offset, length):
+        # A page boundary can split a multi-byte character
+        return read_file_bytes(file_name, offset, length).decode("utf-8", errors="ignore")
+
+    def read_file_chunks(file_name, file_size):
+        for offset in range(0, file_size, KNOWLEDGE_INDEX_READ_CHUNK_BYTES):
+            yield read_file_bytes(file_name, offset, KNOWLEDGE_INDEX_READ_CHUNK_BYTES)
+
+    def show_paged_file(file_name, file_size):
+        page_count = max(math.ceil(file_size / KNOWLEDGE_PAGE_SIZE_BYTES), 1)
+        page = st.number_input(
+            f"Page (of {page_count})",
+            min_value=1,
+            max_value=page_count,
+            value=1,
+            key=f"file_page_{file_name}",
+        )
+        offset = (page - 1) * KNOWLEDGE_PAGE_SIZE_BYTES
+        st.caption(
+            f"Showing bytes {offset:,}-{min(offset + KNOWLEDGE_PAGE_SIZE_BYTES, file_size):,} of {file_size:,}"
+        )
+        st.text(read_file_range(file_name, offset, KNOWLEDGE_PAGE_SIZE_BYTES))
+
+    # Function to store file content, without re-embedding
+    def upload_file(file_name, content):
+        if use_azure:
+            full_path = f"{azure_folder}/{file_name}" if azure_folder else file_name
+            blob_client = get_blob_client(connection_string, container_name, full_path)
+            size = encoded_length(content)
+            with span("blob_operation", op="upload"):
+                # Blocks are encoded as they are sent, not all at once up front
+                result = blob_client.upload_blob(
+                    iter_encoded(content),
+                    length=size,
+                    overwrite=True,
+                    max_concurrency=BLOB_MAX_CONCURRENCY,
+                )
+            blob_listing_cache.record_write(
+                container_name,
+                azure_prefix,
+                file_name,
+                etag=result.get("etag"),
+                last_modified=result.get("last_modified"),
+                size=size,
             )
-            return blob_client.download_blob().content_as_text()
+            document_content_cache.put(azure_folder, file_name, result.get("etag"), content)
+            return result.get("etag")
         else:
-            folder_path = "knowledgebase"
-            file_path = os.path.join(folder_path, file_name)
-            with open(file_path, "r") as file:
-                return file.read()
+            return local_knowledge_store.write(azure_folder, file_name, content)
+
+    # Version of a blob in storage right now, None when it does not exist
+    def current_version(file_name):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        full_path = f"{azure_folder}/{file_name}" if azure_folder else file_name
+        blob_client = get_blob_client(connection_string, container_name, full_path)
+        try:
+            with span("blob_operation", op="properties"):
+                return blob_client.get_blob_properties().etag
+        except ResourceNotFoundError:
+            return None
 
     # Function to write file content
     def write_file(file_name, content):
+        # Saving embedded content again only skips the re-embed when the blob
+        # is still the embedded version, another process may have changed it
+        base_version = None
+        if use_azure and document_manifest.embedded_version(azure_folder, file_name, content_hash(content)):
+            base_version = current_version(file_name)
+        version = upload_file(file_name, content)
+        knowledge_index_registry.record_write(index_tenant, file_name, content, version)
+        if use_azure:
+            schedule_reembed(write_delta(file_name, content, version, base_version))
+
+    # Function to remove a file from storage, without re-embedding
+    def remove_file(file_name):
         if use_azure:
             full_path = f"{azure_folder}/{file_name}" if azure_folder else file_name
-            blob_client = BlobClient.from_connection_string(
-                connection_string, container_name, full_path
-            )
-            blob_client.upload_blob(content, overwrite=True)
-            update_vector_store_with_new_documents()
+            blob_client = get_blob_client(connection_string, container_name, full_path)
+            with span("blob_operation", op="delete"):
+                blob_client.delete_blob()
+            blob_listing_cache.record_delete(container_name, azure_prefix, file_name)
+            document_content_cache.evict(azure_folder, file_name)
         else:
-            folder_path = "knowledgebase"
-            file_path = os.path.join(folder_path, file_name)
-            with open(file_path, "w") as file:
-                file.write(content)
+            local_knowledge_store.delete(azure_folder, file_name)
 
     # Function to delete file
     def delete_file(file_name):
+        remove_file(file_name)
+        knowledge_index_registry.record_delete(index_tenant, file_name)
         if use_azure:
-            full_path = f"{azure_folder}/{file_name}" if azure_folder else file_name
-            blob_client = BlobClient.from_connection_string(
-                connection_string, container_name, full_path
-            )
-            blob_client.delete_blob()
             setattr(st.session_state, "delete_file_button_clicked", False)
-            update_vector_store_with_new_documents()
-        else:
-            folder_path = "knowledgebase"
-            file_path = os.path.join(folder_path, file_name)
-            os.remove(file_path)
+            schedule_reembed(delete_delta(file_name))
 
         st.success(f"Deleted {st.session_state.selected_file}")
         st.session_state.selected_file = None
 
+    def import_documents(documents, existing_files):
+        """Write a batch of documents as one unit, re-embedding once at the end.
+
+        Overwritten documents are read first so that, if any upload fails,
+        every document of the batch can be put back the way it was.
+        """
+        progress = st.progress(0.0, text="Preparing import...")
+        overwritten = [name for name in documents if name in existing_files]
+        previous, errors = run_parallel({name: None for name in overwritten}, lambda name, _: read_file(name))
+        if errors:
+            progress.empty()
+            st.error(f"Import cancelled, could not read {', '.join(sorted(errors))}")
+            return False
+
+        uploaded, errors, left_changed = write_batch(
+            documents,
+            previous,
+            upload_file,
+            remove_file,
+            on_progress=lambda done, total: progress.progress(
+                done / total, text=f"Uploaded {done} of {total} documents"
+            ),
+        )
+        if errors:
+            progress.empty()
+            if not left_changed:
+                st.error(f"Import failed for {', '.join(sorted(errors))}, no documents were changed")
+                return False
+            st.error(
+                f"Import failed for {', '.join(sorted(errors))} and could not be undone for "
+                f"{', '.join(left_changed)}, these now hold the imported content"
+            )
+            # Keep search and embeddings in line with what storage holds now
+            for file_name in left_changed:
+                knowledge_index_registry.record_write(
+                    index_tenant, file_name, documents[file_name], uploaded[file_name]
+                )
+            if use_azure:
+                schedule_reembed(
+                    write_delta_batch(
+                        {name: documents[name] for name in left_changed},
+                        versions={name: uploaded[name] for name in left_changed},
+                    )
+                )
+            return False
+
+        progress.empty()
+        for file_name, version in uploaded.items():
+            knowledge_index_registry.record_write(index_tenant, file_name, documents[file_name], version)
+        if use_azure:
+            delta = write_delta_batch(documents, versions=uploaded)
+            schedule_reembed(delta)
+        return True
+
+    def export_documents(file_names):
+        progress = st.progress(0.0, text="Preparing export...")
+        documents, errors = run_parallel(
+            {name: None for name in file_names},
+            lambda name, _: read_file(name),
+            on_progress=lambda done, total: progress.progress(
+                done / total, text=f"Downloaded {done} of {total} documents"
+            ),
+        )
+        progress.empty()
+        if errors:
+            st.error(f"Export failed for {', '.join(sorted(errors))}")
+            return None
+        return build_export_archive(documents)
+
+    def read_document_for_index(file_name):
+        # Large files are indexed a chunk at a time, like the paged view never loads them whole
+        file_size = get_txt_files().get(file_name, 0)
+        if file_size > KNOWLEDGE_PAGED_VIEW_THRESHOLD_BYTES:
+            return read_file_chunks(file_name, file_size)
+        return read_file(file_name)
+
+    def open_search_result(file_name):
+        st.session_state["file_selector"] = file_name
+        st.session_state["new_file"] = False
+        st.session_state["edit_mode"] = False
+        st.session_state["search_result_opened"] = True
+
+    @st.fragment
+    def knowledge_search():
+        """Searches rerun only this panel, opening a result reruns the app to show it"""
+        with measure_render("knowledge_search"):
+            if st.session_state.pop("search_result_opened", False):
+                st.rerun(scope="app")
+
+            query = st.text_input("Search documents", key="knowledge_search_query")
+            if not query:
+                return
+            # Only documents added or changed outside this app are read here
+            with st.spinner("Updating search index..."):
+                index = knowledge_index_registry.sync(index_tenant, get_file_versions(), read_document_for_index)
+            results = index.search(query, read_range=read_file_bytes)
+            if not results:
+                st.caption("No matching documents")
+            for i, result in enumerate(results):
+                col1, col2 = st.columns([5, 1])
+                with col1:
+                    st.markdown(f"**{result['file_name']}**  \n{result['snippet']}")
+                with col2:
+                    st.button(
+                        "Open",
+                        key=f"knowledge_search_open_{i}",
+                        on_click=open_search_result,
+                        args=(result["file_name"],),
+                    )
+
     def new_file_button_clicked():
         st.session_state["new_file"] = True
         st.session_state["edit_mode"] = False
@@ -111,121 +416,190 @@ def product_knowledge_page():
     def is_edit_mode():
         return st.session_state.get("edit_mode", False)
 
-    with st.sidebar:
-        st.button(
-            "Add New File", key="new_file_button", on_click=new_file_button_clicked
-        )
+    show_reembed_status(azure_folder)
 
-        files = get_txt_files()
-        selected_file = st.radio("Select a file", files, key="file_selector")
-        if not st.session_state.get("new_file", False):
-            st.session_state.selected_file = selected_file
+    knowledge_search()
 
-    # Main content area
-    if st.session_state.get("new_file", False):
-        st.subheader("Create New File")
+    @st.fragment
+    def bulk_transfer():
+        with measure_render("bulk_transfer"):
+            file_sizes = get_txt_files()
+            files = sorted(file_sizes)
+            with st.expander("Bulk import / export"):
+                if st.session_state.get("bulk_import_message"):
+                    st.success(st.session_state.pop("bulk_import_message"))
+                uploaded_files = st.file_uploader(
+                    "Upload .txt documents or .zip archives of them",
+                    type=["txt", "zip"],
+                    accept_multiple_files=True,
+                    key="bulk_import_files",
+                )
+                if uploaded_files and st.button("Import documents"):
+                    try:
+                        documents = read_uploaded_documents(uploaded_files)
+                    except (ValueError, zipfile.BadZipFile) as e:
+                        st.error(f"Import cancelled: {e}")
+                        documents = None
+                    if documents == {}:
+                        st.warning("No .txt documents found in the upload")
+                    elif documents and import_documents(documents, file_sizes):
+                        # The sidebar lists the new documents only after a full rerun
+                        st.session_state["bulk_import_message"] = f"Imported {len(documents)} documents"
+                        st.rerun(scope="app")
 
-        new_file_name = st.text_input("Enter new file name")
-        new_file_name = (
-            new_file_name + ".txt"
-            if new_file_name and not new_file_name.endswith(".txt")
-            else new_file_name
-        )
+                if st.button("Prepare export", disabled=not files):
+                    st.session_state["bulk_export_archive"] = export_documents(files)
+                if st.session_state.get("bulk_export_archive"):
+                    st.download_button(
+                        "Download documents",
+                        data=st.session_state["bulk_export_archive"],
+                        file_name=f"product-knowledge-{azure_folder or 'local'}.zip",
+                        mime="application/zip",
+                    )
 
-        new_file_content = st.text_area("Enter file content", height=500)
+    bulk_transfer()
 
-        col1, col2, col3 = st.columns([1, 5, 1])
-        with col1:
-            if st.button("Save New File"):
-                if new_file_name:
-                    write_file(new_file_name, new_file_content)
-                    st.success(f"File {new_file_name} added successfully")
-                    st.session_state.new_file = False
-                    st.rerun()
-                else:
-                    st.error("Please enter a file name")
-        with col2:
-            if st.button("Cancel"):
-                st.session_state.new_file = False
-                st.rerun()
-
-    elif st.session_state.get("selected_file"):
-        content = read_file(st.session_state.selected_file)
-
-        if not is_edit_mode():
-            # st.subheader("Viewing file")
-            st.write(f"## {st.session_state.selected_file}")
-
-            content_container = st.container()
-            content_container.write(
-                content,
-                # f"""
-                #     <div style="border: 1px solid #ddd; border-radius: 5px; padding: 10px; background-color: #f9f9f9;">
-                #         <pre style="white-space: pre-wrap; word-wrap: break-word;">{content}</pre>
-                #     </div>
-                #     """,
-                unsafe_allow_html=True,
-            )
+    # Viewing, paging and editing a file only rerun the editor, saving or
+    # deleting reruns the app so the sidebar file list is current
+    @st.fragment
+    def knowledge_editor():
+        with measure_render("knowledge_editor"):
+            # Main content area
+            if st.session_state.get("new_file", False):
+                st.subheader("Create New File")
 
-            st.write("")
-            col1, col2, col3 = st.columns([1, 1, 1])
-            with col1:
-                if st.button("Edit"):
-                    enter_edit_mode()
-                    st.rerun()
+                new_file_name = st.text_input("Enter new file name")
+                new_file_name = (
+                    new_file_name + ".txt"
+                    if new_file_name and not new_file_name.endswith(".txt")
+                    else new_file_name
+                )
 
-            with col3:
-                if st.button("Delete File", type="primary"):
-                    st.session_state["delete_file_button_clicked"] = True
+                new_file_content = st.text_area("Enter file content", height=500)
 
-                if st.session_state.get("delete_file_button_clicked", False):
-                    st.warning("Are you sure you want to delete this file?")
-                    st.button(
-                        "Yes, I'm sure",
-                        on_click=lambda: delete_file(st.session_state.selected_file),
+                col1, col2, col3 = st.columns([1, 5, 1])
+                with col1:
+                    if st.button("Save New File"):
+                        if new_file_name:
+                            write_file(new_file_name, new_file_content)
+                            st.success(f"File {new_file_name} added successfully")
+                            st.session_state.new_file = False
+                            st.rerun()
+                        else:
+                            st.error("Please enter a file name")
+                with col2:
+                    if st.button("Cancel"):
+                        st.session_state.new_file = False
+                        st.session_state.selected_file = st.session_state.get("file_selector")
+                        st.rerun(scope="fragment")
+
+            elif st.session_state.get("selected_file"):
+                file_size = get_txt_files().get(st.session_state.selected_file) or 0
+                is_large_file = file_size > KNOWLEDGE_PAGED_VIEW_THRESHOLD_BYTES
+
+                if not is_edit_mode() or is_large_file:
+                    # st.subheader("Viewing file")
+                    st.write(f"## {st.session_state.selected_file}")
+
+                    if is_large_file:
+                        st.info("This file is too large to edit here, it is shown one page at a time.")
+                        show_paged_file(st.session_state.selected_file, file_size)
+                    else:
+                        content = read_file(st.session_state.selected_file)
+                        content_container = st.container()
+                        content_container.write(
+                            content,
+                            # f"""
+                            #     <div style="border: 1px solid #ddd; border-radius: 5px; padding: 10px; background-color: #f9f9f9;">
+                            #         <pre style="white-space: pre-wrap; word-wrap: break-word;">{content}</pre>
+                            #     </div>
+                            #     """,
+                            unsafe_allow_html=True,
+                        )
+
+                    st.write("")
+                    col1, col2, col3 = st.columns([1, 1, 1])
+                    with col1:
+                        if st.button("Edit", disabled=is_large_file):
+                            enter_edit_mode()
+                            st.rerun(scope="fragment")
+
+                    with col3:
+                        if st.button("Delete File", type="primary"):
+                            st.session_state["delete_file_button_clicked"] = True
+
+                        if st.session_state.get("delete_file_button_clicked", False):
+                            st.warning("Are you sure you want to delete this file?")
+                            if st.button("Yes, I'm sure"):
+                                delete_file(st.session_state.selected_file)
+                                # Refresh the file list in the sidebar
+                                st.rerun(scope="app")
+                            st.button(
+                                "No, don't delete it",
+                                on_click=lambda: setattr(
+                                    st.session_state, "delete_file_button_clicked", False
+                                ),
+                            )
+
+                else:
+                    content = read_file(st.session_state.selected_file)
+                    st.subheader("Editing file")
+                    new_file_name = st.text_input(
+                        "File name", value=st.session_state.selected_file
                     )
-                    st.button(
-                        "No, don't delete it",
-                        on_click=lambda: setattr(
-                            st.session_state, "delete_file_button_clicked", False
-                        ),
+                    new_file_name = (
+                        new_file_name + ".txt"
+                        if new_file_name and not new_file_name.endswith(".txt")
+                        else new_file_name
+                    )
+                    edited_content = st.text_area(
+                        "Edit file content", value=content, height=500
                     )
 
-        else:
-            st.subheader("Editing file")
-            new_file_name = st.text_input(
-                "File name", value=st.session_state.selected_file
-            )
-            new_file_name = (
-                new_file_name + ".txt"
-                if new_file_name and not new_file_name.endswith(".txt")
-                else new_file_name
-            )
-            edited_content = st.text_area(
-                "Edit file content", value=content, height=500
-            )
+                    st.write("")
+                    col1, col3 = st.columns([1, 1])
 
-            st.write("")
-            col1, col3 = st.columns([1, 1])
+                    with col1:
+                        if st.button("Save Changes"):
+                            if new_file_name != st.session_state.selected_file:
+                                write_file(new_file_name, edited_content)
+                                delete_file(st.session_state.selected_file)
+                            else:
+                                write_file(new_file_name, edited_content)
 
-            with col1:
-                if st.button("Save Changes"):
-                    if new_file_name != st.session_state.selected_file:
-                        write_file(new_file_name, edited_content)
-                        delete_file(st.session_state.selected_file)
-                    else:
-                        write_file(new_file_name, edited_content)
+                            st.success("Changes saved successfully")
+                            st.session_state.edit_mode = False
+                            st.rerun()
+                    with col3:
+                        if st.button("Cancel"):
+                            st.session_state.edit_mode = False
+                            st.rerun(scope="fragment")
 
-                    st.success("Changes saved successfully")
-                    st.session_state.edit_mode = False
-                    st.rerun()
-            with col3:
-                if st.button("Cancel"):
-                    st.session_state.edit_mode = False
-                    st.rerun()
+            else:
+                st.info("Select a file from the sidebar or create a new file to get started.")
 
-    else:
-        st.info("Select a file from the sidebar or create a new file to get started.")
+    # Picking a file or adding one reruns the file list and the editor, not the
+    # app. A fragment cannot write to the sidebar and the page body both, so
+    # the list is a sidebar fragment that renders the editor into this slot
+    editor_slot = st.empty()
+
+    @st.fragment
+    def knowledge_files():
+        with measure_render("knowledge_files"):
+            st.button(
+                "Add New File", key="new_file_button", on_click=new_file_button_clicked
+            )
+
+            files = sorted(get_txt_files())
+            selected_file = st.radio("Select a file", files, key="file_selector")
+            if not st.session_state.get("new_file", False):
+                st.session_state.selected_file = selected_file
+
+            with editor_slot.container():
+                knowledge_editor()
+
+    with st.sidebar:
+        knowledge_files()
 
     # CSS to style the delete button and adjust layout
     st.markdown(
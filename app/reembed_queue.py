@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from loguru import logger
+
+REEMBED_DEBOUNCE_SECONDS = float(os.getenv("REEMBED_DEBOUNCE_SECONDS", "5"))
+# A finished job stops being reported after this, failures stay until the retry
+REEMBED_DONE_STATUS_TTL_SECONDS = float(os.getenv("REEMBED_DONE_STATUS_TTL_SECONDS", "10"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class ReembedQueue:
+    """Per-tenant, debounced background runner for re-embedding jobs.
+
+    Every `schedule` call restarts the tenant's debounce window, so a burst
+    of edits (e.g. a rename, which is a write plus a delete) collapses into
+    a single job. Edits that arrive while a job is running queue exactly one
+    follow-up job. `job` is called as `job(tenant_id, **kwargs)` on a worker
+    thread and must return True on success.
+
+    When `merge` is given, the kwargs of coalesced calls are combined with
+    `merge(previous, new)` instead of the latest call winning, and the
+    kwargs of a failed job are kept so the next edit retries them.
+    """
+
+    def __init__(
+        self,
+        job,
+        debounce=REEMBED_DEBOUNCE_SECONDS,
+        merge=None,
+        done_ttl=REEMBED_DONE_STATUS_TTL_SECONDS,
+    ):
+        self.job = job
+        self.debounce = debounce
+        self.merge = merge
+        self.done_ttl = done_ttl
+        self._lock = threading.Lock()
+        self._timers = {}
+        self._pending = {}
+        self._running = set()
+        self._status = {}
+
+    def schedule(self, tenant_id, **kwargs):
+        with self._lock:
+            previous = self._pending.get(tenant_id)
+            if previous is not None and self.merge is not None:
+                kwargs = self.merge(previous, kwargs)
+            self._pending[tenant_id] = kwargs
+            self._set_status(tenant_id, QUEUED)
+            if tenant_id in self._running:
+                # Picked up by the running worker once it finishes
+                return
+            self._restart_timer(tenant_id)
+        logger.debug(f"Re-embed for tenant {tenant_id} queued")
+
+    def status(self, tenant_id):
+        with self._lock:
+            status = self._status.get(tenant_id)
+            if status is None:
+                return None
+            if status["state"] == DONE and time.time() - status["updated_at"] >= self.done_ttl:
+                del self._status[tenant_id]
+                return None
+            return dict(status)
+
+    def _set_status(self, tenant_id, state, error=None):
+        self._status[tenant_id] = {"state": state, "updated_at": time.time(), "error": error}
+
+    def _restart_timer(self, tenant_id):
+        timer = self._timers.get(tenant_id)
+        if timer is not None:
+            timer.cancel()
+        timer = threading.Timer(self.debounce, self._run, args=(tenant_id,))
+        timer.daemon = True
+        self._timers[tenant_id] = timer
+        timer.start()
+
+    def _run(self, tenant_id):
+        with self._lock:
+            self._timers.pop(tenant_id, None)
+            kwargs = self._pending.pop(tenant_id, None)
+            if kwargs is None:
+                return
+            self._running.add(tenant_id)
+            self._set_status(tenant_id, RUNNING)
+
+        logger.info(f"Re-embedding documents for tenant {tenant_id}")
+        error = None
+        try:
+            succeeded = self.job(tenant_id, **kwargs)
+        except Exception as e:
+            succeeded = False
+            error = str(e)
+        if not succeeded:
+            logger.error(f"Re-embed for tenant {tenant_id} failed: {error}")
+
+        with self._lock:
+            self._running.discard(tenant_id)
+            if not succeeded and self.merge is not None:
+                newer = self._pending.get(tenant_id)
+                self._pending[tenant_id] = (
+                    kwargs if newer is None else self.merge(kwargs, newer)
+                )
+                if newer is None:
+                    # Retried together with the next edit
+                    self._set_status(tenant_id, FAILED, error)
+                    return
+            if tenant_id in self._pending:
+                self._set_status(tenant_id, QUEUED)
+                self._restart_timer(tenant_id)
+            else:
+                self._set_status(tenant_id, DONE if succeeded else FAILED, error)
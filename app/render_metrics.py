@@ -0,0 +1,42 @@
+import threading
+import time
+from contextlib import contextmanager
+from loguru import logger
+
+from metrics import METRICS_ENABLED, metrics
+
+_stats = {}
+_lock = threading.Lock()
+
+
+@contextmanager
+def measure_render(scope):
+    """Log the wall and CPU time of a rerun of `scope` (the app or one fragment).
+
+    CPU time is the script thread's own, so concurrent sessions do not skew it.
+    """
+    wall_started = time.perf_counter()
+    cpu_started = time.thread_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall_started
+        cpu = time.thread_time() - cpu_started
+        with _lock:
+            stats = _stats.setdefault(scope, {"runs": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0})
+            stats["runs"] += 1
+            stats["wall_seconds"] += wall
+            stats["cpu_seconds"] += cpu
+        if METRICS_ENABLED:
+            metrics.observe("render", wall, scope=scope)
+            metrics.observe("render_cpu", cpu, scope=scope)
+        logger.info(f"Rendered {scope} in {wall:.3f}s, {cpu * 1000:.1f}ms CPU")
+
+
+def render_stats():
+    """{scope: {runs, wall_seconds, cpu_seconds, cpu_ms_per_run}} since the process started"""
+    with _lock:
+        return {
+            scope: {**stats, "cpu_ms_per_run": stats["cpu_seconds"] * 1000 / stats["runs"]}
+            for scope, stats in _stats.items()
+        }
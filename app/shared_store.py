@@ -0,0 +1,193 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from loguru import logger
+
+# memory (per process), sqlite (processes on one host) or redis (any host)
+SHARED_STORE_BACKEND = os.getenv("SHARED_STORE_BACKEND", "memory").lower()
+SHARED_STORE_PATH = os.getenv("SHARED_STORE_PATH", ".shared_store.sqlite3")
+SHARED_STORE_URL = os.getenv("SHARED_STORE_URL", "redis://localhost:6379/0")
+SHARED_STORE_MEMORY_MAX_ENTRIES = int(os.getenv("SHARED_STORE_MEMORY_MAX_ENTRIES", "10000"))
+# Expired SQLite rows are deleted by the first write after each interval
+SHARED_STORE_SQLITE_PURGE_INTERVAL_SECONDS = float(os.getenv("SHARED_STORE_SQLITE_PURGE_INTERVAL_SECONDS", "60"))
+# Pickled values kept in the SQLite file, rows expiring soonest go first beyond it
+SHARED_STORE_SQLITE_MAX_BYTES = int(os.getenv("SHARED_STORE_SQLITE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+class MemoryStore:
+    """Process-local key/value store with per-key TTL"""
+
+    shared = False
+
+    def __init__(self, max_entries=SHARED_STORE_MEMORY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            if len(self._entries) > self.max_entries:
+                self._purge()
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _purge(self):
+        now = time.time()
+        for key in [k for k, (_, exp) in self._entries.items() if exp is not None and exp <= now]:
+            del self._entries[key]
+        # Still full of live entries, drop the oldest inserted
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+
+class SQLiteStore:
+    """Key/value store in a local SQLite file, shared by every process on the host.
+
+    Writes periodically delete expired rows and trim the stored values to
+    `max_bytes`, so keys that are never read again do not grow the file.
+    Freed pages are reused by later writes rather than returned to the OS.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        path=SHARED_STORE_PATH,
+        purge_interval=SHARED_STORE_SQLITE_PURGE_INTERVAL_SECONDS,
+        max_bytes=SHARED_STORE_SQLITE_MAX_BYTES,
+    ):
+        self.path = path
+        self.purge_interval = purge_interval
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._last_purge = 0.0
+        self._purge_lock = threading.Lock()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+        conn.commit()
+
+    def _connect(self):
+        # sqlite3 connections may not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(key)
+            return None
+        return pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl is not None else None
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, pickle.dumps(value), expires_at),
+        )
+        conn.commit()
+        self._maybe_purge()
+
+    def delete(self, key):
+        conn = self._connect()
+        conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+        conn.commit()
+
+    def _maybe_purge(self):
+        now = time.time()
+        with self._purge_lock:
+            if now - self._last_purge < self.purge_interval:
+                return
+            self._last_purge = now
+        self.purge(now)
+
+    def purge(self, now=None):
+        """Delete expired rows, then the ones expiring soonest while over `max_bytes`"""
+        conn = self._connect()
+        expired = conn.execute(
+            "DELETE FROM cache WHERE expires_at <= ?", (now or time.time(),)
+        ).rowcount
+        # Rows without expiry are kept longest, then the ones expiring latest
+        trimmed = conn.execute(
+            "DELETE FROM cache WHERE key IN ("
+            "SELECT key FROM (SELECT key, SUM(LENGTH(value)) OVER ("
+            "ORDER BY expires_at IS NULL DESC, expires_at DESC, key) AS kept FROM cache) "
+            "WHERE kept > ?)",
+            (self.max_bytes,),
+        ).rowcount
+        conn.commit()
+        if expired or trimmed:
+            logger.debug(f"Shared store purged {expired} expired and {trimmed} rows over the size cap")
+
+
+class RedisStore:
+    """Key/value store on Redis or any server speaking its protocol"""
+
+    shared = True
+
+    def __init__(self, url=SHARED_STORE_URL):
+        import redis
+
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        # Redis expiries are whole, positive milliseconds
+        px = max(int(ttl * 1000), 1) if ttl is not None else None
+        self._client.set(key, pickle.dumps(value), px=px)
+
+    def delete(self, key):
+        self._client.delete(key)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_shared_store():
+    """Return the process-wide store selected by SHARED_STORE_BACKEND"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if SHARED_STORE_BACKEND == "sqlite":
+                _store = SQLiteStore()
+            elif SHARED_STORE_BACKEND == "redis":
+                _store = RedisStore()
+            else:
+                _store = MemoryStore()
+            logger.info(f"Using {type(_store).__name__} for shared caches")
+    return _store
@@ -0,0 +1,35 @@
+import functools
+import io
+
+# Widest image Streamlit sends unchanged, it resizes wider ones on every call
+MAX_IMAGE_WIDTH = 2 * 730
+
+
+@functools.lru_cache(maxsize=None)
+def read_text(path):
+    """Contents of a text asset, read from disk once per process"""
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=None)
+def read_bytes(path):
+    """Contents of a binary asset, read from disk once per process"""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=None)
+def read_image(path, max_width=MAX_IMAGE_WIDTH):
+    """PNG bytes of an image asset at most `max_width` wide, resized once per process"""
+    from PIL import Image
+
+    data = read_bytes(path)
+    image = Image.open(io.BytesIO(data))
+    if image.width <= max_width and image.format == "PNG":
+        return data
+    if image.width > max_width:
+        image = image.resize((max_width, round(image.height * max_width / image.width)), Image.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from collections import namedtuple
+import jwt
+from loguru import logger
+
+import http_client
+from config import KINDE_ISSUER_URL
+
+KINDE_JWKS_URL = f"{KINDE_ISSUER_URL}/.well-known/jwks.json"
+KINDE_API_AUDIENCE = "api.pragmaticai.dev"
+JWKS_REFRESH_SECONDS = float(os.getenv("JWKS_REFRESH_SECONDS", "3600"))
+# Lower bound between refreshes triggered by an unknown key id
+JWKS_MIN_REFRESH_INTERVAL_SECONDS = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL_SECONDS", "60"))
+# How long the first verifications wait for the background thread's first refresh
+JWKS_INITIAL_REFRESH_WAIT_SECONDS = float(os.getenv("JWKS_INITIAL_REFRESH_WAIT_SECONDS", "10"))
+
+# The algorithm is pinned per key, never taken from the token header
+SigningKey = namedtuple("SigningKey", ["key", "algorithm"])
+
+
+class JWKSCache:
+    """Signing keys of the issuer, refreshed on a daemon thread.
+
+    A token signed with an unknown key id triggers an immediate refresh
+    (rate limited), so key rotation is picked up without waiting for the
+    next scheduled refresh. Once started, tokens verified before the
+    thread's first refresh completes wait for it instead of fetching the
+    keys a second time.
+    """
+
+    def __init__(
+        self,
+        jwks_url,
+        refresh_interval=JWKS_REFRESH_SECONDS,
+        min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL_SECONDS,
+        initial_refresh_wait=JWKS_INITIAL_REFRESH_WAIT_SECONDS,
+    ):
+        self.jwks_url = jwks_url
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.initial_refresh_wait = initial_refresh_wait
+        self._keys = {}
+        self._last_refresh = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._initial_refresh = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="jwks-refresh", daemon=True)
+            self._thread.start()
+
+    def refresh(self):
+        response = http_client.get(self.jwks_url)
+        response.raise_for_status()
+        keys = {}
+        for jwk in response.json().get("keys", []):
+            algorithm = jwk.get("alg")
+            try:
+                key = jwt.PyJWK(jwk, algorithm)
+            except jwt.PyJWKError as e:
+                logger.warning(f"Skipping unusable JWK {jwk.get('kid')}: {e}")
+                continue
+            # PyJWT only exposes the algorithm it inferred for a key without "alg" from 2.9 on
+            algorithm = algorithm or getattr(key, "algorithm_name", None)
+            if algorithm is None:
+                logger.warning(f"Skipping JWK {jwk.get('kid')} without an algorithm")
+                continue
+            keys[key.key_id] = SigningKey(key.key, algorithm)
+        with self._lock:
+            self._keys = keys
+            self._last_refresh = time.monotonic()
+        logger.debug(f"Loaded {len(keys)} signing keys from {self.jwks_url}")
+
+    def get_signing_key(self, kid):
+        if self._thread is not None and not self._initial_refresh.is_set():
+            self._initial_refresh.wait(self.initial_refresh_wait)
+        with self._lock:
+            key = self._keys.get(kid)
+            last_refresh = self._last_refresh
+        if key is not None:
+            return key
+
+        if last_refresh is None or time.monotonic() - last_refresh >= self.min_refresh_interval:
+            self.refresh()
+            with self._lock:
+                key = self._keys.get(kid)
+        if key is None:
+            raise jwt.InvalidKeyError(f"Unknown signing key {kid}")
+        return key
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"JWKS refresh failed: {e}")
+            # Failed or not, verifications stop waiting and refresh on their own if they must
+            self._initial_refresh.set()
+            time.sleep(self.refresh_interval)
+
+
+class TokenVerifier:
+    """Verifies access tokens locally and caches the profile per subject until the token expires"""
+
+    def __init__(self, jwks_cache, issuer=KINDE_ISSUER_URL, audience=KINDE_API_AUDIENCE):
+        self.jwks_cache = jwks_cache
+        self.issuer = issuer
+        self.audience = audience
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    def verify(self, token):
+        """Return the verified claims, raises `jwt.PyJWTError` for an invalid token"""
+        kid = jwt.get_unverified_header(token).get("kid")
+        signing_key = self.jwks_cache.get_signing_key(kid)
+        return jwt.decode(
+            token,
+            signing_key.key,
+            algorithms=[signing_key.algorithm],
+            issuer=self.issuer,
+            audience=self.audience,
+        )
+
+    def get_profile(self, claims):
+        """Cached profile for the token's subject, or one built from the claims when they carry it"""
+        if claims.get("email"):
+            return {
+                "id": claims["sub"],
+                "first_name": claims.get("given_name", "User"),
+                "last_name": claims.get("family_name", ""),
+                "email": claims["email"],
+            }
+        with self._lock:
+            entry = self._profiles.get(claims["sub"])
+            if entry is not None and entry["expires_at"] > time.time():
+                return entry["profile"]
+            self._profiles.pop(claims["sub"], None)
+        return None
+
+    def store_profile(self, claims, profile):
+        with self._lock:
+            self._profiles[claims["sub"]] = {
+                "profile": profile,
+                "expires_at": claims.get("exp", time.time()),
+            }
+
+
+_verifier = None
+_verifier_lock = threading.Lock()
+
+
+def get_token_verifier():
+    """Return the process-wide verifier, starting the JWKS refresh on first use"""
+    global _verifier
+    with _verifier_lock:
+        if _verifier is None:
+            jwks_cache = JWKSCache(KINDE_JWKS_URL)
+            jwks_cache.start()
+            _verifier = TokenVerifier(jwks_cache)
+    return _verifier
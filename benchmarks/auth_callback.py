@@ -0,0 +1,187 @@
+"""Requests/sec and p99 of the Kinde callback (app/fast_api_example.py) against a stub OAuth server.
+
+The stub answers the token and JWKS endpoints after a fixed
+delay, from its own process so it does not compete with the app for the
+GIL. Callbacks are sent to the FastAPI app in-process over ASGI, with a
+given number in flight at once, through two handlers:
+
+  sync     the default `def` route run in the threadpool, a new
+           KindeApiClient per callback whose SDK session exchanges the
+           code and decodes the id token for the profile
+  async    the `async def` route of AUTH_ASYNC_CALLBACK=true, token
+           exchange on the pooled KindeAsyncClient and the id token
+           decoded in the threadpool
+
+    python benchmarks/auth_callback.py --callbacks 1000 --concurrency 1 50 200
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+SIGNING_KEY_ID = "benchmark"
+
+
+def _signed_tokens():
+    """One RS256 key pair, its JWKS and a token response signed with it"""
+    import jwt
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from jwt.algorithms import RSAAlgorithm
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwks = {"keys": [{**jwk, "kid": SIGNING_KEY_ID, "alg": "RS256", "use": "sig"}]}
+    now = int(time.time())
+    claims = {"sub": "kp_benchmark", "iat": now, "exp": now + 3600}
+    profile = {"given_name": "Load", "family_name": "Test", "email": "load@example.com", "picture": None}
+    headers = {"kid": SIGNING_KEY_ID}
+    token = {
+        "access_token": jwt.encode(claims, private_key, algorithm="RS256", headers=headers),
+        "id_token": jwt.encode({**claims, **profile}, private_key, algorithm="RS256", headers=headers),
+        "refresh_token": "benchmark-refresh-token",
+        "token_type": "bearer",
+        "expires_in": 3600,
+    }
+    return jwks, token
+
+
+def serve_stub_oauth(connection, delay):
+    """Token and JWKS endpoints, every answer after `delay` seconds"""
+    jwks, token = _signed_tokens()
+    bodies = {
+        ("POST", "/oauth2/token"): token,
+        ("GET", "/.well-known/jwks.json"): jwks,
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _answer(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            body = bodies.get((self.command, self.path.split("?", 1)[0]))
+            time.sleep(delay)
+            data = json.dumps(body if body is not None else {"error": "not_found"}).encode("utf-8")
+            self.send_response(200 if body is not None else 404)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = _answer
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    connection.send(server.server_address[1])
+    server.serve_forever()
+
+
+def build_app(stub_url):
+    """The example service with its Kinde calls pointed at the stub, plus the async callback"""
+    os.environ.setdefault("KINDE_CODE_VERIFIER", "benchmark-code-verifier-benchmark-code-verifier")
+    os.environ.setdefault("KINDE_CLIENT_ID", "benchmark")
+    os.environ.setdefault("KINDE_CLIENT_SECRET", "benchmark-secret")
+    # The SDK session refuses plain http without it
+    os.environ["AUTHLIB_INSECURE_TRANSPORT"] = "1"
+    from kinde_sdk.kinde_api_client import KindeApiClient
+    from loguru import logger
+
+    import fast_api_example
+    from kinde_async import KindeAsyncClient
+
+    # One log line per callback would dominate the timings
+    logger.remove()
+    params = fast_api_example.kinde_api_client_params
+    params["domain"] = stub_url
+    fast_api_example.kinde_async_client = KindeAsyncClient(
+        domain=stub_url,
+        client_id=params["client_id"],
+        client_secret=params["client_secret"],
+        callback_url=params["callback_url"],
+        code_verifier=params.get("code_verifier"),
+    )
+    # Clients from create_kinde_client share the base client's JWKS cache
+    fast_api_example.base_kinde_client.jwks_client = KindeApiClient(**params).jwks_client
+    fast_api_example.app.add_api_route("/api/auth/kinde_callback_async", fast_api_example.async_callback)
+    return fast_api_example
+
+
+async def run_callbacks(app, path, callbacks, concurrency):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    queue = iter(range(callbacks))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+
+        async def caller():
+            for number in queue:
+                started = time.perf_counter()
+                response = await client.get(path, params={"code": f"code-{number}", "state": "benchmark"})
+                if response.status_code != 307:
+                    raise RuntimeError(f"{path} answered {response.status_code}: {response.text[:200]}")
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(caller() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": callbacks / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callbacks", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 50, 200])
+    parser.add_argument("--delay", type=float, default=0.02, help="stub OAuth latency per call, seconds")
+    args = parser.parse_args()
+
+    parent, child = multiprocessing.Pipe()
+    stub = multiprocessing.get_context("spawn").Process(target=serve_stub_oauth, args=(child, args.delay), daemon=True)
+    stub.start()
+    try:
+        stub_url = f"http://127.0.0.1:{parent.recv()}"
+        service = build_app(stub_url)
+        modes = {"sync": "/api/auth/kinde_callback", "async": "/api/auth/kinde_callback_async"}
+
+        async def run_all():
+            results = {}
+            for mode, path in modes.items():
+                await run_callbacks(service.app, path, 20, 1)  # warm up, fills the JWKS cache
+                for concurrency in args.concurrency:
+                    results[(mode, concurrency)] = await run_callbacks(service.app, path, args.callbacks, concurrency)
+            await service.kinde_async_client.aclose()
+            return results
+
+        results = asyncio.run(run_all())
+        print(f"{args.callbacks} callbacks per run, stub OAuth latency {args.delay * 1000:.0f}ms per call")
+        for concurrency in args.concurrency:
+            for mode in modes:
+                result = results[(mode, concurrency)]
+                print(
+                    f"  concurrency={concurrency:<4} {mode:<6} {result['rps']:>7.1f} req/s "
+                    f"p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms"
+                )
+    finally:
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Per-operation latency of the shared blob clients (app/blob_storage.py).
+
+Each operation the product knowledge page performs is run once with a
+client built from the connection string for every call, like the page did
+before, and once through the process-wide registry. By default the
+operations go to the local fake from `fake_blob_service.py`; pass the
+Azurite (or a real account) connection string to measure against that:
+
+    python benchmarks/blob_operations.py --iterations 200
+    python benchmarks/blob_operations.py --connection-string "$AZURITE_CONNECTION_STRING"
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DOCUMENT = ("Product knowledge line for the blob benchmark.\n" * 200).encode("utf-8")
+
+
+def per_call_clients(connection_string, container_name):
+    from azure.storage.blob import BlobClient, BlobServiceClient
+
+    return {
+        "container": lambda: BlobServiceClient.from_connection_string(connection_string).get_container_client(
+            container_name
+        ),
+        "blob": lambda name: BlobClient.from_connection_string(connection_string, container_name, name),
+    }
+
+
+def shared_clients(connection_string, container_name):
+    import blob_storage
+
+    return {
+        "container": lambda: blob_storage.get_container_client(connection_string, container_name),
+        "blob": lambda name: blob_storage.get_blob_client(connection_string, container_name, name),
+    }
+
+
+def operations(clients, prefix):
+    from azure.core import MatchConditions
+    from azure.core.exceptions import HttpResponseError
+
+    name = f"{prefix}document.txt"
+    uploaded = {}
+
+    def upload():
+        uploaded.update(clients["blob"](name).upload_blob(DOCUMENT, overwrite=True))
+
+    def conditional_download():
+        try:
+            clients["blob"](name).download_blob(etag=uploaded["etag"], match_condition=MatchConditions.IfModified)
+        except HttpResponseError as e:
+            if e.status_code != 304:
+                raise
+        else:
+            raise AssertionError("the blob did not change, expected a 304")
+
+    return {
+        "upload": upload,
+        "list": lambda: list(clients["container"]().list_blobs(name_starts_with=prefix)),
+        "download": lambda: clients["blob"](name).download_blob().readall(),
+        "conditional download": conditional_download,
+        "delete": lambda: clients["blob"](name).delete_blob(),
+    }
+
+
+def measure(operation, iterations):
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--connection-string", help="defaults to a local fake blob service")
+    parser.add_argument("--container", default="blob-benchmark")
+    args = parser.parse_args()
+
+    process = None
+    connection_string = args.connection_string
+    if connection_string is None:
+        from fake_blob_service import start_fake_blob_service
+
+        process, connection_string = start_fake_blob_service()
+    try:
+        from azure.core.exceptions import ResourceExistsError
+        from azure.storage.blob import BlobServiceClient
+
+        try:
+            BlobServiceClient.from_connection_string(connection_string).create_container(args.container)
+        except ResourceExistsError:
+            pass
+
+        modes = {
+            "client per call": per_call_clients(connection_string, args.container),
+            "shared registry": shared_clients(connection_string, args.container),
+        }
+        results = {}
+        for mode, clients in modes.items():
+            prefix = f"{uuid.uuid4().hex}/"
+            ops = operations(clients, prefix)
+            ops["upload"]()
+            # Delete runs last on its own, every iteration needs a blob to remove
+            for op in ("upload", "list", "download", "conditional download"):
+                results[(mode, op)] = measure(ops[op], args.iterations)
+            results[(mode, "delete")] = measure(lambda: (ops["upload"](), ops["delete"]()), args.iterations)
+
+        print(f"{args.iterations} iterations per operation (delete includes the re-upload)")
+        for op in ("upload", "list", "download", "conditional download", "delete"):
+            for mode in modes:
+                result = results[(mode, op)]
+                print(f"  {op:<21} {mode:<16} p50={result['p50_ms']:.2f}ms p95={result['p95_ms']:.2f}ms")
+    finally:
+        if process is not None:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Import time and first render of the Streamlit app (app/main.py).
+
+Import time is read from `python -X importtime` in a fresh interpreter
+per run: the cumulative time of `import main`, then of each page module
+imported after it, and whether the Azure SDK or requests got loaded on
+the way. The median over --repeat runs is reported, after one run that
+warms the bytecode cache.
+
+First render is one logged-in AppTest session in a fresh process against
+the load test's stubs (see load_test.py). Importing Streamlit's test
+harness is timed apart from the script's first run, then a second run of
+the same page and the first switch to Product Knowledge follow. The
+median over --renders processes is reported.
+
+Usage, from the repository root:
+
+    python benchmarks/cold_start.py --output cold_start.json
+    python benchmarks/cold_start.py --baseline cold_start.json
+
+With --baseline the run fails (exit code 1) when an import or render
+time grew by more than --tolerance. --app-dir measures another checkout,
+e.g. `git archive <rev> app | tar -x -C /tmp/old` and --app-dir /tmp/old/app.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import APP_DIR, configure_environment, rss_bytes  # noqa: E402
+from stub_services import StubServices, issue_access_token  # noqa: E402
+
+PAGE_MODULES = ("page.chat", "page.product_knowledge")
+HEAVY_PACKAGES = ("azure", "requests")
+
+
+def parse_importtime(stderr):
+    """(module name, cumulative microseconds, nesting depth) per `-X importtime` line, in print order"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # the header line
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        entries.append((name.strip(), int(cumulative), depth))
+    return entries
+
+
+def import_once(app_dir, page=None):
+    """Import main, and `page` after it, in a fresh interpreter"""
+    code = "import main"
+    if page:
+        code += f"; import importlib; importlib.import_module({page!r})"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=app_dir,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    entries = parse_importtime(result.stderr)
+    main_index = next(i for i, (name, _, depth) in enumerate(entries) if name == "main" and depth == 0)
+    # Modules print once they finish, so everything after main's line was imported by the page
+    measured = entries[main_index + 1:] if page else entries[: main_index + 1]
+    if page:
+        us = sum(cumulative for _, cumulative, depth in measured if depth == 0)
+    else:
+        us = entries[main_index][1]
+    names = {name.split(".", 1)[0] for name, _, _ in measured}
+    return us / 1000, len(measured), {package: package in names for package in HEAVY_PACKAGES}
+
+
+def measure_imports(app_dir, repeat):
+    results = {}
+    for module in ("main",) + PAGE_MODULES:
+        page = None if module == "main" else module
+        import_once(app_dir, page)  # warm the bytecode cache
+        runs = [import_once(app_dir, page) for _ in range(repeat)]
+        results[module] = {
+            "ms": statistics.median(ms for ms, _, _ in runs),
+            "modules": runs[-1][1],
+            "loads": runs[-1][2],
+        }
+    return results
+
+
+def first_render(connection, app_dir, stub_url, timeout):
+    """Worker process: time a session's first runs in a fresh interpreter"""
+    sys.path.insert(0, app_dir)
+    from loguru import logger
+
+    # Bare mode warns about the missing script run context and the app logs every render
+    logging.disable(logging.WARNING)
+    logger.remove()
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    harness_seconds = time.perf_counter() - started
+    app = AppTest.from_file(os.path.join(app_dir, "main.py"), default_timeout=timeout)
+    app.session_state["access_token"] = issue_access_token(stub_url, 0)
+
+    def timed_run(interaction):
+        started = time.perf_counter()
+        interaction()
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+        return time.perf_counter() - started
+
+    first = timed_run(app.run)
+    second = timed_run(app.run)
+    pages = next(radio for radio in app.sidebar.radio if radio.label == "pages")
+    product_knowledge = timed_run(lambda: pages.set_value("Product Knowledge").run())
+    connection.send(
+        {
+            "harness_import_ms": harness_seconds * 1000,
+            "first_run_ms": first * 1000,
+            "second_run_ms": second * 1000,
+            "first_product_knowledge_ms": product_knowledge * 1000,
+            "rss_bytes": rss_bytes(),
+        }
+    )
+    connection.close()
+
+
+def measure_first_render(app_dir, renders, timeout, stub_delay):
+    stubs = StubServices(delay=stub_delay).start()
+    configure_environment(stubs, tempfile.mkdtemp(prefix="ava-cold-start-"), "", use_blob_storage=False)
+    context = multiprocessing.get_context("spawn")
+    samples = []
+    try:
+        for _ in range(renders):
+            parent_end, child_end = context.Pipe()
+            process = context.Process(target=first_render, args=(child_end, app_dir, stubs.url, timeout), daemon=True)
+            process.start()
+            # Without the parent's copy of the child end, a worker that dies raises EOFError here
+            child_end.close()
+            samples.append(parent_end.recv())
+            process.join(timeout=30)
+    finally:
+        stubs.stop()
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def compare(report, baseline, tolerance):
+    """Regressions of import and render times against a previous report"""
+    regressions = []
+    for module, result in report["imports"].items():
+        previous = baseline.get("imports", {}).get(module)
+        if previous and result["ms"] > previous["ms"] * (1 + tolerance):
+            regressions.append(f"import {module}: {previous['ms']:.0f}ms -> {result['ms']:.0f}ms")
+    for key, value in report["first_render"].items():
+        previous = baseline.get("first_render", {}).get(key)
+        if key.endswith("_ms") and previous and value > previous * (1 + tolerance):
+            regressions.append(f"{key}: {previous:.0f}ms -> {value:.0f}ms")
+    return regressions
+
+
+def print_report(report):
+    print(f"imports, median of {report['config']['repeat']} fresh interpreters")
+    for module, result in report["imports"].items():
+        loads = ", ".join(f"{package}={'yes' if loaded else 'no'}" for package, loaded in result["loads"].items())
+        after = "" if module == "main" else " after main"
+        print(f"  {module + after:<34} {result['ms']:>7.0f}ms {result['modules']:>5} modules  {loads}")
+    render = report["first_render"]
+    print(f"first render, median of {report['config']['renders']} fresh processes")
+    print(f"  {'import streamlit test harness':<34} {render['harness_import_ms']:>7.0f}ms")
+    print(f"  {'first run (Chat)':<34} {render['first_run_ms']:>7.0f}ms")
+    print(f"  {'second run (Chat)':<34} {render['second_run_ms']:>7.0f}ms")
+    print(f"  {'first switch to Product Knowledge':<34} {render['first_product_knowledge_ms']:>7.0f}ms")
+    print(f"  {'process RSS after':<34} {render['rss_bytes'] / 1e6:>7.0f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app-dir", default=APP_DIR)
+    parser.add_argument("--repeat", type=int, default=5, help="interpreters per import measurement")
+    parser.add_argument("--renders", type=int, default=3, help="processes for the first render")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed per run")
+    parser.add_argument("--stub-delay", type=float, default=0.02, help="latency of every stub call in seconds")
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="previous JSON report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+    # The render measurement changes into a scratch directory, resolve paths first
+    app_dir = os.path.abspath(args.app_dir)
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    report = {
+        "config": {"app_dir": app_dir, "repeat": args.repeat, "renders": args.renders},
+        "imports": measure_imports(app_dir, args.repeat),
+        "first_render": measure_first_render(app_dir, args.renders, args.timeout, args.stub_delay),
+    }
+    print_report(report)
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
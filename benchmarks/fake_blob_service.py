@@ -0,0 +1,285 @@
+"""Disk-backed fake of the Azure Blob REST API, for benchmarks where Azurite is not available.
+
+Only what the app's SDK calls need is implemented: create container,
+list blobs, put blob, put block / block list, ranged and conditional
+get, get properties and delete. Requests are not authenticated. Run it
+in its own process so its memory does not count against the app:
+
+    python benchmarks/fake_blob_service.py --port 10000
+
+`start_fake_blob_service()` does that and returns the process and a
+connection string for it.
+"""
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+ACCOUNT = "devstoreaccount1"
+# Documented Azurite development key, not a secret
+ACCOUNT_KEY = "Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw=="
+_RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)")
+_COPY_CHUNK = 1024 * 1024
+
+
+def connection_string(port):
+    return (
+        f"DefaultEndpointsProtocol=http;AccountName={ACCOUNT};AccountKey={ACCOUNT_KEY};"
+        f"BlobEndpoint=http://127.0.0.1:{port}/{ACCOUNT};"
+    )
+
+
+class BlobData:
+    """Blobs as files under a scratch directory, metadata in memory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.containers = set()
+        self.blobs = {}
+        self.blocks = {}
+        self.lock = threading.Lock()
+
+    def path(self, container, name):
+        digest = hashlib.sha256(f"{container}/{name}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest)
+
+
+def _handler_class(data):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes, on a kept-alive connection
+        # Nagle would hold the body back until the client's delayed ACK
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _target(self):
+            url = urlparse(self.path)
+            parts = unquote(url.path).lstrip("/").split("/", 2)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            container = parts[1] if len(parts) > 1 else None
+            blob = parts[2] if len(parts) > 2 else None
+            return container, blob, query
+
+        def _send(self, status, body=b"", headers=None):
+            self.send_response(status)
+            self.send_header("x-ms-request-id", str(uuid.uuid4()))
+            self.send_header("x-ms-version", "2025-01-05")
+            self.send_header("Date", formatdate(usegmt=True))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            if "Content-Length" not in (headers or {}):
+                self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body and self.command != "HEAD":
+                self.wfile.write(body)
+
+        def _error(self, status, code):
+            body = (
+                f'<?xml version="1.0" encoding="utf-8"?><Error><Code>{code}</Code>'
+                f"<Message>{code}</Message></Error>"
+            ).encode("utf-8")
+            self._send(status, body, {"Content-Type": "application/xml", "x-ms-error-code": code})
+
+        def _read_body_to(self, path):
+            remaining = int(self.headers.get("Content-Length") or 0)
+            with open(path, "wb") as f:
+                while remaining:
+                    chunk = self.rfile.read(min(remaining, _COPY_CHUNK))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    remaining -= len(chunk)
+
+        def _properties(self, entry):
+            return {
+                "ETag": entry["etag"],
+                "Last-Modified": entry["last_modified"],
+                "x-ms-blob-type": "BlockBlob",
+                "x-ms-creation-time": entry["last_modified"],
+                "Accept-Ranges": "bytes",
+            }
+
+        def _commit(self, container, name, path):
+            entry = {
+                "etag": f'"0x{uuid.uuid4().hex[:16].upper()}"',
+                "last_modified": formatdate(usegmt=True),
+                "size": os.path.getsize(path),
+            }
+            os.replace(path, data.path(container, name))
+            with data.lock:
+                data.blobs[(container, name)] = entry
+            self._send(201, headers={"ETag": entry["etag"], "Last-Modified": entry["last_modified"],
+                                     "x-ms-request-server-encrypted": "false"})
+
+        def do_PUT(self):
+            container, name, query = self._target()
+            if name is None and query.get("restype") == "container":
+                with data.lock:
+                    exists = container in data.containers
+                    data.containers.add(container)
+                if exists:
+                    self._error(409, "ContainerAlreadyExists")
+                else:
+                    self._send(201, headers={"ETag": '"0x1"', "Last-Modified": formatdate(usegmt=True)})
+                return
+            tmp_path = os.path.join(data.directory, f"upload-{uuid.uuid4().hex}")
+            if query.get("comp") == "block":
+                self._read_body_to(tmp_path)
+                with data.lock:
+                    data.blocks.setdefault((container, name), {})[query["blockid"]] = tmp_path
+                self._send(201, headers={"x-ms-request-server-encrypted": "false"})
+            elif query.get("comp") == "blocklist":
+                length = int(self.headers.get("Content-Length") or 0)
+                root = ElementTree.fromstring(self.rfile.read(length))
+                with data.lock:
+                    staged = data.blocks.pop((container, name), {})
+                with open(tmp_path, "wb") as out:
+                    for element in root:
+                        with open(staged[element.text], "rb") as block:
+                            shutil.copyfileobj(block, out, _COPY_CHUNK)
+                for block_path in staged.values():
+                    os.remove(block_path)
+                self._commit(container, name, tmp_path)
+            else:
+                self._read_body_to(tmp_path)
+                self._commit(container, name, tmp_path)
+
+        def do_GET(self):
+            container, name, query = self._target()
+            if name is None and query.get("comp") == "list":
+                self._list(container, query.get("prefix", ""))
+                return
+            self._get_blob(container, name)
+
+        def do_HEAD(self):
+            container, name, _ = self._target()
+            with data.lock:
+                entry = data.blobs.get((container, name))
+            if entry is None:
+                self._error(404, "BlobNotFound")
+                return
+            self._send(200, headers={**self._properties(entry), "Content-Length": str(entry["size"])})
+
+        def _get_blob(self, container, name):
+            with data.lock:
+                entry = data.blobs.get((container, name))
+            if entry is None:
+                self._error(404, "BlobNotFound")
+                return
+            if self.headers.get("If-None-Match") == entry["etag"]:
+                self._send(304, headers={"ETag": entry["etag"], "x-ms-error-code": "ConditionNotMet"})
+                return
+            size = entry["size"]
+            start, end, status = 0, size - 1, 200
+            match = _RANGE_RE.match(self.headers.get("x-ms-range") or self.headers.get("Range") or "")
+            if match:
+                start = int(match.group(1))
+                end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+                status = 206
+            length = max(end - start + 1, 0)
+            headers = {**self._properties(entry), "Content-Length": str(length),
+                       "Content-Type": "application/octet-stream"}
+            if status == 206:
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            self.send_response(status)
+            for key, value in {"x-ms-request-id": str(uuid.uuid4()), "x-ms-version": "2025-01-05",
+                               "Date": formatdate(usegmt=True), **headers}.items():
+                self.send_header(key, value)
+            self.end_headers()
+            with open(data.path(container, name), "rb") as f:
+                f.seek(start)
+                remaining = length
+                while remaining:
+                    chunk = f.read(min(remaining, _COPY_CHUNK))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+
+        def do_DELETE(self):
+            container, name, _ = self._target()
+            with data.lock:
+                entry = data.blobs.pop((container, name), None)
+            if entry is None:
+                self._error(404, "BlobNotFound")
+                return
+            os.remove(data.path(container, name))
+            self._send(202)
+
+        def _list(self, container, prefix):
+            with data.lock:
+                entries = sorted(
+                    (name, entry) for (c, name), entry in data.blobs.items()
+                    if c == container and name.startswith(prefix)
+                )
+            blobs = "".join(
+                f"<Blob><Name>{escape(name)}</Name><Properties>"
+                f"<Last-Modified>{entry['last_modified']}</Last-Modified><Etag>{entry['etag']}</Etag>"
+                f"<Content-Length>{entry['size']}</Content-Length><BlobType>BlockBlob</BlobType>"
+                f"</Properties></Blob>"
+                for name, entry in entries
+            )
+            body = (
+                '<?xml version="1.0" encoding="utf-8"?>'
+                f'<EnumerationResults ServiceEndpoint="http://127.0.0.1/{ACCOUNT}" ContainerName="{escape(container)}">'
+                f"<Prefix>{escape(prefix)}</Prefix><Blobs>{blobs}</Blobs><NextMarker /></EnumerationResults>"
+            ).encode("utf-8")
+            self._send(200, body, {"Content-Type": "application/xml"})
+
+    return Handler
+
+
+def serve(port, directory):
+    server = ThreadingHTTPServer(("127.0.0.1", port), _handler_class(BlobData(directory)))
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_blob_service():
+    """Start the fake in a child process, returns (process, connection string)"""
+    port = _free_port()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--port", str(port)])
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    return process, connection_string(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=10000)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp(prefix="fake-blob-")
+    try:
+        serve(args.port, directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""Server CPU per interaction with fragment reruns, against a real Streamlit server.
+
+AppTest, and so load_test.py, reruns the whole script for every
+interaction. This starts `streamlit run app/main.py` against the stubs
+from `stub_services.py` and drives one session over the websocket
+protocol the browser speaks. Every interaction is sent twice, in turns:
+
+  fragment   as the browser sends it now, a rerun of the fragment that
+             rendered the widget
+  full app   the same widget change without the fragment id, a rerun of
+             the whole script as every interaction was before fragments
+
+The interactions are a chat message (the chat page's `st.chat_input`),
+picking another document in the product knowledge file radio, and an
+edit of the document text in the knowledge editor.
+
+Server CPU is the user and system time of the server process over the
+interaction, read from /proc/<pid>/stat (Linux), so it counts everything
+the server did for it: the script, serialising the deltas and the
+websocket. Script CPU is the script thread's own time from the app's
+"Rendered ..." log lines (`render_metrics.measure_render`), for the app
+scope when the app reran, else for the fragments that did. Usage, from the
+repository root:
+
+    python benchmarks/fragment_reruns.py --repeats 20
+"""
+import argparse
+import asyncio
+import os
+import queue
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import APP_DIR, AZURITE_CONNECTION_STRING, configure_environment  # noqa: E402
+from stub_services import StubServices, login_code  # noqa: E402
+
+RENDERED = re.compile(r"Rendered (?P<scope>\w+) in [\d.]+s, (?P<cpu_ms>[\d.]+)ms CPU")
+# Root container index of the page body in a delta path, the sidebar is 1
+MAIN_CONTAINER = 0
+DOCUMENT_LINE = "SKU-{:05d} Stainless steel fitting, 3/4in NPT, pressure rated, list price {:.2f}\n"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat", encoding="ascii") as f:
+        # The command name may hold spaces, the counters follow its closing parenthesis
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def write_documents(directory, count, size):
+    os.makedirs(directory, exist_ok=True)
+    for number in range(count):
+        lines = []
+        while sum(len(line) for line in lines) < size:
+            lines.append(DOCUMENT_LINE.format(number * 1000 + len(lines), 1.5 + len(lines) * 0.25))
+        with open(os.path.join(directory, f"catalog-{number:02d}.txt"), "w", encoding="ascii") as f:
+            f.write("".join(lines))
+
+
+class Server:
+    """`streamlit run app/main.py` in the configured scratch directory, its log lines read on a thread"""
+
+    def __init__(self):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        env = dict(os.environ, AUTHLIB_INSECURE_TRANSPORT="1", KINDE_CODE_VERIFIER="benchmark")
+        self.process = subprocess.Popen(
+            [
+                sys.executable, "-m", "streamlit", "run", os.path.join(APP_DIR, "main.py"),
+                "--server.headless", "true",
+                "--server.port", str(self.port),
+                "--server.runOnSave", "false",
+                "--server.fileWatcherType", "none",
+            ],
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+        )
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read_lines, daemon=True).start()
+
+    def _read_lines(self):
+        for line in self.process.stdout:
+            self.lines.put(line)
+
+    def wait_until_healthy(self, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with urllib.request.urlopen(f"{self.url}/_stcore/health", timeout=1) as response:
+                    if response.status == 200:
+                        return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError("Streamlit server did not start")
+
+    def drain_renders(self):
+        """Scopes and script CPU of the renders logged since the last call"""
+        # The log lines are written before the run finishes, give the reader a moment
+        time.sleep(0.05)
+        renders = []
+        while True:
+            try:
+                line = self.lines.get_nowait()
+            except queue.Empty:
+                return renders
+            match = RENDERED.search(line)
+            if match:
+                renders.append((match["scope"], float(match["cpu_ms"])))
+            elif "Traceback" in line or "Error" in line:
+                print(line.rstrip(), file=sys.stderr)
+
+    def cpu_seconds(self):
+        return process_cpu_seconds(self.process.pid)
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+class BrowserSession:
+    """One session over /_stcore/stream, tracking the widgets the app rendered like the frontend does"""
+
+    def __init__(self, server, query_string):
+        self.server = server
+        self.query_string = query_string
+        self.page_script_hash = ""
+        self.widgets = {}
+        self.options = {}
+        self.values = {}
+        self.texts = []
+        self.websocket = None
+
+    async def connect(self):
+        url = self.server.url.replace("http", "ws", 1) + "/_stcore/stream"
+        try:
+            from tornado.websocket import websocket_connect
+
+            self.websocket = await websocket_connect(url, subprotocols=["streamlit"])
+        except ImportError:
+            # Streamlit serves through Starlette from 1.5x and no longer installs tornado
+            from websockets.asyncio.client import connect
+
+            self.websocket = await connect(url, subprotocols=["streamlit"], max_size=None)
+
+    async def _send(self, payload):
+        if hasattr(self.websocket, "write_message"):
+            await self.websocket.write_message(payload, binary=True)
+        else:
+            await self.websocket.send(payload)
+
+    async def _receive(self):
+        if hasattr(self.websocket, "read_message"):
+            return await self.websocket.read_message()
+        from websockets.exceptions import ConnectionClosed
+
+        try:
+            return await self.websocket.recv()
+        except ConnectionClosed:
+            return None
+
+    async def close(self):
+        closed = self.websocket.close()
+        if closed is not None:
+            await closed
+
+    async def _read(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        payload = await self._receive()
+        if payload is None:
+            raise RuntimeError("Streamlit closed the session")
+        message = ForwardMsg()
+        message.ParseFromString(payload)
+        if message.ref_hash:
+            # Large messages the session was sent before come as a reference to the server's cache
+            url = f"{self.server.url}/_stcore/message?hash={message.ref_hash}"
+            data = await asyncio.to_thread(lambda: urllib.request.urlopen(url, timeout=10).read())
+            message = ForwardMsg()
+            message.ParseFromString(data)
+        return message
+
+    def _record(self, message):
+        delta = message.delta
+        element = delta.new_element
+        kind = element.WhichOneof("type")
+        if kind is None:
+            return
+        proto = getattr(element, kind)
+        if kind == "exception":
+            raise RuntimeError(f"App raised {proto.type}: {proto.message}")
+        if kind == "markdown" and message.metadata.delta_path[0] == MAIN_CONTAINER:
+            self.texts.append(proto.body)
+        widget_id = getattr(proto, "id", "")
+        if widget_id:
+            self.widgets[(kind, getattr(proto, "label", ""))] = (widget_id, delta.fragment_id)
+        if kind == "radio":
+            self.options[widget_id] = list(proto.options)
+
+    def widget(self, kind, label=""):
+        return self.widgets[(kind, label)]
+
+    def choice(self, widget_id, index):
+        """Value the frontend sends for picking a radio option, its label on newer Streamlit"""
+        from streamlit.proto.Radio_pb2 import Radio
+
+        if "raw_value" in Radio.DESCRIPTOR.fields_by_name:
+            return self.options[widget_id][index]
+        return index
+
+    async def rerun(self, fragment_id="", set_values=None, triggers=None):
+        """Send the widget states as the frontend does and wait until the run, and any reruns it asked for, finish"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        self.values.update(set_values or {})
+        message = BackMsg()
+        state = message.rerun_script
+        state.query_string = self.query_string
+        state.page_script_hash = self.page_script_hash
+        state.fragment_id = fragment_id
+        for widget_id, value in list(self.values.items()) + list((triggers or {}).items()):
+            widget_state = WidgetState(id=widget_id)
+            if isinstance(value, bool):
+                widget_state.trigger_value = value
+            elif isinstance(value, int):
+                widget_state.int_value = value
+            elif isinstance(value, tuple):
+                # Chat input submits a one-off value, older Streamlit takes it as a string trigger
+                if "chat_input_value" in WidgetState.DESCRIPTOR.fields_by_name:
+                    widget_state.chat_input_value.data = value[0]
+                else:
+                    widget_state.string_trigger_value.data = value[0]
+            else:
+                widget_state.string_value = value
+            state.widget_states.widgets.append(widget_state)
+        self.texts = []
+        await self._send(message.SerializeToString())
+
+        while True:
+            received = await self._read()
+            kind = received.WhichOneof("type")
+            if kind == "new_session":
+                self.page_script_hash = received.new_session.page_script_hash
+            elif kind == "delta":
+                self._record(received)
+            elif kind == "script_finished":
+                status = received.script_finished
+                if status == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("The app failed to compile")
+                if status != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    return
+
+
+class Interaction:
+    """Runs of one interaction in one mode"""
+
+    def __init__(self):
+        self.cpu_ms = []
+        self.script_cpu_ms = []
+        self.wall_ms = []
+        self.scopes = Counter()
+
+
+async def measure(server, session, results, name, mode, fragment_id, set_values=None, triggers=None, expect=None):
+    server.drain_renders()
+    cpu_before = server.cpu_seconds()
+    started = time.perf_counter()
+    await session.rerun(fragment_id if mode == "fragment" else "", set_values, triggers)
+    wall = time.perf_counter() - started
+    cpu = server.cpu_seconds() - cpu_before
+    renders = server.drain_renders()
+    if expect is not None and not any(expect in text for text in session.texts):
+        raise RuntimeError(f"{name} ({mode}) did not render {expect!r} in the page body")
+
+    scopes = [scope for scope, _ in renders]
+    app_cpu = [cpu_ms for scope, cpu_ms in renders if scope == "app"]
+    result = results.setdefault((name, mode), Interaction())
+    result.cpu_ms.append(cpu * 1000)
+    result.script_cpu_ms.append(sum(app_cpu) if app_cpu else sum(cpu_ms for _, cpu_ms in renders))
+    result.wall_ms.append(wall * 1000)
+    result.scopes.update(scopes)
+
+
+async def drive(server, repeats, documents):
+    session = BrowserSession(server, f"code={login_code(0)}")
+    await session.connect()
+    # Log in, the app exchanges the code with the stub and reruns
+    await session.rerun()
+    results = {}
+    modes = ("fragment", "full app")
+
+    chat_id, chat_fragment = session.widget("chat_input")
+    for turn in range(repeats):
+        for mode in modes:
+            await measure(
+                server, session, results, "chat message", mode, chat_fragment,
+                triggers={chat_id: (f"Quote {turn} ({mode})",)},
+                expect="token0",
+            )
+
+    pages_id, _ = session.widget("radio", "pages")
+    await session.rerun(set_values={pages_id: session.choice(pages_id, 1)})
+    radio_id, radio_fragment = session.widget("radio", "Select a file")
+    for turn in range(repeats):
+        for mode in modes:
+            index = (turn * len(modes) + modes.index(mode) + 1) % documents
+            await measure(
+                server, session, results, "file radio", mode, radio_fragment,
+                set_values={radio_id: session.choice(radio_id, index)},
+                expect=f"catalog-{index:02d}.txt",
+            )
+
+    edit_id, edit_fragment = session.widget("button", "Edit")
+    await session.rerun(edit_fragment, triggers={edit_id: True})
+    text_id, text_fragment = session.widget("text_area", "Edit file content")
+    for turn in range(repeats):
+        for mode in modes:
+            await measure(
+                server, session, results, "editor text", mode, text_fragment,
+                set_values={text_id: f"Edited {turn} ({mode})\n" * 200},
+            )
+    await session.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=20, help="runs of each interaction in each mode")
+    parser.add_argument("--documents", type=int, default=20, help="documents in the knowledge base")
+    parser.add_argument("--document-kb", type=int, default=32, help="size of each document")
+    parser.add_argument("--stub-delay", type=float, default=0.02, help="latency of every stub call in seconds")
+    args = parser.parse_args()
+
+    stubs = StubServices(delay=args.stub_delay).start()
+    work_dir = tempfile.mkdtemp(prefix="ava-fragment-reruns-")
+    configure_environment(stubs, work_dir, AZURITE_CONNECTION_STRING, False)
+    write_documents(os.path.join(work_dir, "knowledgebase", "tenant-a"), args.documents, args.document_kb * 1024)
+    server = Server()
+    try:
+        server.wait_until_healthy()
+        results = asyncio.run(drive(server, args.repeats, args.documents))
+    finally:
+        server.stop()
+        stubs.stop()
+
+    print(f"{args.repeats} runs per interaction and mode, means")
+    print(f"  {'interaction':<14} {'mode':<9} {'server CPU':>11} {'script CPU':>11} {'wall':>8}  reran")
+    for (name, mode), result in results.items():
+        reran = ", ".join(f"{scope} x{count / args.repeats:g}" for scope, count in result.scopes.most_common())
+        print(
+            f"  {name:<14} {mode:<9} {statistics.fmean(result.cpu_ms):>9.1f}ms "
+            f"{statistics.fmean(result.script_cpu_ms):>9.1f}ms {statistics.fmean(result.wall_ms):>6.0f}ms  {reran}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Handshake savings of the pooled HTTP session (app/http_client.py).
+
+A local HTTPS stub stands in for the backend. The same requests are sent
+once with a fresh connection per call, like the plain `requests.get` calls
+the app used before, and once through `http_client`, which keeps
+connections alive per host. The report shows latency and how many TCP+TLS
+handshakes the server accepted in each mode.
+
+    python benchmarks/http_pooling.py --requests 500 --threads 8
+"""
+import argparse
+import os
+import ssl
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+
+def write_self_signed_cert(directory):
+    """localhost certificate and key for the stub, returns (cert path, key path)"""
+    import datetime
+
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(hours=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            )
+        )
+    return cert_path, key_path
+
+
+class CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, handler, ssl_context):
+        super().__init__(address, handler)
+        self.ssl_context = ssl_context
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def get_request(self):
+        sock, address = super().get_request()
+        with self._lock:
+            self.connections += 1
+        # The handshake runs in the handler thread on first read
+        return self.ssl_context.wrap_socket(sock, server_side=True, do_handshake_on_connect=False), address
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    body = b'{"status": "ok"}'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+
+def run_mode(server, send, count, threads):
+    server.connections = 0
+    latencies = []
+    lock = threading.Lock()
+
+    def one(_):
+        started = time.perf_counter()
+        response = send()
+        response.raise_for_status()
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(count)))
+    total = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "req_per_s": count / total,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "handshakes": server.connections,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="http-pooling-")
+    cert_path, key_path = write_self_signed_cert(work_dir)
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert_path, key_path)
+    server = CountingServer(("127.0.0.1", 0), Handler, context)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"https://localhost:{server.server_address[1]}"
+
+    # The pooled session sizes its pool for BACKEND_URL, read at import
+    os.environ["BACKEND_URL"] = url
+    import requests
+
+    import http_client
+
+    modes = {
+        "new connection per call": lambda: requests.get(f"{url}/api/health", verify=cert_path, timeout=10),
+        "pooled http_client": lambda: http_client.get(f"{url}/api/health", verify=cert_path),
+    }
+    print(f"{args.requests} HTTPS requests on {args.threads} threads")
+    for name, send in modes.items():
+        result = run_mode(server, send, args.requests, args.threads)
+        print(
+            f"  {name:<24} {result['req_per_s']:7.0f} req/s  p50={result['p50_ms']:.2f}ms "
+            f"p95={result['p95_ms']:.2f}ms  handshakes={result['handshakes']}"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
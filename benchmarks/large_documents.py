@@ -0,0 +1,191 @@
+"""Peak memory of moving a large knowledge document through blob storage (app/blob_storage.py).
+
+A document of --size-mb megabytes of text is uploaded once, then each
+transfer runs in its own fresh process:
+
+  download, whole blob   a client with the SDK's default transfer sizes
+                         and content_as_text(), as read_file did before
+  download, ranged       the shared client's chunked parallel download,
+                         as the document cache now reads a whole document
+  download, one page     one ranged read of a page, as the paged viewer
+                         fetches for documents over the threshold
+  upload, single call    upload_blob() of the str with the SDK defaults,
+                         as write_file did before
+  upload, blocks         the text encoded a block at a time as blocks are
+                         sent in parallel, as upload_file does now
+
+Peak RSS is the process high-water mark above its resident size just
+before the transfer (Linux, reset through /proc/self/clear_refs). Peak
+traced is tracemalloc's peak over the same span. Upload baselines include
+the document text the session already holds. Transfers go to the local
+fake from `fake_blob_service.py` unless a connection string is given:
+
+    python benchmarks/large_documents.py --size-mb 300
+    python benchmarks/large_documents.py --connection-string "$AZURITE_CONNECTION_STRING"
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MODES = (
+    "download, whole blob",
+    "download, ranged",
+    "download, one page",
+    "upload, single call",
+    "upload, blocks",
+)
+LINE = "SKU-{:07d} Stainless steel fitting, 3/4in NPT, pressure rated, list price {:.2f}\n"
+
+
+def write_document(path, size):
+    """Catalog-like ASCII text of exactly `size` bytes"""
+    block = "".join(LINE.format(i, 1.5 + (i % 300) * 0.25) for i in range(12_000)).encode("ascii")
+    with open(path, "wb") as f:
+        for _ in range(size // len(block)):
+            f.write(block)
+        f.write(block[: size % len(block)])
+
+
+def status_kb(field):
+    with open("/proc/self/status", encoding="ascii") as f:
+        return int(re.search(rf"^{field}:\s+(\d+)", f.read(), re.MULTILINE).group(1))
+
+
+def reset_peak_rss():
+    """Reset the high-water mark where the kernel supports it, returns the resident size"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return status_kb("VmRSS") * 1024
+    except OSError:
+        return None
+
+
+def transfer(connection, mode, connection_string, container, blob_name, document_path, page_size):
+    """Worker process: run one transfer and report its time and peak memory"""
+    from azure.storage.blob import BlobServiceClient
+    from loguru import logger
+
+    import blob_storage
+
+    logger.remove()
+    default_client = BlobServiceClient.from_connection_string(connection_string).get_blob_client(
+        container, blob_name
+    )
+    shared_client = blob_storage.get_blob_client(connection_string, container, blob_name)
+    size = shared_client.get_blob_properties().size
+
+    if mode == "download, whole blob":
+        operation = lambda: default_client.download_blob().content_as_text()  # noqa: E731
+    elif mode == "download, ranged":
+        operation = lambda: shared_client.download_blob(  # noqa: E731
+            max_concurrency=blob_storage.BLOB_MAX_CONCURRENCY
+        ).content_as_text()
+    elif mode == "download, one page":
+        operation = lambda: shared_client.download_blob(  # noqa: E731
+            offset=size // 2, length=page_size, max_concurrency=blob_storage.BLOB_MAX_CONCURRENCY
+        ).readall().decode("utf-8", errors="ignore")
+    else:
+        with open(document_path, encoding="utf-8") as f:
+            content = f.read()
+        if mode == "upload, single call":
+            operation = lambda: default_client.upload_blob(content, overwrite=True)  # noqa: E731
+        else:
+            operation = lambda: shared_client.upload_blob(  # noqa: E731
+                blob_storage.iter_encoded(content),
+                length=blob_storage.encoded_length(content),
+                overwrite=True,
+                max_concurrency=blob_storage.BLOB_MAX_CONCURRENCY,
+            )
+
+    gc.collect()
+    baseline_rss = reset_peak_rss()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = operation()
+    seconds = time.perf_counter() - started
+    peak_traced = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    peak_rss = status_kb("VmHWM") * 1024 - baseline_rss if baseline_rss is not None else None
+    if mode.startswith("download") and mode != "download, one page" and len(result) != size:
+        raise RuntimeError(f"{mode} returned {len(result)} characters of {size}")
+    connection.send({"seconds": seconds, "peak_traced": peak_traced, "peak_rss": peak_rss})
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=300)
+    parser.add_argument("--page-size", type=int, default=64 * 1024, help="bytes per viewer page")
+    parser.add_argument("--connection-string", help="defaults to a local fake blob service")
+    parser.add_argument("--container", default="large-documents")
+    args = parser.parse_args()
+
+    process = None
+    connection_string = args.connection_string
+    if connection_string is None:
+        from fake_blob_service import start_fake_blob_service
+
+        process, connection_string = start_fake_blob_service()
+    work_dir = tempfile.mkdtemp(prefix="large-documents-")
+    document_path = os.path.join(work_dir, "catalog.txt")
+    try:
+        from azure.core.exceptions import ResourceExistsError
+
+        import blob_storage
+
+        try:
+            blob_storage.get_blob_service_client(connection_string).create_container(args.container)
+        except ResourceExistsError:
+            pass
+        size = args.size_mb * 1024 * 1024
+        write_document(document_path, size)
+        blob_name = f"{uuid.uuid4().hex}/catalog.txt"
+        with open(document_path, "rb") as f:
+            blob_storage.get_blob_client(connection_string, args.container, blob_name).upload_blob(
+                f, length=size, overwrite=True, max_concurrency=blob_storage.BLOB_MAX_CONCURRENCY
+            )
+
+        context = multiprocessing.get_context("spawn")
+        print(
+            f"{args.size_mb}MB document, chunk {blob_storage.BLOB_CHUNK_SIZE_BYTES // 1024}KB, "
+            f"concurrency {blob_storage.BLOB_MAX_CONCURRENCY}, page {args.page_size // 1024}KB"
+        )
+        print(f"  {'transfer':<22} {'time':>8} {'peak RSS':>10} {'peak traced':>12}")
+        for mode in MODES:
+            parent_end, child_end = context.Pipe()
+            worker = context.Process(
+                target=transfer,
+                args=(child_end, mode, connection_string, args.container, blob_name, document_path, args.page_size),
+                daemon=True,
+            )
+            worker.start()
+            # Without the parent's copy of the child end, a worker that dies raises EOFError here
+            child_end.close()
+            result = parent_end.recv()
+            worker.join(timeout=30)
+            peak_rss = f"{result['peak_rss'] / 1e6:.0f}MB" if result["peak_rss"] is not None else "n/a"
+            print(
+                f"  {mode:<22} {result['seconds']:>7.2f}s {peak_rss:>10} "
+                f"{result['peak_traced'] / 1e6:>10.0f}MB"
+            )
+    finally:
+        if process is not None:
+            process.terminate()
+        if os.path.exists(document_path):
+            os.remove(document_path)
+        os.rmdir(work_dir)
+
+
+if __name__ == "__main__":
+    main()
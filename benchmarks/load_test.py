@@ -0,0 +1,402 @@
+"""Multi-session load test of the Streamlit app against local stand-ins.
+
+N sessions are driven headless with Streamlit's AppTest. AppTest installs
+a process-global Streamlit runtime and patches the global config for each
+run, so sessions cannot share a process safely. They are spread over a
+pool of worker processes (--workers, one per CPU by default), each one
+like an app replica, and a worker drives its sessions one after another.
+All sessions run the same phases in lockstep:
+
+    login -> tenant switch -> chat turns -> knowledge edits
+
+Every session finishes a phase before the next one starts. That lets the
+outbound calls counted during a phase (backend/Kinde stub routes, plus
+blob operations from the app's own metrics) divide into calls per
+interaction. Background health probes and re-embeds land in whichever
+phase they run in.
+
+Usage, from the repository root:
+
+    python benchmarks/load_test.py --sessions 20 --output results.json
+    python benchmarks/load_test.py --sessions 20 --baseline results.json
+
+With --baseline the run fails (exit code 1) when an interaction's p95
+latency or outbound calls grew by more than --tolerance. Knowledge edits
+use the local filesystem by default. `--blob-storage fake` stores them in
+the fake from `fake_blob_service.py`, `--blob-storage azurite` in a local
+Azurite (start it with `docker run -p 10000:10000 mcr.microsoft.com/azure-storage/azurite azurite-blob --blobHost 0.0.0.0`).
+
+AppTest reruns the whole script for every interaction, so fragment-scoped
+reruns are not reflected here, only their app-scope cost. `fragment_reruns.py`
+measures them against a real Streamlit server.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(REPO_ROOT, "app")
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_services import TENANTS, StubServices, issue_access_token  # noqa: E402
+
+# Documented Azurite development account, not a secret
+AZURITE_CONNECTION_STRING = (
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw==;"
+    "BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+)
+PHASES = ("login", "tenant_switch", "chat_turn", "knowledge_edit")
+
+
+def configure_environment(stubs, work_dir, connection_string, use_blob_storage):
+    """Point the app at the stubs, workers inherit the environment and working directory"""
+    os.environ.update(
+        {
+            "BACKEND_URL": stubs.url,
+            "BACKEND_API_KEY": "benchmark",
+            "KINDE_ISSUER_URL": stubs.url,
+            "KINDE_CLIENT_ID": "benchmark",
+            "KINDE_CLIENT_SECRET": "benchmark",
+            "AZURE_AVA_POC_APPS_CONNECTION_STRING": connection_string,
+            "USE_AZURE_STORAGE_FOR_PRODUCT_KNOWLEDGE": "true" if use_blob_storage else "false",
+            "REEMBED_DEBOUNCE_SECONDS": "0.5",
+            "SHARED_STORE_BACKEND": "memory",
+            "METRICS_ENABLED": "true",
+            "CHAT_STREAMING_ENABLED": "true",
+            "CHAT_SPILL_DIR": os.path.join(work_dir, "chat-spill"),
+            "DOCUMENT_MANIFEST_DIR": os.path.join(work_dir, "manifests"),
+            "KNOWLEDGE_INDEX_DIR": os.path.join(work_dir, "index"),
+        }
+    )
+    # The app reads its static files and local documents relative to the working directory
+    for name in ("images", "style.css", ".streamlit"):
+        os.symlink(os.path.join(APP_DIR, name), os.path.join(work_dir, name))
+    os.makedirs(os.path.join(work_dir, "knowledgebase"))
+    os.chdir(work_dir)
+
+    if use_blob_storage:
+        from azure.core.exceptions import ResourceExistsError
+        from azure.storage.blob import BlobServiceClient
+
+        try:
+            BlobServiceClient.from_connection_string(connection_string).create_container("product-knowledge")
+        except ResourceExistsError:
+            pass
+
+
+def blob_calls():
+    """Blob operations counted by the app's own metrics in this process"""
+    from metrics import metrics
+
+    calls = Counter()
+    for row in metrics.summary():
+        if row["metric"] == "blob_operation":
+            calls[f"blob_{row['labels'].split('=', 1)[1]}"] += row["count"]
+    return calls
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Peak rather than current outside Linux, in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Session:
+    """One simulated user, driving the app through AppTest"""
+
+    def __init__(self, number, stub_url, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.number = number
+        self.timeout = timeout
+        self.app = AppTest.from_file(os.path.join(APP_DIR, "main.py"), default_timeout=timeout)
+        self.app.session_state["access_token"] = issue_access_token(stub_url, number)
+
+    def _check(self):
+        if self.app.exception:
+            raise RuntimeError(self.app.exception[0].message)
+        self._drop_stale_widgets()
+
+    def _drop_stale_widgets(self):
+        """AppTest parses its tree from the messages of every run in an interaction.
+
+        Widgets the app stopped rendering after an `st.rerun()` stay in that
+        tree without any state, and the next interaction fails on them.
+        """
+
+        def has_state(widget_id):
+            # Newer AppTest limits `in` to user keys, item access still reaches widget ids
+            try:
+                self.app.session_state[widget_id]
+            except KeyError:
+                return False
+            return True
+
+        def prune(node):
+            for key, child in list(getattr(node, "children", {}).items()):
+                widget_id = getattr(child, "id", None)
+                if widget_id is not None and not has_state(widget_id):
+                    del node.children[key]
+                else:
+                    prune(child)
+
+        prune(self.app._tree)
+
+    def _sidebar_radio(self, label):
+        return next(radio for radio in self.app.sidebar.radio if radio.label == label)
+
+    def login(self):
+        self.app.run()
+        self._check()
+
+    def tenant_switch(self):
+        current = self.app.session_state["selected_tenant"]["name"]
+        other = next(t["name"] for t in TENANTS if t["name"] != current)
+        self.app.sidebar.selectbox[0].select(other).run()
+        self._check()
+
+    def chat_turn(self, turn):
+        self.app.chat_input[0].set_value(f"Quote {turn + 1} for session {self.number}").run()
+        self._check()
+
+    def knowledge_edit(self, turn):
+        if self._sidebar_radio("pages").value != "Product Knowledge":
+            self._sidebar_radio("pages").set_value("Product Knowledge").run()
+        file_name = f"session-{self.number}-{turn}"
+        self.app.button(key="new_file_button").click().run()
+        next(t for t in self.app.text_input if t.label == "Enter new file name").set_value(file_name)
+        next(t for t in self.app.text_area if t.label == "Enter file content").set_value(
+            f"Product notes {turn} of session {self.number}\n" * 50
+        )
+        next(b for b in self.app.button if b.label == "Save New File").click().run()
+        self._check()
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(int(round(q * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_worker(connection, session_numbers, stub_url, timeout, chat_turns, edits):
+    """Worker process: owns some sessions and runs each phase the parent sends for all of them"""
+    from render_metrics import render_stats
+
+    clients = [Session(number, stub_url, timeout) for number in session_numbers]
+    connection.send("ready")
+
+    def interactions(client, phase):
+        if phase == "login":
+            return [client.login]
+        if phase == "tenant_switch":
+            return [client.tenant_switch]
+        if phase == "chat_turn":
+            return [lambda turn=turn: client.chat_turn(turn) for turn in range(chat_turns)]
+        return [lambda turn=turn: client.knowledge_edit(turn) for turn in range(edits)]
+
+    while True:
+        phase = connection.recv()
+        if phase is None:
+            break
+        calls_before = blob_calls()
+        reruns_before = render_stats().get("app", {}).get("runs", 0)
+        latencies = []
+        errors = 0
+        for client in clients:
+            for interaction in interactions(client, phase):
+                started = time.perf_counter()
+                try:
+                    interaction()
+                except Exception as e:
+                    errors += 1
+                    print(f"session {client.number} {phase} failed: {e}", file=sys.stderr)
+                    break
+                finally:
+                    latencies.append(time.perf_counter() - started)
+        connection.send(
+            {
+                "latencies": latencies,
+                "errors": errors,
+                "calls": blob_calls() - calls_before,
+                "reruns": render_stats().get("app", {}).get("runs", 0) - reruns_before,
+                "rss_bytes": rss_bytes(),
+            }
+        )
+    connection.close()
+
+
+def run_load_test(sessions, workers, chat_turns, edits, timeout, blob_storage, stub_delay):
+    stubs = StubServices(delay=stub_delay).start()
+    work_dir = tempfile.mkdtemp(prefix="ava-load-test-")
+    blob_process = None
+    connection_string = AZURITE_CONNECTION_STRING
+    if blob_storage == "fake":
+        from fake_blob_service import start_fake_blob_service
+
+        blob_process, connection_string = start_fake_blob_service()
+    configure_environment(stubs, work_dir, connection_string, blob_storage != "local")
+
+    # Fresh interpreters, a forked child would inherit the stub server threads
+    context = multiprocessing.get_context("spawn")
+    workers = max(1, min(workers, sessions))
+    pool = []
+    for worker in range(workers):
+        parent_end, child_end = context.Pipe()
+        process = context.Process(
+            target=run_worker,
+            args=(child_end, list(range(worker, sessions, workers)), stubs.url, timeout, chat_turns, edits),
+            daemon=True,
+        )
+        process.start()
+        pool.append((process, parent_end))
+    for _, connection in pool:
+        connection.recv()
+
+    results = {}
+    reruns = 0
+    started_total = time.perf_counter()
+    try:
+        for phase in PHASES:
+            calls_before = stubs.snapshot()
+            phase_started = time.perf_counter()
+            for _, connection in pool:
+                connection.send(phase)
+            replies = [connection.recv() for _, connection in pool]
+            phase_seconds = time.perf_counter() - phase_started
+
+            values = sorted(latency for reply in replies for latency in reply["latencies"])
+            calls = stubs.snapshot() - calls_before
+            for reply in replies:
+                calls.update(reply["calls"])
+            reruns += sum(reply["reruns"] for reply in replies)
+            results[phase] = {
+                "interactions": len(values),
+                "errors": sum(reply["errors"] for reply in replies),
+                "per_second": len(values) / phase_seconds if phase_seconds else 0.0,
+                "p50_ms": percentile(values, 0.50) * 1000 if values else None,
+                "p95_ms": percentile(values, 0.95) * 1000 if values else None,
+                "p99_ms": percentile(values, 0.99) * 1000 if values else None,
+                "mean_ms": statistics.fmean(values) * 1000 if values else None,
+                "calls_per_interaction": (
+                    {route: count / len(values) for route, count in sorted(calls.items())} if values else {}
+                ),
+                "worker_rss_bytes": max(reply["rss_bytes"] for reply in replies),
+            }
+    finally:
+        for process, connection in pool:
+            connection.send(None)
+            process.join(timeout=30)
+        stubs.stop()
+        if blob_process is not None:
+            blob_process.terminate()
+
+    total_seconds = time.perf_counter() - started_total
+    return {
+        "config": {
+            "sessions": sessions,
+            "workers": workers,
+            "chat_turns": chat_turns,
+            "edits": edits,
+            "blob_storage": blob_storage,
+            "stub_delay_seconds": stub_delay,
+        },
+        "reruns": reruns,
+        "reruns_per_second": reruns / total_seconds if total_seconds else 0.0,
+        "peak_worker_rss_bytes": max(phase["worker_rss_bytes"] for phase in results.values()),
+        "phases": results,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Regressions of p95 latency and outbound calls against a previous report"""
+    regressions = []
+    for phase, result in report["phases"].items():
+        previous = baseline.get("phases", {}).get(phase)
+        if previous is None:
+            continue
+        if previous["p95_ms"] and result["p95_ms"] and result["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{phase}: p95 {previous['p95_ms']:.0f}ms -> {result['p95_ms']:.0f}ms")
+        for route, count in result["calls_per_interaction"].items():
+            before = previous["calls_per_interaction"].get(route, 0)
+            if count > before * (1 + tolerance) + 1e-9:
+                regressions.append(f"{phase}: {route} calls {before:.2f} -> {count:.2f}")
+    return regressions
+
+
+def print_report(report):
+    print(
+        f"{report['config']['sessions']} sessions on {report['config']['workers']} workers, "
+        f"{report['reruns']} reruns, {report['reruns_per_second']:.1f} reruns/s, "
+        f"peak worker RSS {report['peak_worker_rss_bytes'] / 1e6:.0f}MB"
+    )
+    for phase, result in report["phases"].items():
+        if not result["interactions"]:
+            print(f"  {phase:<15} no interactions, {result['errors']} errors")
+            continue
+        calls = ", ".join(f"{route}={count:.2f}" for route, count in result["calls_per_interaction"].items())
+        print(
+            f"  {phase:<15} n={result['interactions']:<4} err={result['errors']:<3} "
+            f"p50={result['p50_ms']:.0f}ms p95={result['p95_ms']:.0f}ms p99={result['p99_ms']:.0f}ms "
+            f"{result['per_second']:.1f}/s calls: {calls or 'none'}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--chat-turns", type=int, default=3)
+    parser.add_argument("--edits", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed per rerun")
+    parser.add_argument("--stub-delay", type=float, default=0.02, help="latency of every stub call in seconds")
+    parser.add_argument(
+        "--blob-storage",
+        choices=("local", "fake", "azurite"),
+        default="local",
+        help="where knowledge edits store documents",
+    )
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="previous JSON report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+    # The load test changes into a scratch directory, resolve paths first
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    report = run_load_test(
+        args.sessions, args.workers, args.chat_turns, args.edits, args.timeout, args.blob_storage, args.stub_delay
+    )
+    print_report(report)
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = any(result["errors"] for result in report["phases"].values())
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Render time and memory of chat quote attachments, pandas vs Arrow (app/chat_store.py).
+
+For quotes of 10, 1k and 100k line items, one rerun's render of an
+attachment is timed three ways:
+
+  pandas           the DataFrame kept as attached, like the chat page did
+                   before; st.dataframe converts it to Arrow on every rerun
+  arrow            a StoredAttachment in memory, its decoded table is
+                   serialized directly
+  arrow, spilled   a StoredAttachment spilled to disk, read back through
+                   a memory map first
+
+The render calls st.dataframe the way page/chat.py does, in Streamlit's
+bare mode. Memory is what the session keeps per attachment, plus the
+peak traced allocation of one render.
+
+    python benchmarks/quote_tables.py --reruns 20
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+# Bare mode warns about the missing script run context on every call
+logging.disable(logging.WARNING)
+
+import pandas as pd  # noqa: E402
+import streamlit as st  # noqa: E402
+
+from chat_store import StoredAttachment  # noqa: E402
+
+SIZES = (10, 1_000, 100_000)
+
+
+def quote_frame(rows):
+    return pd.DataFrame(
+        {
+            "item": [f"SKU-{i % 2000:05d}" for i in range(rows)],
+            "description": [f"Stainless steel fitting, size {i % 40}" for i in range(rows)],
+            "quantity": [(i % 25) + 1 for i in range(rows)],
+            "unit_price": [round(1.5 + (i % 300) * 0.25, 2) for i in range(rows)],
+        }
+    )
+
+
+def render(table):
+    # Same call as display_quote_df in page/chat.py
+    st.container().dataframe(
+        table,
+        use_container_width=True,
+        column_config={
+            "description": st.column_config.TextColumn("Description", width=350, help="Product description"),
+        },
+        hide_index=True,
+    )
+
+
+def measure(rerun, reruns):
+    rerun()  # warm up
+    latencies = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        rerun()
+        latencies.append(time.perf_counter() - started)
+    tracemalloc.start()
+    rerun()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(latencies) * 1000, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args()
+    spill_dir = tempfile.mkdtemp(prefix="quote-tables-")
+
+    print(f"{'rows':>7}  {'mode':<15} {'render p50':>11} {'render peak':>12} {'kept per quote':>15}")
+    for rows in SIZES:
+        df = quote_frame(rows)
+        stored = StoredAttachment(df)
+        spilled = StoredAttachment(df)
+        spilled.spill(spill_dir)
+        modes = {
+            "pandas": (lambda: render(df), df.memory_usage(deep=True).sum()),
+            "arrow": (lambda: render(stored.load()), stored.resident_bytes),
+            "arrow, spilled": (lambda: render(spilled.load()), spilled.resident_bytes),
+        }
+        for mode, (rerun, kept) in modes.items():
+            p50_ms, peak = measure(rerun, args.reruns)
+            print(f"{rows:>7}  {mode:<15} {p50_ms:>9.2f}ms {peak / 1e3:>10.0f}KB {kept / 1e3:>13.0f}KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Build, search and warm-start timings of the knowledge index (app/knowledge_search.py).
+
+The corpus is synthetic, with a Zipf-like vocabulary of a few very common
+words and a long tail, so runs are repeatable for a given seed. Snippets
+are read from the documents in memory. Index memory is the growth of the
+process's resident size while building it, the corpus is already loaded.
+
+--large-mb also indexes one catalog of that size, read from a file
+KNOWLEDGE_INDEX_READ_CHUNK_BYTES at a time as the page does for documents
+above the paged view threshold, and reports the peak RSS above the
+process's resident size before it (Linux, see large_documents.py).
+
+    python benchmarks/search_index.py --documents 10000 --queries 200 --large-mb 300
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+from knowledge_search import KnowledgeIndex  # noqa: E402
+from large_documents import reset_peak_rss, status_kb, write_document  # noqa: E402
+
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+def index_large_document(size_mb):
+    """Peak traced memory and time of indexing one catalog read from disk in chunks"""
+    path = os.path.join(tempfile.mkdtemp(prefix="search-index-"), "catalog.txt")
+    try:
+        write_document(path, size_mb * 1024 * 1024)
+
+        def read_chunks():
+            with open(path, "rb") as f:
+                while chunk := f.read(READ_CHUNK_BYTES):
+                    yield chunk
+
+        index = KnowledgeIndex()
+        baseline_rss = reset_peak_rss()
+        started = time.perf_counter()
+        index.add("catalog.txt", read_chunks(), "v1")
+        seconds = time.perf_counter() - started
+        peak_rss = status_kb("VmHWM") * 1024 - baseline_rss if baseline_rss is not None else None
+        peak = f"{peak_rss / 1e6:.0f}MB" if peak_rss is not None else "n/a"
+        print(
+            f"Indexed a {size_mb}MB catalog in {seconds:.2f}s: peak RSS {peak}, "
+            f"{len(index._doc_terms['catalog.txt'])} terms, saved {len(index.dump()) / 1e6:.1f}MB"
+        )
+    finally:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=10_000)
+    parser.add_argument("--words-per-document", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--large-mb", type=int, default=0, help="also index one catalog of this size")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = [f"term{i}" for i in range(20_000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    documents = {
+        f"doc{i:05d}.txt": " ".join(rng.choices(vocabulary, weights, k=args.words_per_document))
+        for i in range(args.documents)
+    }
+
+    encoded = {file_name: content.encode("utf-8") for file_name, content in documents.items()}
+
+    def read_range(file_name, offset, length):
+        return encoded[file_name][offset:offset + length]
+
+    resident_before = status_kb("VmRSS") * 1024
+    started = time.perf_counter()
+    index = KnowledgeIndex()
+    for file_name, content in documents.items():
+        index.add(file_name, content, file_name)
+    build_seconds = time.perf_counter() - started
+    index_bytes = status_kb("VmRSS") * 1024 - resident_before
+
+    latencies = []
+    for _ in range(args.queries):
+        query = " ".join(rng.choices(vocabulary[:5000], k=rng.randint(1, 3)))
+        started = time.perf_counter()
+        index.search(query, read_range=read_range)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+
+    started = time.perf_counter()
+    data = index.dump()
+    dump_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    KnowledgeIndex.loads(data)
+    load_seconds = time.perf_counter() - started
+
+    print(f"Indexed {args.documents} documents in {build_seconds:.2f}s, index {index_bytes / 1e6:.1f}MB")
+    print(
+        f"Search over {args.queries} queries: p50={statistics.median(latencies):.2f}ms "
+        f"p95={latencies[int(len(latencies) * 0.95) - 1]:.2f}ms max={latencies[-1]:.2f}ms"
+    )
+    print(f"Saved {len(data) / 1e6:.1f}MB in {dump_seconds:.2f}s, warm start in {load_seconds:.2f}s")
+    if args.large_mb:
+        index_large_document(args.large_mb)
+
+
+if __name__ == "__main__":
+    main()
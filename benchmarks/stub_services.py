@@ -0,0 +1,193 @@
+"""Local stand-ins for the AVA backend and Kinde, used by the load test.
+
+Every route answers after a fixed delay so runs are comparable, and calls
+are counted per route so the load test can report outbound calls per
+interaction.
+"""
+import base64
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import jwt
+
+KINDE_API_AUDIENCE = "api.pragmaticai.dev"
+SIGNING_KEY_ID = "benchmark"
+SIGNING_SECRET = b"benchmark-signing-secret-not-for-production"
+
+TENANTS = [
+    {"id": "tenant-a", "name": "Tenant A"},
+    {"id": "tenant-b", "name": "Tenant B"},
+]
+
+_ROUTES = [
+    ("health", re.compile(r"^/api/health$")),
+    ("external_user", re.compile(r"^/api/users/external/[^/]+/(?P<sub>[^/]+)$")),
+    ("user", re.compile(r"^/api/users/(?P<user_id>[^/]+)$")),
+    ("tenants", re.compile(r"^/api/tenants/[^/]+/tenants$")),
+    ("chat_stream", re.compile(r"^/api/ava/chat/stream$")),
+    ("reembed", re.compile(r"^/api/ava/re-embed-tenant-documents$")),
+    ("jwks", re.compile(r"^/\.well-known/jwks\.json$")),
+    ("user_profile", re.compile(r"^/oauth2/user_profile$")),
+    ("token", re.compile(r"^/oauth2/token$")),
+]
+
+
+def issue_access_token(issuer, session_number, lifetime=3600):
+    """HS256 access token the app verifies against the stub JWKS"""
+    now = int(time.time())
+    claims = {
+        "sub": f"kp_benchmark_{session_number}",
+        "iss": issuer,
+        "aud": [KINDE_API_AUDIENCE],
+        "iat": now,
+        "exp": now + lifetime,
+    }
+    return jwt.encode(claims, SIGNING_SECRET, algorithm="HS256", headers={"kid": SIGNING_KEY_ID})
+
+
+def login_code(session_number):
+    """Authorization code the stub token endpoint exchanges for `session_number`'s access token"""
+    return f"benchmark-{session_number}"
+
+
+class StubServices:
+    """Backend and Kinde stub on one local port, started on a daemon thread"""
+
+    def __init__(self, delay=0.02, chat_tokens=20):
+        self.delay = delay
+        self.chat_tokens = chat_tokens
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="benchmark-stubs", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    def snapshot(self):
+        with self._lock:
+            return Counter(self.calls)
+
+    def _count(self, route):
+        with self._lock:
+            self.calls[route] += 1
+
+    def _handler_class(self):
+        stubs = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _route(self):
+                path = self.path.split("?", 1)[0]
+                for name, pattern in _ROUTES:
+                    match = pattern.match(path)
+                    if match:
+                        return name, match.groupdict()
+                return None, {}
+
+            def _send_json(self, body, status=200):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _read_body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                if (self.headers.get("Content-Type") or "").startswith("application/x-www-form-urlencoded"):
+                    # The full-tenant re-embed request and the token exchange are sent as form data
+                    return {key: values[0] for key, values in parse_qs(body.decode("utf-8")).items()}
+                return json.loads(body or b"{}")
+
+            def do_GET(self):
+                route, params = self._route()
+                if route is None:
+                    self._send_json({"detail": "not found"}, status=404)
+                    return
+                stubs._count(route)
+                time.sleep(stubs.delay)
+                if route == "health":
+                    self._send_json({"status": "ok"})
+                elif route == "external_user":
+                    self._send_json({"id": f"user-{params['sub']}"})
+                elif route == "user":
+                    user_id = params["user_id"]
+                    self._send_json({"id": user_id, "email": f"{user_id}@example.com"})
+                elif route == "tenants":
+                    self._send_json(TENANTS)
+                elif route == "jwks":
+                    key = base64.urlsafe_b64encode(SIGNING_SECRET).rstrip(b"=").decode("ascii")
+                    self._send_json(
+                        {"keys": [{"kty": "oct", "kid": SIGNING_KEY_ID, "alg": "HS256", "k": key}]}
+                    )
+                elif route == "user_profile":
+                    self._send_json(
+                        {"id": "kp_benchmark", "first_name": "Load", "last_name": "Test", "email": "load@example.com"}
+                    )
+                else:
+                    self._send_json({"detail": "method not allowed"}, status=405)
+
+            def do_POST(self):
+                route, _ = self._route()
+                if route is None:
+                    self._send_json({"detail": "not found"}, status=404)
+                    return
+                stubs._count(route)
+                payload = self._read_body()
+                time.sleep(stubs.delay)
+                if route == "chat_stream":
+                    self._stream_chat(payload.get("message", ""))
+                elif route == "reembed":
+                    self._send_json({"status": "ok"})
+                elif route == "token":
+                    # The authorization code is the session number, see `login_code`
+                    session_number = payload["code"].rsplit("-", 1)[-1]
+                    self._send_json(
+                        {
+                            "access_token": issue_access_token(stubs.url, session_number),
+                            "token_type": "bearer",
+                            "expires_in": 3600,
+                        }
+                    )
+                else:
+                    self._send_json({"detail": "method not allowed"}, status=405)
+
+            def _stream_chat(self, message):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                events = [{"type": "token", "content": f"token{i} "} for i in range(stubs.chat_tokens)]
+                events.append(
+                    {
+                        "type": "attachment",
+                        "records": [
+                            {"item": f"SKU-{i}", "description": message[:40], "quantity": i + 1}
+                            for i in range(5)
+                        ],
+                    }
+                )
+                events.append({"type": "done"})
+                for event in events:
+                    chunk = f"data: {json.dumps(event)}\n\n".encode("utf-8")
+                    self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
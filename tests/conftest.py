@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The app runs with app/ as its working directory and imports its modules flat
+sys.path.insert(0, os.path.join(ROOT, "app"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+
+@pytest.fixture(scope="session")
+def blob_connection_string():
+    """Connection string of a fake blob service running for the test session"""
+    from fake_blob_service import start_fake_blob_service
+
+    process, connection_string = start_fake_blob_service()
+    yield connection_string
+    process.terminate()
+    process.wait()
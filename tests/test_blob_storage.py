@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+import blob_storage
+
+AZURITE_CONNECTION_STRING = (
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw==;"
+    "BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+)
+
+
+@pytest.fixture(autouse=True)
+def cold_registry(monkeypatch):
+    monkeypatch.setattr(blob_storage, "_service_clients", {})
+    monkeypatch.setattr(blob_storage, "_container_clients", {})
+
+
+def call_with_timeout(fn, timeout=10):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(value=fn()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "call did not return, the registry lock deadlocked"
+    return result["value"]
+
+
+def test_container_client_on_cold_registry():
+    client = call_with_timeout(
+        lambda: blob_storage.get_container_client(AZURITE_CONNECTION_STRING, "product-knowledge")
+    )
+    assert client.container_name == "product-knowledge"
+    assert blob_storage._service_clients[AZURITE_CONNECTION_STRING] is not None
+
+
+def test_clients_are_shared():
+    first = blob_storage.get_container_client(AZURITE_CONNECTION_STRING, "product-knowledge")
+    second = blob_storage.get_container_client(AZURITE_CONNECTION_STRING, "product-knowledge")
+    assert first is second
+    blob = blob_storage.get_blob_client(AZURITE_CONNECTION_STRING, "product-knowledge", "t/a.txt")
+    assert blob.blob_name == "t/a.txt"
+
+
+def test_concurrent_cold_calls_build_one_service_client():
+    clients = []
+    threads = [
+        threading.Thread(
+            target=lambda: clients.append(
+                blob_storage.get_container_client(AZURITE_CONNECTION_STRING, "product-knowledge")
+            )
+        )
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert len(clients) == 8
+    assert len({id(client) for client in clients}) == 1
+
+
+def test_iter_encoded_matches_whole_encoding():
+    text = "Prix unitaire: 12,50 € — Größe ½\n" * 10
+    chunks = list(blob_storage.iter_encoded(text, chunk_chars=7))
+    assert len(chunks) > 1
+    assert b"".join(chunks) == text.encode("utf-8")
+    assert blob_storage.encoded_length(text) == len(text.encode("utf-8"))
+    assert blob_storage.encoded_length("plain ascii") == len("plain ascii")
+
+
+def test_streamed_upload_in_blocks(monkeypatch, blob_connection_string):
+    from azure.core.exceptions import ResourceExistsError
+
+    monkeypatch.setattr(blob_storage, "BLOB_CHUNK_SIZE_BYTES", 1024)
+    try:
+        blob_storage.get_blob_service_client(blob_connection_string).create_container("streamed")
+    except ResourceExistsError:
+        pass
+    text = "Line with a multi-byte price €12.50\n" * 500
+    blob = blob_storage.get_blob_client(blob_connection_string, "streamed", "t/large.txt")
+    blob.upload_blob(
+        blob_storage.iter_encoded(text, chunk_chars=1024),
+        length=blob_storage.encoded_length(text),
+        overwrite=True,
+        max_concurrency=2,
+    )
+    assert blob.download_blob().content_as_text() == text
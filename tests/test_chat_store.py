@@ -0,0 +1,44 @@
+import pyarrow as pa
+
+from chat_store import ChatMessageStore, StoredAttachment
+
+
+def quote_table(rows):
+    return pa.Table.from_pylist(
+        [{"item": f"SKU-{i % 50}", "description": "Stainless steel fitting", "quantity": i} for i in range(rows)]
+    )
+
+
+def uncompressed_ipc(table):
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def test_backend_ipc_is_stored_compressed():
+    table = quote_table(10_000)
+    received = uncompressed_ipc(table)
+
+    attachment = StoredAttachment(received)
+
+    assert attachment.nbytes < len(received) / 4
+    assert attachment.load().equals(table)
+
+
+def test_rerun_reuses_the_decoded_table():
+    attachment = StoredAttachment(quote_table(100))
+
+    assert attachment.load() is attachment.load()
+
+
+def test_spilled_attachment_is_read_back(tmp_path):
+    table = quote_table(1_000)
+    store = ChatMessageStore(budget_bytes=0, spill_dir=str(tmp_path))
+
+    store.append({"role": "assistant", "content": "", "attachments": [table]})
+
+    attachment = store.messages[0]["attachments"][0]
+    assert attachment.spilled
+    assert store.resident_bytes() == 0
+    assert attachment.load().equals(table)
@@ -0,0 +1,58 @@
+import multiprocessing
+
+from document_manifest import DocumentManifest, content_hash, merge_deltas, write_delta
+
+
+def apply_in_other_process(directory, tenant_id, delta):
+    DocumentManifest(directory).apply(tenant_id, delta)
+
+
+def run_in_other_process(target, *args):
+    process = multiprocessing.get_context("spawn").Process(target=target, args=args)
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+
+
+def test_manifest_written_by_another_process_is_reloaded(tmp_path):
+    directory = str(tmp_path)
+    manifest = DocumentManifest(directory)
+    manifest.apply("tenant-a", write_delta("a.txt", "old", version="v1"))
+    assert manifest.load("tenant-a")["a.txt"]["hash"] == content_hash("old")
+
+    # Another app process embeds new content for the document
+    run_in_other_process(apply_in_other_process, directory, "tenant-a", write_delta("a.txt", "new", version="v2"))
+
+    assert manifest.load("tenant-a")["a.txt"] == {"hash": content_hash("new"), "version": "v2"}
+    # Saving the earlier content on this process must re-embed it
+    payload = manifest.build_payload("tenant-a", write_delta("a.txt", "old", version="v3", base_version="v2"))
+    assert payload["upserted"] == ["a.txt"]
+
+
+def test_upsert_skipped_only_over_the_embedded_version(tmp_path):
+    manifest = DocumentManifest(str(tmp_path))
+    manifest.apply("tenant-a", write_delta("a.txt", "A", version="v1"))
+
+    assert manifest.build_payload("tenant-a", write_delta("a.txt", "A", version="v2", base_version="v1")) is None
+    # Edited in storage since it was embedded
+    assert manifest.build_payload("tenant-a", write_delta("a.txt", "A", version="v2", base_version="v9"))
+    # Base version unknown
+    assert manifest.build_payload("tenant-a", write_delta("a.txt", "A", version="v2"))
+
+
+def test_legacy_manifest_entries_are_never_skipped(tmp_path):
+    (tmp_path / "tenant-a.json").write_text(f'{{"a.txt": "{content_hash("A")}"}}')
+    manifest = DocumentManifest(str(tmp_path))
+
+    assert manifest.load("tenant-a") == {"a.txt": {"hash": content_hash("A"), "version": None}}
+    assert manifest.build_payload("tenant-a", write_delta("a.txt", "A", version="v2", base_version="v1"))
+
+
+def test_merged_writes_keep_the_first_base_version():
+    merged = merge_deltas(
+        write_delta("a.txt", "B", version="v2", base_version="v1"),
+        write_delta("a.txt", "A", version="v3", base_version="v2"),
+    )
+    assert merged["base_versions"] == {"a.txt": "v1"}
+    assert merged["versions"] == {"a.txt": "v3"}
+    assert merged["upserted"] == {"a.txt": content_hash("A")}
@@ -0,0 +1,17 @@
+from health_monitor import BackendHealthMonitor
+from metrics import metrics
+
+
+def probe_count():
+    return sum(row["count"] for row in metrics.summary() if row["metric"] == "backend_health_check")
+
+
+def test_probe_is_timed_even_when_it_fails():
+    before = probe_count()
+    # Nothing listens on port 9 of localhost, the probe fails fast
+    monitor = BackendHealthMonitor("http://127.0.0.1:9/api/health", timeout=1)
+
+    assert monitor.check_now() is False
+
+    assert probe_count() == before + 1
+    assert monitor.status()["consecutive_failures"] == 1
@@ -0,0 +1,227 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from kinde_sdk.kinde_api_client import GrantType, KindeApiClient
+
+import kinde_registry
+from kinde_registry import KindeClientRegistry, SQLiteTokenStore, attach_token
+
+
+class StubTokenEndpoint:
+    """Kinde token endpoint answering refresh grants with a new access token, counts the refreshes"""
+
+    def __init__(self):
+        self.refreshes = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                stub.refreshes += 1
+                body = json.dumps(
+                    {
+                        "access_token": f"refreshed-{stub.refreshes}",
+                        "refresh_token": f"refresh-{stub.refreshes}",
+                        "token_type": "bearer",
+                        "expires_in": 3600,
+                    }
+                ).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def kinde(monkeypatch):
+    # The SDK's OAuth session refuses to refresh over plain http otherwise
+    monkeypatch.setenv("AUTHLIB_INSECURE_TRANSPORT", "1")
+    stub = StubTokenEndpoint()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(kinde_registry.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def token_store(tmp_path):
+    return SQLiteTokenStore(str(tmp_path / "tokens.db"))
+
+
+def make_client_factory(kinde):
+    def create_client():
+        return KindeApiClient(
+            domain=kinde.url,
+            callback_url="http://localhost/callback",
+            client_id="registry-test",
+            client_secret="secret",
+            grant_type=GrantType.AUTHORIZATION_CODE,
+        )
+
+    return create_client
+
+
+def token_for(user_id, expires_in=3600):
+    return {
+        "access_token": f"access-{user_id}",
+        "refresh_token": f"refresh-{user_id}",
+        "token_type": "bearer",
+        "expires_at": int(time.time()) + expires_in,
+    }
+
+
+def access_token(client):
+    return client.__dict__["_KindeApiClient__access_token_obj"]["access_token"]
+
+
+def logged_in(create_client, user_id, **kwargs):
+    return attach_token(create_client(), token_for(user_id, **kwargs))
+
+
+def test_least_recently_used_client_is_evicted_beyond_max_size(kinde, clock):
+    create_client = make_client_factory(kinde)
+    registry = KindeClientRegistry(create_client, max_size=2, idle_ttl=60)
+    first, second, third = (logged_in(create_client, user) for user in ("u1", "u2", "u3"))
+    registry.put("u1", first)
+    registry.put("u2", second)
+
+    clock.now += 1
+    assert registry.get("u1") is first
+    registry.put("u3", third)
+
+    assert registry.get("u2") is None
+    assert registry.get("u1") is first
+    assert registry.get("u3") is third
+    assert registry.stats()["evictions"] == 1
+    assert registry.stats()["size"] == 2
+
+
+def test_idle_client_is_evicted_after_the_ttl(kinde, clock):
+    create_client = make_client_factory(kinde)
+    registry = KindeClientRegistry(create_client, max_size=10, idle_ttl=60)
+    idle, active = logged_in(create_client, "idle"), logged_in(create_client, "active")
+    registry.put("idle", idle)
+    registry.put("active", active)
+
+    clock.now += 45
+    assert registry.get("active") is active
+    clock.now += 30
+
+    assert registry.get("idle") is None
+    assert registry.get("active") is active
+    assert registry.stats()["size"] == 1
+
+
+def test_evicted_client_is_restored_from_the_token_store(kinde, clock, token_store):
+    create_client = make_client_factory(kinde)
+    registry = KindeClientRegistry(create_client, max_size=1, idle_ttl=60, token_store=token_store)
+    original = logged_in(create_client, "u1")
+    registry.put("u1", original)
+    registry.put("u2", logged_in(create_client, "u2"))
+
+    restored = registry.get("u1")
+
+    assert restored is not None and restored is not original
+    assert access_token(restored) == "access-u1"
+    assert restored.configuration.access_token == "access-u1"
+    assert restored.is_authenticated()
+    assert registry.stats()["restored"] == 1
+    # Another worker sharing the store serves the same user
+    other_worker = KindeClientRegistry(create_client, token_store=token_store)
+    assert access_token(other_worker.get("u2")) == "access-u2"
+    assert kinde.refreshes == 0
+
+
+def test_refreshed_token_is_written_back_on_put(kinde, token_store):
+    create_client = make_client_factory(kinde)
+    registry = KindeClientRegistry(create_client, token_store=token_store)
+    client = logged_in(create_client, "u1", expires_in=-60)
+    registry.put("u1", client)
+    assert token_store.get("u1")["access_token"] == "access-u1"
+
+    # The SDK refreshes the expired token in place, as get_kinde_client sees it
+    assert client.is_authenticated()
+    assert kinde.refreshes == 1
+    registry.put("u1", client)
+
+    assert token_store.get("u1")["access_token"] == "refreshed-1"
+    restored = KindeClientRegistry(create_client, token_store=token_store).get("u1")
+    assert access_token(restored) == "refreshed-1"
+    assert restored.is_authenticated()
+    assert kinde.refreshes == 1
+
+
+def test_unchanged_token_is_not_written_again(kinde, token_store, monkeypatch):
+    create_client = make_client_factory(kinde)
+    registry = KindeClientRegistry(create_client, token_store=token_store)
+    client = logged_in(create_client, "u1")
+    registry.put("u1", client)
+    writes = []
+    monkeypatch.setattr(token_store, "put", lambda user_id, token: writes.append(user_id))
+
+    registry.put("u1", client)
+
+    assert writes == []
+
+
+def test_concurrent_get_and_put(kinde, token_store):
+    create_client = make_client_factory(kinde)
+    registry = KindeClientRegistry(create_client, max_size=5, idle_ttl=60, token_store=token_store)
+    users = [f"u{i}" for i in range(12)]
+    clients = {user: logged_in(create_client, user) for user in users}
+    failures = []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        try:
+            for _ in range(200):
+                user = rng.choice(users)
+                if rng.random() < 0.5:
+                    registry.put(user, clients[user])
+                else:
+                    client = registry.get(user)
+                    if client is not None and access_token(client) != f"access-{user}":
+                        failures.append(f"{user} got {access_token(client)}")
+        except Exception as e:
+            failures.append(repr(e))
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failures == []
+    stats = registry.stats()
+    assert stats["size"] <= 5
+    assert stats["hits"] + stats["misses"] > 0
+    # Every user that was put can be served, from memory or the store
+    assert all(access_token(registry.get(user)) == f"access-{user}" for user in users)
@@ -0,0 +1,146 @@
+import io
+import threading
+import zipfile
+
+import pytest
+
+from knowledge_bulk import build_export_archive, read_uploaded_documents, write_batch
+
+
+class UploadedFile(io.BytesIO):
+    """Stand-in for Streamlit's UploadedFile, a BytesIO with a name"""
+
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+
+
+def zip_file(name, entries):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for entry_name, data in entries.items():
+            archive.writestr(entry_name, data)
+    return UploadedFile(name, buffer.getvalue())
+
+
+def test_text_files_and_archives_are_read():
+    documents = read_uploaded_documents(
+        [
+            UploadedFile("faq.txt", "Answers".encode("utf-8")),
+            zip_file("catalog.zip", {"pricing.txt": "Prices", "notes/crème.txt": "Crème".encode("utf-8")}),
+        ]
+    )
+    assert documents == {"faq.txt": "Answers", "pricing.txt": "Prices", "crème.txt": "Crème"}
+
+
+def test_nested_archive_paths_are_flattened():
+    documents = read_uploaded_documents(
+        [zip_file("export.zip", {"tenant/2024/q1/valves.txt": "Valves", "tenant/2024/": ""})]
+    )
+    assert documents == {"valves.txt": "Valves"}
+
+
+def test_other_and_hidden_files_are_skipped():
+    documents = read_uploaded_documents(
+        [
+            zip_file(
+                "mixed.zip",
+                {"readme.md": "#", "image.png": b"\x89PNG", "__MACOSX/._faq.txt": b"\x00\x05", ".hidden.txt": "x"},
+            )
+        ]
+    )
+    assert documents == {}
+
+
+def test_duplicate_names_reject_the_upload():
+    with pytest.raises(ValueError, match="faq.txt appears more than once"):
+        read_uploaded_documents([zip_file("a.zip", {"one/faq.txt": "A", "two/faq.txt": "B"})])
+    with pytest.raises(ValueError, match="faq.txt appears more than once"):
+        read_uploaded_documents([UploadedFile("faq.txt", b"A"), zip_file("b.zip", {"faq.txt": "B"})])
+
+
+def test_non_utf8_text_rejects_the_upload():
+    with pytest.raises(ValueError, match="latin.txt is not UTF-8 text"):
+        read_uploaded_documents([UploadedFile("latin.txt", "Crème".encode("latin-1"))])
+    with pytest.raises(ValueError, match="latin.txt is not UTF-8 text"):
+        read_uploaded_documents([zip_file("a.zip", {"docs/latin.txt": "Crème".encode("latin-1")})])
+
+
+def test_export_archive_round_trips():
+    documents = {"a.txt": "A", "crème.txt": "Crème"}
+    archive = UploadedFile("export.zip", build_export_archive(documents))
+    assert read_uploaded_documents([archive]) == documents
+
+
+class Storage:
+    """Documents in memory, with uploads or removals of chosen names failing"""
+
+    def __init__(self, documents, failing_uploads=(), failing_removals=()):
+        self.documents = dict(documents)
+        self.failing_uploads = {name: set(texts) for name, texts in dict(failing_uploads).items()}
+        self.failing_removals = set(failing_removals)
+        self.lock = threading.Lock()
+
+    def upload(self, file_name, content):
+        if content in self.failing_uploads.get(file_name, ()):
+            raise OSError(f"upload of {file_name} failed")
+        with self.lock:
+            self.documents[file_name] = content
+        return f"etag-{file_name}-{content}"
+
+    def remove(self, file_name):
+        if file_name in self.failing_removals:
+            raise OSError(f"delete of {file_name} failed")
+        with self.lock:
+            del self.documents[file_name]
+
+
+def test_successful_batch_returns_versions():
+    storage = Storage({"old.txt": "old"})
+    versions, errors, left_changed = write_batch(
+        {"old.txt": "new", "added.txt": "added"}, {"old.txt": "old"}, storage.upload, storage.remove
+    )
+    assert versions == {"old.txt": "etag-old.txt-new", "added.txt": "etag-added.txt-added"}
+    assert errors == {}
+    assert left_changed == []
+    assert storage.documents == {"old.txt": "new", "added.txt": "added"}
+
+
+def test_failed_batch_is_rolled_back():
+    storage = Storage({"old.txt": "old", "kept.txt": "kept"}, failing_uploads={"broken.txt": ["broken"]})
+    _, errors, left_changed = write_batch(
+        {"old.txt": "new", "added.txt": "added", "broken.txt": "broken"},
+        {"old.txt": "old"},
+        storage.upload,
+        storage.remove,
+    )
+    assert set(errors) == {"broken.txt"}
+    assert left_changed == []
+    assert storage.documents == {"old.txt": "old", "kept.txt": "kept"}
+
+
+def test_failed_rollback_reports_the_documents_left_changed():
+    storage = Storage(
+        {"old.txt": "old"},
+        # The restore of old.txt fails as well as the upload of broken.txt
+        failing_uploads={"broken.txt": ["broken"], "old.txt": ["old"]},
+        failing_removals=["added.txt"],
+    )
+    versions, errors, left_changed = write_batch(
+        {"old.txt": "new", "added.txt": "added", "broken.txt": "broken"},
+        {"old.txt": "old"},
+        storage.upload,
+        storage.remove,
+    )
+    assert set(errors) == {"broken.txt"}
+    assert left_changed == ["added.txt", "old.txt"]
+    assert storage.documents == {"old.txt": "new", "added.txt": "added"}
+    assert set(versions) == {"old.txt", "added.txt"}
+
+
+def test_overwrite_that_never_uploaded_is_not_restored():
+    storage = Storage({"old.txt": "old"}, failing_uploads={"old.txt": ["new", "old"]})
+    _, errors, left_changed = write_batch({"old.txt": "new"}, {"old.txt": "old"}, storage.upload, storage.remove)
+    assert set(errors) == {"old.txt"}
+    assert left_changed == []
+    assert storage.documents == {"old.txt": "old"}
@@ -0,0 +1,40 @@
+import uuid
+
+import pytest
+
+import blob_storage
+from knowledge_cache import DocumentContentCache
+from shared_store import MemoryStore
+
+
+@pytest.fixture
+def container_client(blob_connection_string):
+    client = blob_storage.get_container_client(blob_connection_string, f"kb-{uuid.uuid4().hex[:8]}")
+    client.create_container()
+    return client
+
+
+def test_unchanged_document_is_served_from_cache(container_client):
+    blob_client = container_client.get_blob_client("tenant/faq.txt")
+    blob_client.upload_blob(b"first answer", overwrite=True)
+    cache = DocumentContentCache(store=MemoryStore())
+
+    assert cache.read(blob_client, "tenant", "faq.txt") == "first answer"
+    assert cache.read(blob_client, "tenant", "faq.txt") == "first answer"
+
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+    assert stats["bytes_saved"] == len(b"first answer")
+
+
+def test_changed_document_is_downloaded_again(container_client):
+    blob_client = container_client.get_blob_client("tenant/faq.txt")
+    blob_client.upload_blob(b"first answer", overwrite=True)
+    cache = DocumentContentCache(store=MemoryStore())
+    cache.read(blob_client, "tenant", "faq.txt")
+
+    blob_client.upload_blob(b"second answer", overwrite=True)
+
+    assert cache.read(blob_client, "tenant", "faq.txt") == "second answer"
+    assert cache.stats()["misses"] == 2
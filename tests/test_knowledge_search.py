@@ -0,0 +1,76 @@
+import pickle
+from collections import Counter
+
+from knowledge_search import KnowledgeIndex, scan, tokenize
+
+TEXT = "Pressure rated fittings.\nCafé crème brûlée, stainless fittings and valves. " * 40
+
+
+def chunks(data, size):
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+def test_chunked_scan_matches_whole_text():
+    encoded = TEXT.encode("utf-8")
+    expected = Counter(tokenize(TEXT))
+    # Chunk sizes that split words and multi-byte characters
+    for size in (1, 7, 64, 1000):
+        counts, offsets = scan(chunks(encoded, size))
+        assert counts == expected
+        for term, offset in offsets.items():
+            assert encoded[offset:offset + len(term.encode("utf-8"))].decode("utf-8").lower() == term
+
+
+def test_scan_offsets_are_byte_offsets():
+    counts, offsets = scan("crème fittings crème")
+    assert counts == {"crème": 2, "fittings": 1}
+    assert offsets == {"crème": 0, "fittings": len("crème ".encode("utf-8"))}
+
+
+def test_scan_caps_distinct_terms():
+    counts, offsets = scan("a b c a d b", max_terms=2)
+    assert counts == {"a": 2, "b": 2}
+    assert set(offsets) == {"a", "b"}
+
+
+def test_snippet_is_read_around_the_first_match():
+    encoded = ("filler " * 100 + "stainless valve " + "filler " * 100).encode("utf-8")
+    reads = []
+
+    def read_range(file_name, offset, length):
+        reads.append((file_name, offset, length))
+        return encoded[offset:offset + length]
+
+    index = KnowledgeIndex()
+    index.add("catalog.txt", chunks(encoded, 10), "v1")
+    [result] = index.search("valve", read_range=read_range)
+
+    assert result["file_name"] == "catalog.txt"
+    assert "**valve**" in result["snippet"]
+    assert result["snippet"].startswith("...") and result["snippet"].endswith("...")
+    assert len(reads) == 1
+
+
+def test_index_keeps_no_document_text():
+    index = KnowledgeIndex()
+    index.add("a.txt", TEXT, "v1")
+
+    state = pickle.loads(index.dump())
+    assert "texts" not in state
+    assert "Café crème" not in repr(state)
+    assert KnowledgeIndex.loads(index.dump()).search("valves")[0]["file_name"] == "a.txt"
+
+
+def test_documents_beyond_the_postings_cap_are_not_indexed():
+    index = KnowledgeIndex(max_postings=3)
+    index.add("a.txt", "one two", "v1")
+    index.add("b.txt", "three four", "v1")
+
+    assert [result["file_name"] for result in index.search("two")] == ["a.txt"]
+    assert index.search("four") == []
+    # Tracked with its version, so it is not read again until it changes
+    assert index.stale({"a.txt": "v1", "b.txt": "v1"}) == ([], [])
+
+    index.remove("a.txt")
+    index.add("b.txt", "three four", "v2")
+    assert [result["file_name"] for result in index.search("four")] == ["b.txt"]
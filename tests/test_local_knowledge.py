@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+import local_knowledge
+from local_knowledge import LocalKnowledgeStore
+
+
+@pytest.mark.parametrize("threshold", [0, 1 << 30], ids=["mmap", "buffered"])
+def test_read_decodes_the_whole_document(monkeypatch, tmp_path, threshold):
+    monkeypatch.setattr(local_knowledge, "KNOWLEDGE_MMAP_THRESHOLD_BYTES", threshold)
+    content = "Prix unitaire: 12,50 €\n" * 10_000
+    LocalKnowledgeStore(str(tmp_path)).write("tenant", "prices.txt", content)
+
+    # A second store has nothing cached and reads the file
+    assert LocalKnowledgeStore(str(tmp_path)).read("tenant", "prices.txt") == content
+
+
+def test_tenant_without_a_directory_uses_the_flat_root(tmp_path):
+    (tmp_path / "faq.txt").write_text("Answers")
+    store = LocalKnowledgeStore(str(tmp_path))
+
+    assert set(store.list_files("tenant")) == {"faq.txt"}
+    assert store.read("tenant", "faq.txt") == "Answers"
+    store.write("tenant", "new.txt", "New")
+    # Writes stay with the documents the tenant sees
+    assert (tmp_path / "new.txt").read_text() == "New"
+    assert not (tmp_path / "tenant").exists()
+
+
+def test_tenant_directory_takes_over_once_it_exists(tmp_path):
+    (tmp_path / "faq.txt").write_text("Answers")
+    (tmp_path / "tenant").mkdir()
+    (tmp_path / "tenant" / "own.txt").write_text("Own")
+    store = LocalKnowledgeStore(str(tmp_path))
+
+    assert set(store.list_files("tenant")) == {"own.txt"}
+    assert set(store.list_files(None)) == {"faq.txt"}
+
+
+def test_new_install_uses_tenant_directories(tmp_path):
+    store = LocalKnowledgeStore(str(tmp_path))
+    store.write("tenant", "faq.txt", "Answers")
+
+    assert (tmp_path / "tenant" / "faq.txt").read_text() == "Answers"
+    assert set(store.list_files("other")) == set()
+
+
+def test_tenant_directory_created_later_ends_the_fallback(tmp_path):
+    (tmp_path / "faq.txt").write_text("Answers")
+    store = LocalKnowledgeStore(str(tmp_path))
+    assert set(store.list_files("tenant")) == {"faq.txt"}
+
+    (tmp_path / "tenant").mkdir()
+    (tmp_path / "tenant" / "own.txt").write_text("Own")
+    # With watchdog the switch waits for the directory event
+    deadline = time.monotonic() + 5
+    while set(store.list_files("tenant")) != {"own.txt"} and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert set(store.list_files("tenant")) == {"own.txt"}
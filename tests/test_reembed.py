@@ -0,0 +1,114 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from document_manifest import DocumentManifest, content_hash, delete_delta, write_delta
+
+
+class StubBackend:
+    """Re-embed endpoint that records each request and answers JSON bodies with `json_status`"""
+
+    def __init__(self, json_status=200):
+        self.json_status = json_status
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+                if self.headers["Content-Type"] == "application/json":
+                    stub.requests.append(("json", json.loads(body)))
+                    status = stub.json_status
+                else:
+                    stub.requests.append(("form", {k: v[0] for k, v in parse_qs(body).items()}))
+                    status = 200
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def product_knowledge(monkeypatch, tmp_path):
+    monkeypatch.setenv("AZURE_AVA_POC_APPS_CONNECTION_STRING", "UseDevelopmentStorage=true")
+    from page import product_knowledge
+
+    monkeypatch.setattr(product_knowledge, "document_manifest", DocumentManifest(str(tmp_path)))
+    return product_knowledge
+
+
+def use_backend(monkeypatch, product_knowledge, backend, delta_enabled):
+    monkeypatch.setattr(product_knowledge, "BACKEND_URL", backend.url)
+    monkeypatch.setattr(product_knowledge, "REEMBED_DELTA_PAYLOAD_ENABLED", delta_enabled)
+
+
+def test_full_tenant_request_by_default(monkeypatch, product_knowledge):
+    backend = StubBackend()
+    use_backend(monkeypatch, product_knowledge, backend, delta_enabled=False)
+
+    assert product_knowledge.update_vector_store_with_new_documents("tenant-a", "token", write_delta("a.txt", "A"))
+
+    assert backend.requests == [("form", {"tenant_id": "tenant-a"})]
+    assert product_knowledge.document_manifest.load("tenant-a") == {
+        "a.txt": {"hash": content_hash("A"), "version": None}
+    }
+
+
+def test_delta_request_when_enabled(monkeypatch, product_knowledge):
+    backend = StubBackend()
+    use_backend(monkeypatch, product_knowledge, backend, delta_enabled=True)
+    update = product_knowledge.update_vector_store_with_new_documents
+    assert update("tenant-a", "token", write_delta("a.txt", "A", version="v1"))
+
+    # Unchanged content written over the embedded version is not sent again, a delete is
+    assert update("tenant-a", "token", write_delta("a.txt", "A", version="v2", base_version="v1"))
+    assert update("tenant-a", "token", delete_delta("a.txt"))
+
+    assert backend.requests == [
+        ("json", {"tenant_id": "tenant-a", "upserted": ["a.txt"], "deleted": [], "renamed": []}),
+        ("json", {"tenant_id": "tenant-a", "upserted": [], "deleted": ["a.txt"], "renamed": []}),
+    ]
+
+
+@pytest.mark.parametrize("status", [400, 415, 422])
+def test_rejected_delta_falls_back_to_full_request(monkeypatch, product_knowledge, status):
+    backend = StubBackend(json_status=status)
+    use_backend(monkeypatch, product_knowledge, backend, delta_enabled=True)
+
+    assert product_knowledge.update_vector_store_with_new_documents("tenant-a", "token", write_delta("a.txt", "A"))
+
+    assert [kind for kind, _ in backend.requests] == ["json", "form"]
+    assert backend.requests[1] == ("form", {"tenant_id": "tenant-a"})
+
+
+def test_failed_delta_does_not_advance_manifest(monkeypatch, product_knowledge):
+    backend = StubBackend(json_status=500)
+    use_backend(monkeypatch, product_knowledge, backend, delta_enabled=True)
+
+    assert not product_knowledge.update_vector_store_with_new_documents(
+        "tenant-a", "token", write_delta("a.txt", "A")
+    )
+
+    assert [kind for kind, _ in backend.requests] == ["json"]
+    assert product_knowledge.document_manifest.load("tenant-a") == {}
+
+
+def test_unchanged_content_over_another_version_is_sent(monkeypatch, product_knowledge):
+    backend = StubBackend()
+    use_backend(monkeypatch, product_knowledge, backend, delta_enabled=True)
+    update = product_knowledge.update_vector_store_with_new_documents
+    assert update("tenant-a", "token", write_delta("a.txt", "A", version="v1"))
+
+    # The blob was edited directly (v3), saving the embedded content again must re-embed it
+    assert update("tenant-a", "token", write_delta("a.txt", "A", version="v4", base_version="v3"))
+
+    assert [body["upserted"] for _, body in backend.requests] == [["a.txt"], ["a.txt"]]
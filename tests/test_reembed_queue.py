@@ -0,0 +1,52 @@
+import threading
+import time
+
+from reembed_queue import DONE, FAILED, ReembedQueue
+
+
+def wait_for(queue, tenant_id, state, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = queue.status(tenant_id)
+        if status is not None and status["state"] == state:
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"tenant {tenant_id} never reached {state}")
+
+
+def test_done_status_expires():
+    queue = ReembedQueue(lambda tenant_id: True, debounce=0.01, done_ttl=0.2)
+    queue.schedule("tenant-a")
+
+    wait_for(queue, "tenant-a", DONE)
+    time.sleep(0.25)
+
+    assert queue.status("tenant-a") is None
+
+
+def test_failed_status_stays_until_the_next_edit():
+    queue = ReembedQueue(lambda tenant_id: False, debounce=0.01, done_ttl=0.01)
+    queue.schedule("tenant-a")
+
+    wait_for(queue, "tenant-a", FAILED)
+    time.sleep(0.05)
+
+    assert queue.status("tenant-a")["state"] == FAILED
+
+
+def test_burst_of_edits_runs_one_job():
+    calls = []
+    finished = threading.Event()
+
+    def job(tenant_id):
+        calls.append(tenant_id)
+        finished.set()
+        return True
+
+    queue = ReembedQueue(job, debounce=0.05)
+    for _ in range(5):
+        queue.schedule("tenant-a")
+
+    assert finished.wait(5)
+    wait_for(queue, "tenant-a", DONE)
+    assert calls == ["tenant-a"]
@@ -0,0 +1,69 @@
+import os
+import time
+
+import pytest
+
+from shared_store import SQLiteStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteStore(str(tmp_path / "store.sqlite3"), purge_interval=0)
+
+
+def row_count(store):
+    return store._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+def test_expired_rows_are_deleted_by_later_writes(store):
+    for i in range(50):
+        store.set(f"never-read-{i}", "value", ttl=0.01)
+    time.sleep(0.02)
+
+    store.set("fresh", "value", ttl=60)
+
+    assert row_count(store) == 1
+    assert store.get("fresh") == "value"
+
+
+def test_purge_waits_for_the_interval(tmp_path):
+    store = SQLiteStore(str(tmp_path / "store.sqlite3"), purge_interval=3600)
+    store.set("first", "value", ttl=0.01)  # the first write purges and starts the interval
+    store.set("expiring", "value", ttl=0.01)
+    time.sleep(0.02)
+
+    store.set("fresh", "value", ttl=60)
+
+    assert row_count(store) == 3
+    store.purge()
+    assert row_count(store) == 1
+
+
+def test_size_cap_drops_rows_expiring_soonest(tmp_path):
+    store = SQLiteStore(str(tmp_path / "store.sqlite3"), purge_interval=0, max_bytes=25_000)
+    store.set("pinned", b"x" * 10_000)
+    store.set("soon", b"x" * 10_000, ttl=60)
+    store.set("later", b"x" * 10_000, ttl=120)
+
+    assert store.get("soon") is None
+    assert store.get("later") is not None
+    assert store.get("pinned") is not None
+
+
+def test_file_stops_growing_once_rows_expire(store):
+    value = os.urandom(64 * 1024)
+    for i in range(20):
+        store.set(f"round-1-{i}", value, ttl=0.01)
+    time.sleep(0.02)
+    store._connect().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    size_after_first_round = os.path.getsize(store.path)
+
+    for i in range(20):
+        store.set(f"round-2-{i}", value, ttl=0.01)
+        time.sleep(0.001)
+    time.sleep(0.02)
+    store.set("last", "value")
+    store._connect().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    # Pages freed by the purge are reused instead of extending the file
+    assert os.path.getsize(store.path) <= size_after_first_round * 1.2
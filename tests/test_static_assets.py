@@ -0,0 +1,36 @@
+import io
+
+from PIL import Image
+
+from static_assets import MAX_IMAGE_WIDTH, read_image
+
+
+def write_image(path, size, format="PNG"):
+    Image.new("RGBA" if format == "PNG" else "RGB", size, "white").save(path, format=format)
+    return str(path)
+
+
+def test_wide_image_is_resized_to_the_maximum_width(tmp_path):
+    path = write_image(tmp_path / "logo.png", (MAX_IMAGE_WIDTH * 4, 400))
+
+    image = Image.open(io.BytesIO(read_image(path)))
+
+    assert image.format == "PNG"
+    assert image.size == (MAX_IMAGE_WIDTH, 100)
+    assert read_image(path) is read_image(path)
+
+
+def test_narrow_png_is_returned_unchanged(tmp_path):
+    path = write_image(tmp_path / "icon.png", (64, 64))
+
+    with open(path, "rb") as f:
+        assert read_image(path) == f.read()
+
+
+def test_other_formats_are_converted_to_png(tmp_path):
+    path = write_image(tmp_path / "photo.jpg", (64, 32), format="JPEG")
+
+    image = Image.open(io.BytesIO(read_image(path)))
+
+    assert image.format == "PNG"
+    assert image.size == (64, 32)
@@ -0,0 +1,145 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from token_verifier import JWKSCache, TokenVerifier
+
+ISSUER = "https://issuer.example.com"
+AUDIENCE = "api.pragmaticai.dev"
+
+
+def generate_key(kid):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update({"kid": kid, "alg": "RS256", "use": "sig"})
+    return private_key, jwk
+
+
+class StubJWKS:
+    """Serves `keys` as a JWKS document after `delay` seconds and counts the fetches"""
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.delay = 0
+        self.fetches = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                stub.fetches += 1
+                time.sleep(stub.delay)
+                body = json.dumps({"keys": stub.keys}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/.well-known/jwks.json"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+
+def issue(private_key, kid, issuer=ISSUER, audience=AUDIENCE, lifetime=3600):
+    now = int(time.time())
+    claims = {"sub": "kp_123", "iss": issuer, "aud": [audience], "iat": now, "exp": now + lifetime}
+    return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def signing_key():
+    return generate_key("key-1")
+
+
+@pytest.fixture
+def jwks(signing_key):
+    stub = StubJWKS([signing_key[1]])
+    yield stub
+    stub.stop()
+
+
+def make_verifier(jwks, min_refresh_interval=0):
+    return TokenVerifier(JWKSCache(jwks.url, min_refresh_interval=min_refresh_interval), ISSUER, AUDIENCE)
+
+
+def test_valid_token(jwks, signing_key):
+    verifier = make_verifier(jwks)
+
+    claims = verifier.verify(issue(signing_key[0], "key-1"))
+
+    assert claims["sub"] == "kp_123"
+    # Keys stay cached between verifications
+    verifier.verify(issue(signing_key[0], "key-1"))
+    assert jwks.fetches == 1
+
+
+def test_unknown_kid_refreshes_the_keys(jwks, signing_key):
+    verifier = make_verifier(jwks)
+    verifier.verify(issue(signing_key[0], "key-1"))
+
+    rotated_private, rotated_jwk = generate_key("key-2")
+    jwks.keys = [signing_key[1], rotated_jwk]
+
+    assert verifier.verify(issue(rotated_private, "key-2"))["sub"] == "kp_123"
+    assert jwks.fetches == 2
+
+
+def test_unknown_kid_refresh_is_rate_limited(jwks, signing_key):
+    verifier = make_verifier(jwks, min_refresh_interval=60)
+    verifier.verify(issue(signing_key[0], "key-1"))
+    unknown_private, _ = generate_key("key-2")
+
+    with pytest.raises(jwt.InvalidKeyError):
+        verifier.verify(issue(unknown_private, "key-2"))
+    assert jwks.fetches == 1
+
+
+def test_expired_token(jwks, signing_key):
+    with pytest.raises(jwt.ExpiredSignatureError):
+        make_verifier(jwks).verify(issue(signing_key[0], "key-1", lifetime=-60))
+
+
+def test_wrong_issuer(jwks, signing_key):
+    with pytest.raises(jwt.InvalidIssuerError):
+        make_verifier(jwks).verify(issue(signing_key[0], "key-1", issuer="https://attacker.example.com"))
+
+
+def test_wrong_audience(jwks, signing_key):
+    with pytest.raises(jwt.InvalidAudienceError):
+        make_verifier(jwks).verify(issue(signing_key[0], "key-1", audience="another-api"))
+
+
+def test_token_signed_with_another_key(jwks):
+    other_private, _ = generate_key("key-1")
+
+    with pytest.raises(jwt.InvalidSignatureError):
+        make_verifier(jwks).verify(issue(other_private, "key-1"))
+
+
+def test_first_verification_waits_for_the_background_refresh(jwks, signing_key):
+    jwks.delay = 0.3
+    cache = JWKSCache(jwks.url, min_refresh_interval=60)
+    verifier = TokenVerifier(cache, ISSUER, AUDIENCE)
+    cache.start()
+
+    # Logins racing the start-up refresh share it instead of each fetching the keys
+    tokens = [issue(signing_key[0], "key-1") for _ in range(8)]
+    threads = [threading.Thread(target=verifier.verify, args=(token,)) for token in tokens]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert verifier.verify(tokens[0])["sub"] == "kp_123"
+    assert jwks.fetches == 1